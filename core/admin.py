@@ -56,7 +56,7 @@ class MonnaieAdmin(admin.ModelAdmin):
 
 @admin.register(Strategy)
 class StrategyAdmin(admin.ModelAdmin):
-    list_display = ('name', 'buy_test', 'sell_test')
+    list_display = ('name', 'buy_test', 'sell_test', 'indicator_backend')
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name in ('buy_test', 'sell_test'):
@@ -128,6 +128,12 @@ class RegulatorSettingsAdmin(admin.ModelAdmin):
         ("Récupération de l'historique", {
             "fields": ("nb_klines_historique",)
         }),
+        ("Écriture différée des monnaies", {
+            "fields": ("duree_write_behind_ms",)
+        }),
+        ("Cadence du recalcul temps réel", {
+            "fields": ("cadence_intervalles", "seuil_variation_prix")
+        }),
     )
 
 
@@ -0,0 +1,192 @@
+import threading
+
+from core.kline_store import kline_store, TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME
+from core.ws_decode import KlineTick
+
+# Durée de chaque intervalle agrégé en millisecondes
+INTERVAL_MS = {
+    "1m": 60 * 1000,
+    "3m": 3 * 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+AGGREGATED_INTERVALS = ("3m", "5m", "15m", "1h", "4h", "1d")
+
+
+class PartialBar:
+    """ Kline en cours de construction pour un intervalle supérieur. """
+
+    __slots__ = ("timestamp", "open_price", "high_price", "low_price", "close_price", "volume")
+
+    def __init__(self, timestamp, open_price, high_price, low_price, close_price, volume):
+        self.timestamp = timestamp
+        self.open_price = open_price
+        self.high_price = high_price
+        self.low_price = low_price
+        self.close_price = close_price
+        self.volume = volume
+
+    def add(self, kline):
+        self.high_price = max(self.high_price, kline.high_price)
+        self.low_price = min(self.low_price, kline.low_price)
+        self.close_price = kline.close_price
+        self.volume += kline.volume
+
+    def to_tick(self, symbole, interval):
+        return KlineTick(
+            symbole, self.timestamp, self.open_price, self.high_price, self.low_price,
+            self.close_price, self.volume, True, intervalle=interval,
+        )
+
+
+def fetch_1m_rows(symbole, start_ms, end_ms):
+    """ Klines 1m de [start_ms, end_ms[ via l'API REST, en lignes OHLCV (par pages de 1000). """
+    from core.utils import get_historical_klines
+
+    rows = []
+    debut = start_ms
+    while debut < end_ms:
+        klines = get_historical_klines(symbole, "1m", limit=1000, start_time=debut)
+        if not klines:
+            break
+        rows.extend(
+            (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in klines if int(k[0]) < end_ms
+        )
+        debut = int(klines[-1][0]) + INTERVAL_MS["1m"]
+        if len(klines) < 1000:
+            break
+    return rows
+
+
+class SymbolRollup:
+    """
+    Agrégation en continu des Klines 1m clôturées d'une monnaie vers 3m, 5m, 15m, 1h, 4h et 1d.
+    Une Kline d'intervalle supérieur est émise quand sa dernière minute arrive. Un groupe incomplet
+    (trou dans le flux 1m, ou début de groupe impossible à reconstituer) n'est jamais émis.
+    `fetch_1m(symbole, start_ms, end_ms)` relit des Klines 1m manquantes (API REST par défaut).
+    """
+
+    def __init__(self, symbole, intervals=AGGREGATED_INTERVALS, fetch_1m=None):
+        self.symbole = symbole
+        self.partials = {interval: None for interval in intervals}
+        self.last_timestamp = None
+        self.fetch_1m = fetch_1m
+
+    def _minutes_before(self, group, timestamp):
+        """
+        Klines 1m exactes de [group, timestamp[ : depuis la mémoire si elle couvre tout le début du
+        groupe, sinon relues via l'API REST. None si elles ne peuvent pas être reconstituées.
+        """
+        attendues = (timestamp - group) // INTERVAL_MS["1m"]
+        if attendues == 0:
+            return []
+
+        buffer = kline_store.get_buffer(self.symbole, "1m", create=False)
+        if buffer is not None:
+            rows = buffer.to_array()
+            rows = rows[(rows[:, TIMESTAMP] >= group) & (rows[:, TIMESTAMP] < timestamp)]
+            if len(rows) == attendues:
+                return rows.tolist()
+
+        try:
+            rows = (self.fetch_1m or fetch_1m_rows)(self.symbole, group, timestamp)
+        except Exception as e:
+            print(f"⚠️ [AGGREGATION] Klines 1m de {self.symbole} indisponibles pour le groupe {group} : {e}")
+            return None
+        rows = sorted({int(row[TIMESTAMP]): row for row in rows if group <= row[TIMESTAMP] < timestamp}.values())
+        return rows if len(rows) == attendues else None
+
+    def seed(self, interval, group, kline_1m):
+        """
+        Reconstruit la Kline en cours au démarrage (ou après un trou) à partir des Klines 1m exactes
+        du début du groupe (mémoire, sinon API REST). Si elles ne peuvent pas être reconstituées,
+        renvoie None : le groupe est incomplet et n'est pas émis (jamais de Kline approximative en base).
+        """
+        rows = self._minutes_before(group, kline_1m.timestamp)
+        if rows is None:
+            return None
+        if not rows:
+            return PartialBar(
+                group, kline_1m.open_price, kline_1m.high_price, kline_1m.low_price, kline_1m.close_price, kline_1m.volume
+            )
+        partial = PartialBar(
+            group, float(rows[0][OPEN]), max(float(row[HIGH]) for row in rows), min(float(row[LOW]) for row in rows),
+            float(rows[-1][CLOSE]), sum(float(row[VOLUME]) for row in rows),
+        )
+        partial.add(kline_1m)
+        return partial
+
+    def add(self, kline_1m):
+        """ Intègre une Kline 1m clôturée. Renvoie la liste des Klines supérieures terminées (KlineTick). """
+        timestamp = kline_1m.timestamp
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return []  # Doublon ou Kline plus ancienne : déjà agrégée
+        first = self.last_timestamp is None
+        gap = not first and timestamp - self.last_timestamp > INTERVAL_MS["1m"]
+        self.last_timestamp = timestamp
+
+        completed = []
+        for interval, partial in self.partials.items():
+            duree = INTERVAL_MS[interval]
+            group = timestamp - (timestamp % duree)
+
+            if partial is not None and partial.timestamp != group:
+                # Trou : minutes manquantes en fin de groupe, la Kline n'est pas émise (elle écraserait une Kline exacte)
+                print(f"⚠️ [AGGREGATION] Kline {interval} de {self.symbole} ({partial.timestamp}) incomplète, non émise")
+                partial = None
+
+            if partial is not None:
+                partial.add(kline_1m)
+            elif first or gap or timestamp != group:
+                partial = self.seed(interval, group, kline_1m)
+            else:
+                partial = PartialBar(
+                    group, kline_1m.open_price, kline_1m.high_price, kline_1m.low_price,
+                    kline_1m.close_price, kline_1m.volume,
+                )
+
+            if partial is not None and timestamp + INTERVAL_MS["1m"] == group + duree:
+                completed.append(partial.to_tick(self.symbole, interval))  # Dernière minute du groupe
+                partial = None
+            self.partials[interval] = partial
+        return completed
+
+    def partial(self, interval):
+        return self.partials.get(interval)
+
+
+class KlineAggregator:
+    """ État d'agrégation de toutes les monnaies (une SymbolRollup par symbole). """
+
+    def __init__(self, fetch_1m=None):
+        self.rollups = {}
+        self.lock = threading.Lock()
+        self.fetch_1m = fetch_1m
+
+    def get_rollup(self, symbole):
+        rollup = self.rollups.get(symbole)
+        if rollup is None:
+            with self.lock:
+                rollup = self.rollups.setdefault(symbole, SymbolRollup(symbole, fetch_1m=self.fetch_1m))
+        return rollup
+
+    def add(self, kline_1m):
+        return self.get_rollup(kline_1m.symbole).add(kline_1m)
+
+    def add_batch(self, klines_1m):
+        """ Agrège un batch de Klines 1m (toutes monnaies) dans l'ordre chronologique. """
+        completed = []
+        for kline in sorted(klines_1m, key=lambda k: k.timestamp):
+            if kline.intervalle == "1m":
+                completed.extend(self.add(kline))
+        return completed
+
+    def drop_symbol(self, symbole):
+        with self.lock:
+            self.rollups.pop(symbole, None)
+
+
+kline_aggregator = KlineAggregator()
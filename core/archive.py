@@ -0,0 +1,188 @@
+import datetime
+import os
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from core.kline_store import COLUMNS, TIMESTAMP
+
+try:
+    import pyarrow as pa  # Dépendance optionnelle : sans pyarrow l'archive est désactivée
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Fichiers Arrow IPC non compressés : lisibles par memory-map sans copie.
+# L'archive n'est écrite que par archive_klines / prune_klines --archive (pas au flush des Klines) :
+# au démarrage, load_historical_klines complète l'archive par un delta REST jusqu'à la Kline courante.
+ARCHIVE_EXTENSION = ".arrow"
+
+
+def archive_available():
+    return pa is not None
+
+
+def archive_dir():
+    return Path(getattr(settings, "KLINE_ARCHIVE_DIR", Path(settings.BASE_DIR) / "archive"))
+
+
+def month_key(timestamp_ms):
+    date = datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc)
+    return f"{date.year}-{date.month:02d}"
+
+
+def month_bounds(key):
+    """ Début et fin (exclue) du mois `key` ("AAAA-MM") en millisecondes. """
+    annee, mois = int(key[:4]), int(key[5:])
+    debut = datetime.datetime(annee, mois, 1, tzinfo=datetime.timezone.utc)
+    fin = datetime.datetime(annee + mois // 12, mois % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+    return int(debut.timestamp() * 1000), int(fin.timestamp() * 1000)
+
+
+def archive_path(symbole, interval, key):
+    return archive_dir() / interval / symbole / f"{key}{ARCHIVE_EXTENSION}"
+
+
+def list_months(symbole, interval):
+    """ Mois archivés ("AAAA-MM") d'un couple (symbole, intervalle), du plus ancien au plus récent. """
+    dossier = archive_dir() / interval / symbole
+    if not dossier.is_dir():
+        return []
+    return sorted(p.stem for p in dossier.glob(f"*{ARCHIVE_EXTENSION}"))
+
+
+def read_month(symbole, interval, key):
+    """ Lit un fichier mensuel par memory-map : renvoie une table Arrow (colonnes COLUMNS) ou None. """
+    path = archive_path(symbole, interval, key)
+    if not path.exists():
+        return None
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def table_to_array(table):
+    return np.column_stack([table.column(col).to_numpy() for col in COLUMNS]).astype(np.float64, copy=False)
+
+
+def write_klines(symbole, interval, rows):
+    """
+    Archive des Klines clôturées (tableau ou itérable de lignes timestamp, open, high, low, close, volume).
+    Les lignes sont réparties par mois et fusionnées avec les fichiers existants (la plus récente gagne).
+    Renvoie le nombre de lignes écrites.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow n'est pas installé : archive des Klines indisponible")
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+    if not len(rows):
+        return 0
+
+    mois = np.array([month_key(int(ts)) for ts in rows[:, TIMESTAMP]])
+    for key in np.unique(mois):
+        nouvelles = rows[mois == key]
+        existante = read_month(symbole, interval, key)
+        if existante is not None:
+            nouvelles = np.concatenate((table_to_array(existante), nouvelles))
+        # Tri par timestamp, doublons : la dernière ligne gagne
+        nouvelles = nouvelles[::-1]
+        _, index = np.unique(nouvelles[:, TIMESTAMP], return_index=True)
+        nouvelles = nouvelles[index]
+
+        table = pa.table({
+            col: pa.array(nouvelles[:, i].astype(np.int64) if i == TIMESTAMP else nouvelles[:, i])
+            for i, col in enumerate(COLUMNS)
+        })
+        path = archive_path(symbole, interval, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+    return len(rows)
+
+
+def read_klines(symbole, interval, start_ms=None, end_ms=None, as_frame=False):
+    """
+    Lit les Klines archivées sur [start_ms, end_ms[ (bornes optionnelles).
+    Renvoie un dict {colonne: tableau numpy} (vues memory-mappées quand un seul mois est lu)
+    ou un DataFrame pandas avec `as_frame=True`. None si rien n'est archivé.
+    """
+    if pa is None:
+        return None
+    tables = []
+    for key in list_months(symbole, interval):
+        debut, fin = month_bounds(key)
+        if (start_ms is not None and fin <= start_ms) or (end_ms is not None and debut >= end_ms):
+            continue
+        table = read_month(symbole, interval, key)
+        if table is not None:
+            tables.append(table)
+    if not tables:
+        return None
+
+    table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+    timestamps = table.column("timestamp").to_numpy()
+    debut = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side="left"))
+    fin = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side="left"))
+    table = table.slice(debut, fin - debut)
+    if as_frame:
+        return table.to_pandas()
+    return {col: table.column(col).to_numpy() for col in COLUMNS}
+
+
+def read_last_klines(symbole, interval, limit):
+    """ Renvoie les `limit` dernières Klines archivées (tableau (n, 6) chronologique) ou None. """
+    if pa is None:
+        return None
+    morceaux = []
+    total = 0
+    for key in reversed(list_months(symbole, interval)):
+        table = read_month(symbole, interval, key)
+        if table is None:
+            continue
+        morceaux.insert(0, table_to_array(table))
+        total += table.num_rows
+        if total >= limit:
+            break
+    if not morceaux:
+        return None
+    return np.concatenate(morceaux)[-limit:]
+
+
+def archive_from_db(symbole, interval, before_ms=None, chunk_size=50000):
+    """ Archive les Klines en base d'un couple (symbole, intervalle), éventuellement avant `before_ms`. """
+    from core.models import Kline
+    klines = Kline.objects.filter(symbole=symbole, intervalle=interval)
+    if before_ms is not None:
+        klines = klines.filter(timestamp__lt=before_ms)
+    lignes = klines.order_by("timestamp").values_list(
+        "timestamp", "open_price", "high_price", "low_price", "close_price", "volume"
+    ).iterator(chunk_size=chunk_size)
+
+    total = 0
+    batch = []
+    for ligne in lignes:
+        batch.append(ligne)
+        if len(batch) >= chunk_size:
+            total += write_klines(symbole, interval, batch)
+            batch = []
+    if batch:
+        total += write_klines(symbole, interval, batch)
+    return total
+
+
+def archive_db_klines(intervals, symbols=None, before_ms=None):
+    """
+    Archive les Klines en base de plusieurs intervalles (toutes les monnaies par défaut),
+    éventuellement avant `before_ms`. Renvoie [(symbole, intervalle, nombre archivé)].
+    """
+    from core.models import Kline
+    resultats = []
+    for interval in intervals:
+        klines = Kline.objects.filter(intervalle=interval)
+        if before_ms is not None:
+            klines = klines.filter(timestamp__lt=before_ms)
+        symboles = symbols or klines.values_list("symbole", flat=True).distinct()
+        for symbole in symboles:
+            resultats.append((symbole, interval, archive_from_db(symbole, interval, before_ms)))
+    return resultats
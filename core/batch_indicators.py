@@ -0,0 +1,117 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _ewm(values, span):
+    """ Moyenne exponentielle (pandas ewm(span, adjust=False)) le long de l'axe 1, pour toutes les lignes à la fois. """
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty_like(values)
+    out[:, 0] = values[:, 0]
+    for t in range(1, values.shape[1]):
+        out[:, t] = alpha * values[:, t] + (1 - alpha) * out[:, t - 1]
+    return out
+
+
+def _rolling_mean(values, window):
+    """ Moyenne glissante le long de l'axe 1 (NaN propagé comme pandas rolling(window).mean()). """
+    return sliding_window_view(values, window, axis=1).mean(axis=2)
+
+
+def batch_rsi(closes, period=14):
+    """ RSI de Wilder (même calcul que utils.calculate_rsi) sur la dernière Kline de chaque ligne. """
+    n, m = closes.shape
+    if m < period + 1:
+        return np.full(n, np.nan)
+    deltas = np.diff(closes, axis=1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    avg_gain = gains[:, :period].mean(axis=1)
+    avg_loss = losses[:, :period].mean(axis=1)
+    for i in range(period, deltas.shape[1]):
+        avg_gain = (avg_gain * (period - 1) + gains[:, i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[:, i]) / period
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    return np.where(avg_loss == 0, 100.0, rsi)
+
+
+def batch_stoch_rsi(closes, rsi_length=14, stoch_length=14, smooth_k=3):
+    """
+    StochRSI (RSI à moyenne simple, comme utils.calculate_stoch_rsi), arrondi à 2 décimales.
+    Renvoie (valeurs, lignes_a_recalculer) : les lignes dont le RSI contient un NaN au milieu de la
+    série (segment plat) ne sont pas alignées avec la version de référence, qui supprime ces NaN ;
+    elles doivent être recalculées individuellement.
+    """
+    n, m = closes.shape
+    result = np.full(n, np.nan)
+    if m < rsi_length + stoch_length + smooth_k:
+        return result, np.zeros(n, dtype=bool)
+
+    deltas = np.diff(closes, axis=1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + _rolling_mean(gains, rsi_length) / _rolling_mean(losses, rsi_length)))
+        lows = sliding_window_view(rsi, stoch_length, axis=1).min(axis=2)
+        highs = sliding_window_view(rsi, stoch_length, axis=1).max(axis=2)
+        stoch = (rsi[:, stoch_length - 1:] - lows) / (highs - lows)
+    k = _rolling_mean(stoch, smooth_k) * 100
+
+    a_recalculer = np.isnan(rsi).any(axis=1)
+    valides = ~np.isnan(k)
+    a_une_valeur = valides.any(axis=1)
+    dernier = k.shape[1] - 1 - np.argmax(valides[:, ::-1], axis=1)
+    lignes = np.nonzero(a_une_valeur)[0]
+    result[lignes] = np.round(k[lignes, dernier[lignes]], 2)
+    return result, a_recalculer
+
+
+def batch_macd(closes, short_period=12, long_period=26, signal_period=9):
+    """ MACD et signal (EMA pandas adjust=False) sur la dernière Kline de chaque ligne. """
+    n, m = closes.shape
+    if m < long_period:
+        return np.full(n, np.nan), np.full(n, np.nan)
+    macd = _ewm(closes, short_period) - _ewm(closes, long_period)
+    signal = _ewm(macd, signal_period)
+    return macd[:, -1], signal[:, -1]
+
+
+def batch_bollinger_bands(closes, period=20, num_std=2):
+    """ Bandes de Bollinger (écart-type ddof=1) sur les `period` dernières Klines de chaque ligne. """
+    n, m = closes.shape
+    if m < period:
+        nan = np.full(n, np.nan)
+        return nan, nan, nan
+    fenetre = closes[:, -period:]
+    middle = fenetre.mean(axis=1)
+    std = fenetre.std(axis=1, ddof=1)
+    return middle + std * num_std, middle, middle - std * num_std
+
+
+def compute_indicators_batch(closes):
+    """
+    Calcule tous les indicateurs en une passe vectorisée pour un tableau (monnaies x Klines) de clôtures
+    de même longueur. Renvoie une liste de dicts (un par ligne), avec None pour les valeurs indisponibles,
+    et le masque des lignes dont le StochRSI doit être recalculé par la fonction de référence.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    rsi = batch_rsi(closes)
+    stoch_rsi, a_recalculer = batch_stoch_rsi(closes)
+    macd, macd_signal = batch_macd(closes)
+    upper, middle, lower = batch_bollinger_bands(closes)
+
+    def valeur(x):
+        return None if np.isnan(x) else float(x)
+
+    return [
+        {
+            'rsi': valeur(rsi[i]),
+            'stoch_rsi': valeur(stoch_rsi[i]),
+            'macd': valeur(macd[i]),
+            'macd_signal': valeur(macd_signal[i]),
+            'bollinger_upper': valeur(upper[i]),
+            'bollinger_middle': valeur(middle[i]),
+            'bollinger_lower': valeur(lower[i]),
+        }
+        for i in range(closes.shape[0])
+    ], a_recalculer
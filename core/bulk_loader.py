@@ -0,0 +1,83 @@
+import io
+
+from django.db import connection, transaction
+
+KLINE_COLUMNS = ("symbole", "intervalle", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume")
+
+
+def binance_klines_to_rows(symbole, interval, klines):
+    """ Convertit la réponse REST Binance en tuples dans l'ordre de KLINE_COLUMNS. """
+    return [
+        (symbole, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+        for k in klines
+    ]
+
+
+def copy_rows(cursor, table, rows):
+    """ Envoie les lignes dans `table` via COPY FROM STDIN (psycopg2 ou psycopg 3). """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    sql = f"COPY {table} ({', '.join(KLINE_COLUMNS)}) FROM STDIN"
+    if hasattr(cursor.cursor, "copy_expert"):  # psycopg2
+        cursor.cursor.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with cursor.cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def bulk_load_klines(rows, update=False):
+    """
+    Charge un grand nombre de Klines en base.
+
+    Sous PostgreSQL : COPY dans une table temporaire puis un seul INSERT ... SELECT ... ON CONFLICT
+    vers core_kline (DO NOTHING par défaut, DO UPDATE avec `update=True`). Sur les autres bases
+    (SQLite des tests) : bulk_create avec ignore_conflicts / update_conflicts.
+    Renvoie le nombre de lignes envoyées.
+    """
+    from core.models import Kline
+
+    # ON CONFLICT refuse deux fois la même clé dans une instruction : la dernière ligne gagne
+    uniques = {}
+    for row in rows:
+        uniques[(row[0], row[1], row[2])] = row
+    rows = list(uniques.values())
+    if not rows:
+        return 0
+
+    if connection.vendor != "postgresql":
+        klines = [Kline(**dict(zip(KLINE_COLUMNS, row))) for row in rows]
+        if update:
+            Kline.objects.bulk_create(
+                klines, batch_size=500, update_conflicts=True,
+                unique_fields=["symbole", "intervalle", "timestamp"],
+                update_fields=list(KLINE_COLUMNS[3:]),
+            )
+        else:
+            Kline.objects.bulk_create(klines, batch_size=500, ignore_conflicts=True)
+        return len(rows)
+
+    table = Kline._meta.db_table
+    colonnes = ", ".join(KLINE_COLUMNS)
+    if update:
+        conflit = "DO UPDATE SET " + ", ".join(f"{col} = EXCLUDED.{col}" for col in KLINE_COLUMNS[3:])
+    else:
+        conflit = "DO NOTHING"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS kline_staging ("
+            "symbole varchar(20), intervalle varchar(5), timestamp bigint, open_price double precision, "
+            "high_price double precision, low_price double precision, close_price double precision, "
+            "volume double precision) ON COMMIT DELETE ROWS"
+        )
+        cursor.execute("TRUNCATE kline_staging")  # Appel imbriqué dans une transaction englobante
+        copy_rows(cursor, "kline_staging", rows)
+        cursor.execute(
+            f"INSERT INTO {table} ({colonnes}) SELECT {colonnes} FROM kline_staging "
+            f"ON CONFLICT (symbole, intervalle, timestamp) {conflit}"
+        )
+    return len(rows)
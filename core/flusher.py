@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+
+class KlineFlusher:
+    """
+    Thread unique d'écriture des Klines clôturées.
+
+    Les workers déposent les Klines dans un canal borné (`put` bloque quand il est plein :
+    contre-pression au lieu d'abandonner le flush). Le thread regroupe les Klines et appelle
+    `save_batch(klines, monnaies, timestamps)` dès que `max_batch` Klines sont en attente ou que
+    la plus ancienne attend depuis `max_delay` secondes. Chaque flush rapporte le retard
+    (réception de la plus ancienne Kline -> écriture) et la taille du batch.
+    Non utilisé en WORKER_MODE "sharded" : chaque shard flushe ses propres Klines (voir binance_ws.start_writers).
+    """
+
+    def __init__(self, save_batch, max_batch, max_delay, capacity=10000):
+        self.save_batch = save_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.channel = queue.Queue(maxsize=capacity)
+        self.thread = None
+        # Statistiques
+        self.nb_flushes = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_time = 0.0  # Temps cumulé passé par les producteurs bloqués sur le canal plein
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.thread = threading.Thread(target=self.run, name="kline-flusher", daemon=True)
+        self.thread.start()
+        print(f"✅ [FLUSH] Thread d'écriture démarré (batch {self.max_batch}, délai {self.max_delay}s, canal {self.channel.maxsize})")
+
+    def put(self, kline, timestamp_reception):
+        """ Dépose une Kline clôturée ; bloque tant que le canal est plein. """
+        try:
+            self.channel.put_nowait((kline, timestamp_reception))
+        except queue.Full:
+            debut = time.time()
+            self.channel.put((kline, timestamp_reception))
+            self.blocked_time += time.time() - debut
+
+    def drain(self, timeout=30):
+        """ Force l'écriture de tout ce qui est déjà dans le canal et attend la fin du flush. """
+        if not self.running:
+            return False
+        done = threading.Event()
+        self.channel.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=30):
+        if self.running:
+            self.channel.put(None)
+            self.thread.join(timeout)
+
+    def run(self):
+        klines, monnaies, timestamps = [], set(), {}
+        oldest = None
+        while True:
+            attente = self.max_delay if oldest is None else max(0.0, oldest + self.max_delay - time.time())
+            try:
+                item = self.channel.get(timeout=attente)
+            except queue.Empty:
+                item = False  # Délai atteint
+
+            if item is None or isinstance(item, threading.Event) or item is False:
+                if klines:
+                    self.flush(klines, monnaies, timestamps, oldest)
+                    klines, monnaies, timestamps = [], set(), {}
+                    oldest = None
+                if isinstance(item, threading.Event):
+                    item.set()
+                if item is None:
+                    return
+                continue
+
+            kline, timestamp_reception = item
+            klines.append(kline)
+            monnaies.add(kline.symbole)
+            timestamps[(kline.symbole, kline.intervalle, kline.timestamp)] = timestamp_reception
+            oldest = timestamp_reception if oldest is None else min(oldest, timestamp_reception)
+            if len(klines) >= self.max_batch:
+                self.flush(klines, monnaies, timestamps, oldest)
+                klines, monnaies, timestamps = [], set(), {}
+                oldest = None
+
+    def flush(self, klines, monnaies, timestamps, oldest):
+        try:
+            self.save_batch(klines, monnaies, timestamps)
+        except Exception as e:
+            print(f"❌ [ERROR] Flush de {len(klines)} Klines : {e}")
+        self.nb_flushes += 1
+        self.last_batch_size = len(klines)
+        self.last_lag = time.time() - oldest
+        self.max_lag = max(self.max_lag, self.last_lag)
+        print(
+            f"📤 [FLUSH] {self.last_batch_size} Klines | retard {self.last_lag:.2f}s (max {self.max_lag:.2f}s) | "
+            f"canal {self.channel.qsize()}/{self.channel.maxsize} | producteurs bloqués {self.blocked_time:.2f}s"
+        )
@@ -0,0 +1,188 @@
+import math
+
+import numpy as np
+
+try:
+    import talib
+except ImportError:  # TA-Lib optionnel (bibliothèque C à installer séparément)
+    talib = None
+
+from core.batch_indicators import compute_indicators_batch
+
+# Indicateurs calculables, et champs produits par chacun
+INDICATORS = ("rsi", "stoch_rsi", "macd", "bollinger")
+INDICATOR_OUTPUTS = {
+    "rsi": ("rsi",),
+    "stoch_rsi": ("stoch_rsi",),
+    "macd": ("macd", "macd_signal"),
+    "bollinger": ("bollinger_upper", "bollinger_middle", "bollinger_lower"),
+}
+
+
+def empty_result():
+    return {champ: None for champs in INDICATOR_OUTPUTS.values() for champ in champs}
+
+
+def _float(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+class IndicatorBackend:
+    """
+    Noyau de calcul des indicateurs sur une série de clôtures (ordre chronologique).
+    `compute(closes, indicators)` renvoie un dict avec tous les champs de INDICATOR_OUTPUTS,
+    à None pour les indicateurs non demandés ou sans assez d'historique.
+
+    Conventions communes (celles des fonctions de référence de core/utils.py) : RSI de Wilder,
+    StochRSI calculé sur un RSI à moyenne simple, EMA du MACD initialisée sur la première
+    clôture, Bollinger sur l'écart-type d'échantillon (ddof=1).
+    """
+
+    name = None
+
+    def compute(self, closes, indicators=INDICATORS):
+        raise NotImplementedError
+
+
+class ReferenceBackend(IndicatorBackend):
+    """ Fonctions pandas historiques de core/utils.py : les valeurs de référence. """
+
+    name = "reference"
+
+    def compute(self, closes, indicators=INDICATORS):
+        from core.utils import calculate_rsi, calculate_stoch_rsi, calculate_macd, calculate_bollinger_bands
+
+        closes = list(closes)
+        result = empty_result()
+        if "rsi" in indicators:
+            result["rsi"] = calculate_rsi(closes)
+        if "stoch_rsi" in indicators:
+            result["stoch_rsi"] = calculate_stoch_rsi(closes)
+        if "macd" in indicators:
+            result["macd"], result["macd_signal"] = calculate_macd(closes)
+        if "bollinger" in indicators:
+            result["bollinger_upper"], result["bollinger_middle"], result["bollinger_lower"] = calculate_bollinger_bands(closes)
+        return result
+
+
+class NumpyBackend(IndicatorBackend):
+    """ Noyaux numpy vectorisés de core/batch_indicators.py appliqués à une seule série. """
+
+    name = "numpy"
+
+    def compute(self, closes, indicators=INDICATORS):
+        from core.utils import calculate_stoch_rsi
+
+        closes = np.asarray(closes, dtype=np.float64)
+        resultats, a_recalculer = compute_indicators_batch(closes[np.newaxis, :])
+        valeurs = resultats[0]
+        if a_recalculer[0] and "stoch_rsi" in indicators:
+            valeurs["stoch_rsi"] = calculate_stoch_rsi(closes.tolist())
+        return select_indicators(valeurs, indicators)
+
+
+class TalibBackend(IndicatorBackend):
+    """
+    Fonctions C de TA-Lib. Le StochRSI est recomposé (SMA, MIN, MAX) pour garder la convention
+    du RSI à moyenne simple. TA-Lib initialise ses EMA sur une moyenne simple : le MACD converge
+    vers la référence mais n'est pas identique sur un historique court.
+    """
+
+    name = "talib"
+
+    def compute(self, closes, indicators=INDICATORS, rsi_length=14, stoch_length=14, smooth_k=3, bb_period=20, bb_std=2):
+        if talib is None:
+            raise RuntimeError("TA-Lib n'est pas installé")
+        from core.utils import calculate_stoch_rsi, calculate_macd
+
+        closes = np.asarray(closes, dtype=np.float64)
+        n = len(closes)
+        result = empty_result()
+
+        if "rsi" in indicators and n >= rsi_length + 1:
+            rsi = _float(talib.RSI(closes, timeperiod=rsi_length)[-1])
+            if rsi == 0 and not (np.diff(closes) < 0).any():
+                rsi = 100.0  # Série sans aucune baisse : 100 comme la référence (TA-Lib renvoie 0 si tout est plat)
+            result["rsi"] = rsi
+
+        if "stoch_rsi" in indicators and n >= rsi_length + stoch_length + smooth_k:
+            deltas = np.diff(closes)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rsi = 100 - (100 / (1 + talib.SMA(np.where(deltas > 0, deltas, 0.0), rsi_length)
+                                     / talib.SMA(np.where(deltas < 0, -deltas, 0.0), rsi_length)))
+            rsi = rsi[rsi_length - 1:]
+            if np.isnan(rsi).any():
+                # Segment plat : la référence supprime les NaN du RSI, TA-Lib les propagerait
+                result["stoch_rsi"] = calculate_stoch_rsi(closes.tolist(), rsi_length, stoch_length, smooth_k)
+            else:
+                lows, highs = talib.MIN(rsi, stoch_length), talib.MAX(rsi, stoch_length)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    k = talib.SMA((rsi - lows) / (highs - lows), smooth_k) * 100
+                k = k[~np.isnan(k)]
+                result["stoch_rsi"] = round(float(k[-1]), 2) if len(k) else None
+
+        if "macd" in indicators and n >= 26:
+            if n < 26 + 9 - 1:
+                # Période d'amorçage de TA-Lib (lente + signal - 1) : valeurs de la référence
+                result["macd"], result["macd_signal"] = calculate_macd(closes)
+            else:
+                macd, signal, _ = talib.MACD(closes, fastperiod=12, slowperiod=26, signalperiod=9)
+                result["macd"], result["macd_signal"] = _float(macd[-1]), _float(signal[-1])
+
+        if "bollinger" in indicators and n >= bb_period:
+            # TA-Lib utilise l'écart-type de population : facteur corrigé pour l'écart-type d'échantillon
+            nbdev = bb_std * math.sqrt(bb_period / (bb_period - 1))
+            upper, middle, lower = talib.BBANDS(closes, timeperiod=bb_period, nbdevup=nbdev, nbdevdn=nbdev, matype=0)
+            result["bollinger_upper"], result["bollinger_middle"], result["bollinger_lower"] = (
+                _float(upper[-1]), _float(middle[-1]), _float(lower[-1])
+            )
+        return result
+
+
+class IncrementalBackend(IndicatorBackend):
+    """
+    Moteur incrémental de core/indicators.py. Sur le chemin temps réel, l'état persistant par
+    (symbole, intervalle) est utilisé directement (voir calculate_indicators) ; `compute` rejoue la série.
+    """
+
+    name = "incremental"
+
+    def compute(self, closes, indicators=INDICATORS):
+        from core.indicators import IndicatorState
+
+        state = IndicatorState()
+        valeurs = empty_result()
+        for close in closes:
+            valeurs = state.update(float(close))
+        return select_indicators(valeurs, indicators)
+
+
+def select_indicators(valeurs, indicators):
+    """ Garde uniquement les champs des indicateurs demandés (les autres à None). """
+    result = empty_result()
+    for indicator in indicators:
+        for champ in INDICATOR_OUTPUTS[indicator]:
+            result[champ] = valeurs[champ]
+    return result
+
+
+BACKENDS = {backend.name: backend for backend in (ReferenceBackend(), NumpyBackend(), TalibBackend(), IncrementalBackend())}
+
+
+def available_backends():
+    """ Noms des backends utilisables sur cette machine. """
+    return [nom for nom in BACKENDS if nom != "talib" or talib is not None]
+
+
+_talib_absent_signale = False
+
+
+def get_backend(name):
+    """ Backend demandé ; retombe sur la référence (avec un avertissement) s'il n'est pas disponible. """
+    global _talib_absent_signale
+    if name == "talib" and talib is None:
+        if not _talib_absent_signale:
+            print("⚠️ [WARNING] TA-Lib non installé, calcul des indicateurs avec le backend de référence")
+            _talib_absent_signale = True
+        return BACKENDS["reference"]
+    return BACKENDS.get(name, BACKENDS["reference"])
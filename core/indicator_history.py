@@ -0,0 +1,63 @@
+import threading
+
+INDICATOR_FIELDS = ("rsi", "stoch_rsi", "macd", "macd_signal", "bollinger_upper", "bollinger_middle", "bollinger_lower")
+
+
+class IndicatorHistoryBuffer:
+    """
+    Valeurs d'indicateurs des Klines clôturées en attente d'écriture dans le modèle Indicator.
+    Les valeurs sont accumulées par (symbole, intervalle, timestamp) puis écrites par `flush`
+    en un seul upsert multi-lignes (appelé à chaque flush des Klines).
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, symbole, interval, timestamp, indicateurs):
+        if timestamp is None:
+            return
+        with self.lock:
+            self.pending[(symbole, interval, int(timestamp))] = {field: indicateurs.get(field) for field in INDICATOR_FIELDS}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def flush(self):
+        """ Écrit toutes les valeurs en attente (INSERT ... ON CONFLICT DO UPDATE). Renvoie le nombre de lignes. """
+        from core.models import Indicator
+
+        with self.lock:
+            if not self.pending:
+                return 0
+            pending, self.pending = self.pending, {}
+
+        Indicator.objects.bulk_create(
+            [
+                Indicator(symbole=symbole, intervalle=interval, timestamp=timestamp, **valeurs)
+                for (symbole, interval, timestamp), valeurs in pending.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["symbole", "intervalle", "timestamp"],
+            update_fields=list(INDICATOR_FIELDS),
+        )
+        return len(pending)
+
+
+def get_latest_indicators(symbole, interval, n=100):
+    """
+    Renvoie les `n` dernières valeurs d'indicateurs enregistrées pour (symbole, intervalle),
+    dans l'ordre chronologique : liste de dicts {timestamp, rsi, stoch_rsi, macd, ...}.
+    """
+    from core.models import Indicator
+    lignes = list(
+        Indicator.objects.filter(symbole=symbole, intervalle=interval)
+        .order_by("-timestamp")
+        .values("timestamp", *INDICATOR_FIELDS)[:n]
+    )
+    lignes.reverse()
+    return lignes
+
+
+indicator_history = IndicatorHistoryBuffer()
@@ -0,0 +1,81 @@
+import ast
+
+from core.indicator_backends import INDICATOR_OUTPUTS
+
+# Champ lu par un test ou une expression -> indicateur à calculer
+FIELD_TO_INDICATOR = {champ: indicator for indicator, champs in INDICATOR_OUTPUTS.items() for champ in champs}
+
+
+def field_indicator(field):
+    """ "macd_signal" -> "macd" ; None pour les champs qui ne sont pas des indicateurs (prix_achat...). """
+    return FIELD_TO_INDICATOR.get(field)
+
+
+def expression_fields(expression):
+    """ Noms de champs indicateurs utilisés dans l'expression d'un Calculation. """
+    try:
+        arbre = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(arbre) if isinstance(node, ast.Name) and node.id in FIELD_TO_INDICATOR}
+
+
+def add_requirement(plan, indicator, interval):
+    if indicator is not None and interval:
+        plan.setdefault(interval, set()).add(indicator)
+
+
+def compile_calculation(calculation, interval, plan, vus=None):
+    """ Ajoute au plan les indicateurs lus par un Calculation (et ses sous-calculs) sur `interval`. """
+    vus = set() if vus is None else vus
+    if calculation is None or calculation.pk in vus:
+        return
+    vus.add(calculation.pk)
+    for field in expression_fields(calculation.expression):
+        add_requirement(plan, field_indicator(field), interval)
+    for sub_calculation in calculation.sub_calculations.all():
+        compile_calculation(sub_calculation, interval, plan, vus)
+
+
+def compile_indicator_test(test, plan):
+    """ Indicateur testé, indicateur de seuil et indicateurs du calcul de seuil. """
+    add_requirement(plan, field_indicator(test.indicator), test.interval)
+    if test.threshold_indicator_test:
+        seuil = test.threshold_indicator_test
+        add_requirement(plan, field_indicator(seuil.indicator), seuil.interval)
+    if test.threshold_calculation:
+        compile_calculation(test.threshold_calculation, test.interval, plan)
+
+
+def compile_combined_test(combined_test, plan, vus=None):
+    """ Parcourt récursivement un CombinedTest (tests simples et sous-tests combinés). """
+    vus = set() if vus is None else vus
+    if combined_test is None or combined_test.pk in vus:
+        return
+    vus.add(combined_test.pk)
+    for test in combined_test.tests.all():
+        compile_indicator_test(test, plan)
+    for sub_combined in combined_test.sub_combined_tests.all():
+        compile_combined_test(sub_combined, plan, vus)
+
+
+def to_json(plan):
+    """ {intervalle: set} -> {intervalle: [indicateurs triés]} (format du JSONField Strategy.indicator_plan). """
+    return {interval: sorted(indicators) for interval, indicators in sorted(plan.items())}
+
+
+def merge_indicator_plans(plans):
+    """ Union de plusieurs plans {intervalle: [indicateurs]}. """
+    merged = {}
+    for plan in plans:
+        for interval, indicators in (plan or {}).items():
+            merged.setdefault(interval, set()).update(indicators)
+    return to_json(merged)
+
+
+def global_indicator_plan():
+    """ Plan fusionné de toutes les stratégies affectées à au moins une monnaie. """
+    from core.models import Strategy
+    return merge_indicator_plans(
+        Strategy.objects.filter(monnaie__isnull=False).distinct().values_list("indicator_plan", flat=True)
+    )
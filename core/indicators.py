@@ -0,0 +1,370 @@
+import math
+import threading
+from collections import deque
+
+from core.kline_store import kline_store, TIMESTAMP, CLOSE
+
+NAN = float("nan")
+
+
+class EMA:
+    """ Moyenne mobile exponentielle équivalente à pandas `ewm(span=..., adjust=False)`. """
+
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def _next(self, x):
+        if self.value is None:
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+    def update(self, x):
+        self.value = self._next(x)
+        return self.value
+
+    def peek(self, x):
+        return self._next(x)
+
+
+class WilderRSI:
+    """
+    RSI lissé de Wilder, identique à `calculate_rsi` : moyenne simple des `period`
+    premières variations puis lissage (avg * (period - 1) + valeur) / period.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.nb_deltas = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = None
+
+    def _next(self, close):
+        """ Calcule l'état suivant sans le modifier : (nb_deltas, avg_gain, avg_loss, valeur). """
+        if self.prev_close is None:
+            return 0, 0.0, 0.0, None
+        delta = close - self.prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        nb_deltas = self.nb_deltas + 1
+        if nb_deltas <= self.period:
+            # Phase d'amorçage : on accumule les sommes, la moyenne est faite à la fin
+            avg_gain = self.avg_gain + gain
+            avg_loss = self.avg_loss + loss
+            if nb_deltas < self.period:
+                return nb_deltas, avg_gain, avg_loss, None
+            avg_gain /= self.period
+            avg_loss /= self.period
+        else:
+            avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        if avg_loss == 0:
+            return nb_deltas, avg_gain, avg_loss, 100.0
+        return nb_deltas, avg_gain, avg_loss, 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def update(self, close):
+        self.nb_deltas, self.avg_gain, self.avg_loss, self.value = self._next(close)
+        self.prev_close = close
+        return self.value
+
+    def peek(self, close):
+        return self._next(close)[3]
+
+
+class MACD:
+    """ MACD (EMA courte - EMA longue) et sa ligne de signal, identique à `calculate_macd`. """
+
+    def __init__(self, short_period=12, long_period=26, signal_period=9):
+        self.long_period = long_period
+        self.short_ema = EMA(short_period)
+        self.long_ema = EMA(long_period)
+        self.signal_ema = EMA(signal_period)
+        self.count = 0
+        self.value = (None, None)
+
+    def update(self, close):
+        macd = self.short_ema.update(close) - self.long_ema.update(close)
+        signal = self.signal_ema.update(macd)
+        self.count += 1
+        self.value = (macd, signal) if self.count >= self.long_period else (None, None)
+        return self.value
+
+    def peek(self, close):
+        if self.count + 1 < self.long_period:
+            return None, None
+        macd = self.short_ema.peek(close) - self.long_ema.peek(close)
+        return macd, self.signal_ema.peek(macd)
+
+
+class BollingerBands:
+    """
+    Bandes de Bollinger (moyenne et écart-type glissants, ddof=1), identiques à
+    `calculate_bollinger_bands`. Les sommes sont tenues en écart à une référence
+    recalée régulièrement pour limiter les erreurs d'arrondi.
+    """
+
+    def __init__(self, period=20, num_std=2):
+        self.period = period
+        self.num_std = num_std
+        self.window = deque(maxlen=period)
+        self.reference = None
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.updates_since_rebase = 0
+        self.value = (None, None, None)
+
+    def _bands(self, total, total_sq):
+        mean_offset = total / self.period
+        variance = (total_sq - total * mean_offset) / (self.period - 1)
+        std = math.sqrt(variance) if variance > 0 else 0.0
+        middle = self.reference + mean_offset
+        return middle + std * self.num_std, middle, middle - std * self.num_std
+
+    def _rebase(self):
+        self.reference = sum(self.window) / len(self.window)
+        deviations = [x - self.reference for x in self.window]
+        self.sum = sum(deviations)
+        self.sum_sq = sum(d * d for d in deviations)
+        self.updates_since_rebase = 0
+
+    def update(self, close):
+        if self.reference is None:
+            self.reference = close
+        if len(self.window) == self.period:
+            oldest = self.window[0] - self.reference
+            self.sum -= oldest
+            self.sum_sq -= oldest * oldest
+        self.window.append(close)
+        deviation = close - self.reference
+        self.sum += deviation
+        self.sum_sq += deviation * deviation
+        self.updates_since_rebase += 1
+        if self.updates_since_rebase >= self.period:
+            self._rebase()
+        if len(self.window) < self.period:
+            self.value = (None, None, None)
+        else:
+            self.value = self._bands(self.sum, self.sum_sq)
+        return self.value
+
+    def peek(self, close):
+        if len(self.window) + 1 < self.period:
+            return None, None, None
+        total, total_sq = self.sum, self.sum_sq
+        if len(self.window) == self.period:
+            oldest = self.window[0] - self.reference
+            total -= oldest
+            total_sq -= oldest * oldest
+        deviation = close - self.reference
+        return self._bands(total + deviation, total_sq + deviation * deviation)
+
+
+class StochRSI:
+    """
+    Stochastique du RSI identique à `calculate_stoch_rsi` : RSI à moyennes simples,
+    min/max glissants du RSI puis lissage %K par moyenne simple.
+    """
+
+    def __init__(self, rsi_length=14, stoch_length=14, smooth_k=3):
+        self.rsi_length = rsi_length
+        self.stoch_length = stoch_length
+        self.smooth_k = smooth_k
+        self.min_closes = rsi_length + stoch_length + smooth_k
+        self.count = 0
+        self.prev_close = None
+        self.gains = deque(maxlen=rsi_length)
+        self.losses = deque(maxlen=rsi_length)
+        self.rsis = deque(maxlen=stoch_length)
+        self.stochs = deque(maxlen=smooth_k)
+        self.last_valid = None
+        self.value = None
+
+    @staticmethod
+    def _window(values, maxlen, new_value):
+        """ Contenu qu'aurait la fenêtre après ajout de `new_value` (sans la modifier). """
+        window = list(values)
+        window.append(new_value)
+        return window[-maxlen:]
+
+    def _rsi(self, gains, losses):
+        avg_gain = sum(gains) / self.rsi_length
+        avg_loss = sum(losses) / self.rsi_length
+        if avg_loss == 0:
+            return NAN if avg_gain == 0 else 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def _next(self, close):
+        """ Calcule (rsis, stochs, dernière %K valide) après `close`, sans modifier l'état. """
+        rsis, stochs, last_valid = self.rsis, self.stochs, self.last_valid
+        if self.prev_close is None:
+            return rsis, stochs, last_valid
+        delta = close - self.prev_close
+        gains = self._window(self.gains, self.rsi_length, delta if delta > 0 else 0.0)
+        losses = self._window(self.losses, self.rsi_length, -delta if delta < 0 else 0.0)
+        if len(gains) < self.rsi_length:
+            return rsis, stochs, last_valid
+        rsi = self._rsi(gains, losses)
+        if math.isnan(rsi):
+            # pandas: les RSI indéfinis sont retirés (dropna) avant le calcul du min/max
+            return rsis, stochs, last_valid
+        rsis = self._window(rsis, self.stoch_length, rsi)
+        if len(rsis) < self.stoch_length:
+            return rsis, stochs, last_valid
+        low, high = min(rsis), max(rsis)
+        stoch = (rsi - low) / (high - low) if high != low else NAN
+        stochs = self._window(stochs, self.smooth_k, stoch)
+        if len(stochs) == self.smooth_k and not any(math.isnan(s) for s in stochs):
+            last_valid = sum(stochs) / self.smooth_k * 100
+        return rsis, stochs, last_valid
+
+    def _result(self, count, last_valid):
+        if count < self.min_closes or last_valid is None:
+            return None
+        return round(last_valid, 2)
+
+    def update(self, close):
+        rsis, stochs, self.last_valid = self._next(close)
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.gains.append(delta if delta > 0 else 0.0)
+            self.losses.append(-delta if delta < 0 else 0.0)
+        self.rsis = deque(rsis, maxlen=self.stoch_length)
+        self.stochs = deque(stochs, maxlen=self.smooth_k)
+        self.prev_close = close
+        self.count += 1
+        self.value = self._result(self.count, self.last_valid)
+        return self.value
+
+    def peek(self, close):
+        return self._result(self.count + 1, self._next(close)[2])
+
+
+class IndicatorState:
+    """
+    État incrémental de tous les indicateurs d'un couple (symbole, intervalle).
+    `update` valide une Kline clôturée, `peek` évalue une Kline en cours en O(1) sans modifier l'état.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.rsi = WilderRSI()
+        self.stoch_rsi = StochRSI()
+        self.macd = MACD()
+        self.bollinger = BollingerBands()
+        self.count = 0
+        self.last_timestamp = None
+        self.last_close = None
+
+    @staticmethod
+    def _as_dict(rsi, stoch_rsi, macd, bollinger):
+        return {
+            'rsi': rsi,
+            'stoch_rsi': stoch_rsi,
+            'macd': macd[0],
+            'macd_signal': macd[1],
+            'bollinger_upper': bollinger[0],
+            'bollinger_middle': bollinger[1],
+            'bollinger_lower': bollinger[2],
+        }
+
+    def update(self, close, timestamp=None):
+        self.rsi.update(close)
+        self.stoch_rsi.update(close)
+        self.macd.update(close)
+        self.bollinger.update(close)
+        self.count += 1
+        self.last_timestamp = timestamp
+        self.last_close = close
+        return self.current()
+
+    def current(self):
+        """ Valeurs des indicateurs sur la dernière Kline clôturée. """
+        return self._as_dict(self.rsi.value, self.stoch_rsi.value, self.macd.value, self.bollinger.value)
+
+    def peek(self, close):
+        """ Valeurs des indicateurs si `close` était ajouté comme Kline suivante. """
+        return self._as_dict(
+            self.rsi.peek(close), self.stoch_rsi.peek(close), self.macd.peek(close), self.bollinger.peek(close)
+        )
+
+
+# Fenêtre de Klines clôturées des fonctions de référence (get_closes(symbole, interval, 100))
+INDICATOR_WINDOW = 100
+
+
+class ClosedBarCache:
+    """
+    État des indicateurs sur la fenêtre exacte des `window` dernières Klines clôturées, par
+    (symbole, intervalle). Reconstruit une fois par Kline clôturée (clé : génération du buffer et
+    timestamp de la dernière Kline), puis chaque tick en cours n'évalue que le dernier pas (`peek`).
+    Mêmes valeurs que les fonctions de référence sur closes[-window:] (+ close en cours) : un état
+    intégré depuis le début du buffer dériverait (amorçage des EMA et des moyennes de Wilder).
+
+    La reconstruction se fait sous un verrou par (symbole, intervalle) et produit un nouvel état :
+    un état partagé n'est jamais modifié, deux threads ne peuvent pas rejouer la même Kline.
+    """
+
+    def __init__(self, window=INDICATOR_WINDOW):
+        self.window = window
+        self.entries = {}  # (symbole, intervalle) -> (version du buffer, IndicatorState)
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get(self, symbole, interval):
+        """ IndicatorState à jour pour la fenêtre courante, ou None si le buffer est absent. """
+        buffer = kline_store.get_buffer(symbole, interval, create=False)
+        if buffer is None:
+            return None
+        key = (symbole, interval)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == buffer.version():
+            self.hits += 1
+            return entry[1]
+
+        with self._lock(key):
+            version = buffer.version()
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1  # Reconstruit par un autre thread pendant l'attente du verrou
+                return entry[1]
+            self.misses += 1
+            rows = buffer.to_array(self.window)
+            state = IndicatorState()
+            for row in rows:
+                state.update(float(row[CLOSE]), int(row[TIMESTAMP]))
+            if buffer.version() == version:  # Pas de Kline ajoutée pendant la construction
+                self.entries[key] = (version, state)
+            return state
+
+    def drop(self, symbole, interval=None):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == symbole and (interval is None or key[1] == interval)]:
+                del self.entries[key]
+
+
+closed_bar_cache = ClosedBarCache()
+
+
+def get_indicator_state(symbole, interval):
+    """
+    Renvoie l'état incrémental du couple (symbole, intervalle), synchronisé avec le stockage
+    des Klines en mémoire : reconstruit sur la fenêtre des INDICATOR_WINDOW dernières Klines
+    clôturées à chaque clôture ou rechargement, réutilisé tel quel pour les ticks en cours.
+    """
+    state = closed_bar_cache.get(symbole, interval)
+    return state if state is not None else IndicatorState()
+
+
+def reset_indicator_state(symbole, interval=None):
+    """ Oublie l'état incrémental d'une monnaie (tous intervalles si `interval` est None). """
+    closed_bar_cache.drop(symbole, interval)
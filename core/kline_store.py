@@ -0,0 +1,179 @@
+import itertools
+import threading
+import numpy as np
+from django.conf import settings
+
+# Colonnes OHLCV stockées dans chaque buffer (dans cet ordre)
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(COLUMNS))
+
+# Générations uniques à tout le processus (un buffer recréé ne reprend pas une ancienne valeur)
+_generations = itertools.count(1)
+
+
+class KlineRingBuffer:
+    """
+    Buffer circulaire numpy de taille fixe contenant les dernières Klines
+    clôturées d'un couple (symbole, intervalle).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, len(COLUMNS)), dtype=np.float64)
+        self.size = 0
+        self.head = 0  # Index de la prochaine écriture
+        # Change quand des Klines existantes sont modifiées (rechargement, remplacement de la dernière)
+        self.generation = next(_generations)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _last_index(self):
+        return (self.head - 1) % self.capacity
+
+    def append(self, timestamp, open_price, high_price, low_price, close_price, volume):
+        """
+        Ajoute une Kline. Si elle porte le même timestamp que la dernière, elle la remplace
+        (mise à jour d'une Kline existante). Les Klines plus anciennes sont ignorées.
+        """
+        row = (timestamp, open_price, high_price, low_price, close_price, volume)
+        with self.lock:
+            if self.size:
+                last_timestamp = self.data[self._last_index(), TIMESTAMP]
+                if timestamp == last_timestamp:
+                    self.data[self._last_index()] = row
+                    self.generation = next(_generations)
+                    return
+                if timestamp < last_timestamp:
+                    return
+            self.data[self.head] = row
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, rows):
+        """ Ajoute plusieurs Klines (itérable de tuples OHLCV ordonnés chronologiquement). """
+        for row in rows:
+            self.append(*row)
+
+    def clear(self):
+        with self.lock:
+            self.size = 0
+            self.head = 0
+            self.generation = next(_generations)
+
+    def version(self):
+        """ (génération, timestamp de la dernière Kline) : change dès que le contenu du buffer change. """
+        with self.lock:
+            if not self.size:
+                return self.generation, None
+            return self.generation, int(self.data[self._last_index(), TIMESTAMP])
+
+    def to_array(self, limit=None):
+        """ Renvoie une copie chronologique (plus ancienne -> plus récente) des dernières lignes. """
+        with self.lock:
+            n = self.size if limit is None else min(limit, self.size)
+            if n == 0:
+                return np.empty((0, len(COLUMNS)), dtype=np.float64)
+            start = (self.head - n) % self.capacity
+            if start + n <= self.capacity:
+                return self.data[start:start + n].copy()
+            return np.concatenate((self.data[start:], self.data[:self.head]))
+
+    def column(self, column, limit=None):
+        return self.to_array(limit)[:, column]
+
+    def last(self):
+        """ Renvoie la dernière Kline (ligne numpy) ou None si le buffer est vide. """
+        with self.lock:
+            if not self.size:
+                return None
+            return self.data[self._last_index()].copy()
+
+
+class KlineStore:
+    """
+    Stockage en mémoire (propre au processus) des Klines clôturées par (symbole, intervalle).
+    Évite de relire PostgreSQL à chaque tick pour le calcul des indicateurs.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or getattr(settings, "KLINE_STORE_CAPACITY", 500)
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def get_buffer(self, symbole, interval, create=True):
+        key = (symbole, interval)
+        buffer = self.buffers.get(key)
+        if buffer is None and create:
+            with self.lock:
+                buffer = self.buffers.setdefault(key, KlineRingBuffer(self.capacity))
+        return buffer
+
+    def has(self, symbole, interval):
+        buffer = self.buffers.get((symbole, interval))
+        return buffer is not None and len(buffer) > 0
+
+    def append(self, symbole, interval, timestamp, open_price, high_price, low_price, close_price, volume):
+        self.get_buffer(symbole, interval).append(
+            timestamp, open_price, high_price, low_price, close_price, volume
+        )
+
+    def append_kline(self, kline):
+        """ Ajoute un objet Kline (ou tout objet exposant les mêmes attributs). """
+        self.append(
+            kline.symbole, kline.intervalle, kline.timestamp,
+            kline.open_price, kline.high_price, kline.low_price, kline.close_price, kline.volume
+        )
+
+    def load(self, symbole, interval, rows):
+        """ Remplace le contenu du buffer par des lignes OHLCV (chronologiques). """
+        buffer = self.get_buffer(symbole, interval)
+        buffer.clear()
+        buffer.extend(rows)
+
+    def load_binance_klines(self, symbole, interval, klines):
+        """ Remplit le buffer à partir de la réponse brute de l'API REST Binance. """
+        self.load(symbole, interval, (
+            (k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in klines
+        ))
+
+    def load_from_db(self, symbole, interval, limit=None):
+        """ Remplit le buffer depuis la base (repli si l'historique n'a pas été chargé en mémoire). """
+        from core.models import Kline
+        limit = limit or self.capacity
+        rows = list(
+            Kline.objects.filter(symbole=symbole, intervalle=interval)
+            .order_by("-timestamp")
+            .values_list("timestamp", "open_price", "high_price", "low_price", "close_price", "volume")[:limit]
+        )
+        rows.reverse()
+        self.load(symbole, interval, rows)
+        return len(rows)
+
+    def get_closes(self, symbole, interval, limit=None):
+        """ Renvoie les derniers prix de clôture sous forme de tableau numpy chronologique. """
+        buffer = self.get_buffer(symbole, interval, create=False)
+        if buffer is None:
+            return np.empty(0, dtype=np.float64)
+        return buffer.column(CLOSE, limit)
+
+    def get_last(self, symbole, interval):
+        buffer = self.get_buffer(symbole, interval, create=False)
+        return buffer.last() if buffer is not None else None
+
+    def get_last_close(self, symbole, interval="1m"):
+        last = self.get_last(symbole, interval)
+        return None if last is None else float(last[CLOSE])
+
+    def get_last_timestamp(self, symbole, interval="1m"):
+        last = self.get_last(symbole, interval)
+        return None if last is None else int(last[TIMESTAMP])
+
+    def drop_symbol(self, symbole):
+        with self.lock:
+            for key in [key for key in self.buffers if key[0] == symbole]:
+                del self.buffers[key]
+
+
+kline_store = KlineStore()
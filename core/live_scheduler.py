@@ -0,0 +1,44 @@
+import time
+
+from core.kline_store import kline_store
+
+
+class LiveRecomputeScheduler:
+    """
+    Décide, pour chaque tick non clôturé, quels intervalles recalculer.
+
+    Un couple (symbole, intervalle) est recalculé si sa cadence (secondes, 0 = chaque tick) est
+    écoulée depuis le dernier recalcul, si le prix a varié de plus de `seuil_variation` % depuis,
+    ou si une nouvelle Kline de cet intervalle a été clôturée (fenêtre des indicateurs changée).
+    """
+
+    def __init__(self, cadences=None, seuil_variation=0.0):
+        self.cadences = dict(cadences or {})
+        self.seuil_variation = seuil_variation / 100.0
+        self.derniers = {}  # (symbole, intervalle) -> (instant, prix, timestamp de la dernière Kline clôturée)
+        self.nb_calculs = 0
+        self.nb_ignores = 0
+
+    def due(self, symbole, interval, prix, maintenant=None):
+        cadence = self.cadences.get(interval, 0)
+        if cadence <= 0:
+            self.nb_calculs += 1
+            return True
+
+        maintenant = time.time() if maintenant is None else maintenant
+        derniere_cloture = kline_store.get_last_timestamp(symbole, interval)
+        precedent = self.derniers.get((symbole, interval))
+        if precedent is not None:
+            instant, prix_precedent, cloture_precedente = precedent
+            if (
+                maintenant - instant < cadence
+                and cloture_precedente == derniere_cloture
+                and not (self.seuil_variation and prix_precedent and abs(prix - prix_precedent) / prix_precedent >= self.seuil_variation)
+            ):
+                self.nb_ignores += 1
+                return False
+
+        self.derniers[(symbole, interval)] = (maintenant, prix, derniere_cloture)
+        self.nb_calculs += 1
+        return True
+
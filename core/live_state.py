@@ -0,0 +1,144 @@
+import threading
+import time
+
+from core.indicator_history import INDICATOR_FIELDS
+
+LIVE_INTERVALS = ("1m", "3m", "5m", "15m", "1h", "4h", "1d")
+
+
+def split_indicator_field(name):
+    """ "stoch_rsi_1m" -> ("stoch_rsi", "1m") ; None si ce n'est pas un champ indicateur de Monnaie. """
+    indicator, _, interval = name.rpartition("_")
+    if indicator in INDICATOR_FIELDS and interval in LIVE_INTERVALS:
+        return indicator, interval
+    return None
+
+
+class LiveIndicatorStore:
+    """
+    Valeurs temps réel des indicateurs par (symbole, intervalle), tenues en mémoire.
+
+    Remplace la réécriture de la ligne Monnaie (≈ 60 colonnes) à chaque calcul : seules les
+    entrées modifiées sont recopiées toutes les `snapshot_seconds` dans la table étroite LiveIndicator.
+    """
+
+    def __init__(self):
+        self.values = {}  # (symbole, intervalle) -> {indicateur: valeur}
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.snapshot_seconds = 0
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def start(self, snapshot_seconds):
+        """ Charge le dernier snapshot puis démarre la sauvegarde périodique. """
+        if self.thread is not None:
+            return
+        self.snapshot_seconds = max(snapshot_seconds, 1)
+        self.load()
+        self.thread = threading.Thread(target=self.run, name="live-indicator-snapshot", daemon=True)
+        self.thread.start()
+        print(f"✅ [LIVE] Indicateurs temps réel en mémoire, snapshot toutes les {self.snapshot_seconds}s")
+
+    def run(self):
+        while True:
+            time.sleep(self.snapshot_seconds)
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"❌ [ERROR] Snapshot des indicateurs temps réel : {e}")
+
+    def update(self, symbole, interval, indicateurs):
+        with self.lock:
+            self.values[(symbole, interval)] = {field: indicateurs.get(field) for field in INDICATOR_FIELDS}
+            self.dirty.add((symbole, interval))
+
+    def get(self, symbole, indicator, interval, default=None):
+        valeurs = self.values.get((symbole, interval))
+        if valeurs is None:
+            return default
+        return valeurs.get(indicator, default)
+
+    def has(self, symbole, interval):
+        return (symbole, interval) in self.values
+
+    def drop(self, symbole):
+        with self.lock:
+            for key in [key for key in self.values if key[0] == symbole]:
+                del self.values[key]
+                self.dirty.discard(key)
+
+    def load(self):
+        """ Recharge les valeurs depuis la table LiveIndicator (redémarrage). """
+        from core.models import LiveIndicator
+        lignes = LiveIndicator.objects.values("symbole", "intervalle", *INDICATOR_FIELDS)
+        with self.lock:
+            for ligne in lignes:
+                self.values[(ligne.pop("symbole"), ligne.pop("intervalle"))] = ligne
+        return len(self.values)
+
+    def snapshot(self):
+        """ Écrit les entrées modifiées depuis le dernier snapshot (un upsert multi-lignes). """
+        from core.models import LiveIndicator
+        from django.utils.timezone import now
+
+        with self.lock:
+            if not self.dirty:
+                return 0
+            lignes = [
+                LiveIndicator(symbole=symbole, intervalle=interval, updated_at=now(), **self.values[(symbole, interval)])
+                for symbole, interval in self.dirty
+            ]
+            self.dirty = set()
+
+        LiveIndicator.objects.bulk_create(
+            lignes,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["symbole", "intervalle"],
+            update_fields=[*INDICATOR_FIELDS, "updated_at"],
+        )
+        return len(lignes)
+
+
+class MonnaieLiveProxy:
+    """
+    Adaptateur autour d'une instance Monnaie : les attributs `<indicateur>_<intervalle>` sont lus dans
+    le LiveIndicatorStore (valeur de Monnaie à défaut), tout le reste est délégué à la Monnaie.
+    Conserve le contrat `getattr(symbole, f"{indicator}_{interval}")` de IndicatorTest / Calculation.
+    """
+
+    def __init__(self, monnaie, store):
+        object.__setattr__(self, "_monnaie", monnaie)
+        object.__setattr__(self, "_store", store)
+
+    def __getattr__(self, name):
+        monnaie = object.__getattribute__(self, "_monnaie")
+        champ = split_indicator_field(name)
+        if champ is not None:
+            store = object.__getattribute__(self, "_store")
+            if store.has(monnaie.symbole, champ[1]):
+                return store.get(monnaie.symbole, *champ)
+        return getattr(monnaie, name)
+
+    def __setattr__(self, name, value):
+        setattr(object.__getattribute__(self, "_monnaie"), name, value)
+
+    def __str__(self):
+        return str(object.__getattribute__(self, "_monnaie"))
+
+    def __repr__(self):
+        return f"<MonnaieLiveProxy {object.__getattribute__(self, '_monnaie')!r}>"
+
+
+live_indicators = LiveIndicatorStore()
+
+
+def live_monnaie(monnaie):
+    """ Enveloppe la Monnaie dans l'adaptateur si le store temps réel est actif. """
+    if monnaie is None or not live_indicators.enabled:
+        return monnaie
+    return MonnaieLiveProxy(monnaie, live_indicators)
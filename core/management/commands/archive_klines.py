@@ -0,0 +1,28 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from core.archive import archive_available, archive_db_klines
+from core.utils import INTERVALS
+
+
+class Command(BaseCommand):
+    help = "Archive les Klines de la base dans des fichiers Arrow par (symbole, intervalle, mois)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbols", nargs="*", default=None, help="Monnaies à archiver (toutes par défaut)")
+        parser.add_argument("--intervals", nargs="*", default=INTERVALS, help="Intervalles à archiver")
+        parser.add_argument("--before-days", type=int, default=None, help="N'archive que les Klines plus anciennes que N jours")
+
+    def handle(self, *args, **options):
+        if not archive_available():
+            raise CommandError("pyarrow n'est pas installé : pip install pyarrow")
+        before_ms = None
+        if options["before_days"] is not None:
+            limite = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=options["before_days"])
+            before_ms = int(limite.timestamp() * 1000)
+
+        total = 0
+        for symbole, interval, nb in archive_db_klines(options["intervals"], options["symbols"], before_ms):
+            if nb:
+                self.stdout.write(f"📦 {symbole} {interval} : {nb} Klines archivées")
+            total += nb
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} Klines archivées"))
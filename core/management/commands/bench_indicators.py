@@ -0,0 +1,58 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.batch_indicators import compute_indicators_batch
+from core.indicator_backends import BACKENDS, available_backends
+from core.indicators import IndicatorState
+
+
+def build_series(nb_series, length):
+    """ Marches aléatoires synthétiques (une par monnaie). """
+    series = []
+    for i in range(nb_series):
+        rng = random.Random(i)
+        closes = [rng.uniform(0.1, 1000)]
+        for _ in range(length - 1):
+            closes.append(max(0.0001, closes[-1] * (1 + rng.gauss(0, 0.01))))
+        series.append(closes)
+    return series
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark des backends d'indicateurs (calcul complet sur la fenêtre du temps réel)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--series", type=int, default=500, help="Nombre de couples (symbole, intervalle)")
+        parser.add_argument("--length", type=int, default=101, help="Klines par série (100 clôturées + la Kline en cours)")
+
+    def handle(self, *args, **options):
+        series = build_series(options["series"], options["length"])
+
+        cas = [(f"{nom} (série complète)", lambda c, b=BACKENDS[nom]: b.compute(c)) for nom in available_backends()]
+
+        # Chemin temps réel du moteur incrémental : état déjà à jour, seule la Kline en cours est évaluée
+        states = []
+        for closes in series:
+            state = IndicatorState()
+            for close in closes[:-1]:
+                state.update(close)
+            states.append(state)
+        peeks = iter(range(len(series)))
+        cas.append(("incremental (peek temps réel)", lambda c: states[next(peeks)].peek(c[-1])))
+
+        for nom, compute in cas:
+            start = time.perf_counter()
+            for closes in series:
+                compute(closes)
+            duree = time.perf_counter() - start
+            self.stdout.write(f"{nom:<40} {duree / len(series) * 1e6:>10.1f} µs/série")
+
+        # Toutes les séries en une passe (calculate_indicators_batch)
+        tableau = np.array(series)
+        start = time.perf_counter()
+        compute_indicators_batch(tableau)
+        duree = time.perf_counter() - start
+        self.stdout.write(f"{'numpy batch (toutes les séries)':<40} {duree / len(series) * 1e6:>10.1f} µs/série")
@@ -0,0 +1,62 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from core.ws_decode import JSON_BACKEND, decode_kline_message
+
+
+def build_messages(nb_messages, nb_symbols):
+    """ Génère des messages de flux combiné Binance (kline_1m) synthétiques. """
+    symbols = [f"SYM{i}USDT" for i in range(nb_symbols)]
+    messages = []
+    for i in range(nb_messages):
+        symbole = random.choice(symbols)
+        price = random.uniform(0.1, 100)
+        messages.append(json.dumps({
+            "stream": f"{symbole.lower()}@kline_1m",
+            "data": {
+                "e": "kline", "E": 1700000000000 + i, "s": symbole,
+                "k": {
+                    "t": 1700000000000, "T": 1700000059999, "s": symbole, "i": "1m",
+                    "f": 100, "L": 200, "o": f"{price:.8f}", "c": f"{price * 1.001:.8f}",
+                    "h": f"{price * 1.002:.8f}", "l": f"{price * 0.999:.8f}", "v": "1000.00000000",
+                    "n": 100, "x": i % 30 == 0, "q": "1.0000", "V": "500.0", "Q": "0.500", "B": "0",
+                },
+            },
+        }, separators=(",", ":")))
+    return symbols, messages
+
+
+def decode_legacy(message):
+    """ Ancien chemin : json.loads complet puis conversions float() dans process_kline. """
+    data = json.loads(message)
+    if "data" in data and "e" in data["data"] and data["data"]["e"] == "kline":
+        k = data["data"]["k"]
+        return (k["s"], k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]), k["x"])
+    return None
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark du décodage des messages WebSocket (messages/s sur un cœur)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200000)
+        parser.add_argument("--symbols", type=int, default=400)
+        parser.add_argument("--active-ratio", type=float, default=0.25, help="Part des monnaies actives (filtrage avant parsing)")
+
+    def handle(self, *args, **options):
+        symbols, messages = build_messages(options["messages"], options["symbols"])
+        nb_actives = int(len(symbols) * options["active_ratio"])
+        active_symbols = {symbole: i < nb_actives for i, symbole in enumerate(symbols)}
+
+        cas = [
+            ("json.loads complet (ancien)", lambda m: decode_legacy(m)),
+            (f"fast path {JSON_BACKEND}", lambda m: decode_kline_message(m)),
+            (f"fast path {JSON_BACKEND} + filtre ({options['active_ratio']:.0%} actives)", lambda m: decode_kline_message(m, active_symbols)),
+        ]
+        for nom, decode in cas:
+            start = time.perf_counter()
+            for message in messages:
+                decode(message)
+            duree = time.perf_counter() - start
+            self.stdout.write(f"{nom:<50} {len(messages) / duree:>12,.0f} messages/s")
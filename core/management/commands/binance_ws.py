@@ -1,11 +1,31 @@
+import asyncio
+import atexit
 import json
+import os
+import signal
 import traceback
 import threading
 import time
 from websocket import WebSocketApp
-from django.core.management.base import BaseCommand
-from core.models import Kline, Monnaie, RegulatorSettings
-from core.utils import init_loaded_symbols, TradingRegulator, track_processing_time, execute_strategies, execute_sell_strategy, aggregate_higher_timeframe_klines, calculate_indicators, load_historical_klines, calculate_indicators_with_live, INTERVALS
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Kline, Monnaie, RegulatorSettings, default_cadence_intervalles
+from core.kline_store import kline_store
+from core.queues import ConflatingKlineQueue, ShardedKlinePool
+from core.sharding import read_symbols_file, watch_symbols_file
+from core.ws_decode import decode_kline_message
+from core.reconnect import ReconnectBackoff, backfill_missing_klines, klines_to_aggregate
+from core.write_behind import monnaie_writer
+from core.recording import FrameRecorder
+from core.flusher import KlineFlusher
+from core.aggregator import kline_aggregator
+from core.bulk_loader import bulk_load_klines
+from core.partitions import ensure_kline_partitions
+from core.indicator_history import indicator_history
+from core.indicator_plan import global_indicator_plan
+from core.live_state import live_indicators
+from core.live_scheduler import LiveRecomputeScheduler
+from core.snapshot import catch_up_from_snapshot, read_snapshot, restore_snapshot, snapshot_path, start_periodic_snapshot, write_snapshot
+from core.utils import get_all_usdt_pairs, get_loaded_symbols, init_loaded_symbols, set_initializing, TradingRegulator, track_processing_time, execute_strategies, execute_sell_strategy, aggregate_higher_timeframe_klines, calculate_indicators, calculate_indicators_batch, load_historical_klines, calculate_indicators_with_live, INTERVALS
 import queue
 from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
@@ -24,6 +44,9 @@ try:
     MAX_STREAM_PER_WS = regulator_settings.max_stream_per_ws
     NB_MESSAGES_FLUSH = regulator_settings.nb_messages_flush
     DUREE_MAX_FLUSH = regulator_settings.duree_max_flush
+    DUREE_WRITE_BEHIND_MS = regulator_settings.duree_write_behind_ms
+    CADENCE_INTERVALLES = regulator_settings.cadence_intervalles
+    SEUIL_VARIATION_PRIX = regulator_settings.seuil_variation_prix
     
 
 except Exception as e:
@@ -32,11 +55,44 @@ except Exception as e:
     MAX_STREAM_PER_WS = 5
     NB_MESSAGES_FLUSH = 25
     DUREE_MAX_FLUSH = 5
+    DUREE_WRITE_BEHIND_MS = 500
+    CADENCE_INTERVALLES = default_cadence_intervalles()
+    SEUIL_VARIATION_PRIX = 0.5
     
 
+# Recalcul temps réel des intervalles supérieurs espacé (cadence par intervalle ou variation de prix)
+live_scheduler = LiveRecomputeScheduler(CADENCE_INTERVALLES, SEUIL_VARIATION_PRIX)
+
+
+# ⚙️ Mode d'ingestion WebSocket : "thread" (un WebSocketApp par thread) ou "asyncio" (une seule boucle)
+WS_INGEST_MODE = getattr(settings, "WS_INGEST_MODE", "thread")
+BINANCE_WS_URL = "wss://stream.binance.com:9443/stream"
+BINANCE_MAX_STREAMS_PER_WS = 1024  # Limite Binance de flux par connexion
+BINANCE_SUBSCRIBE_BATCH = 200  # Nombre de flux par message SUBSCRIBE
+BINANCE_SUBSCRIBE_DELAY = 0.25  # Binance limite à 5 messages entrants par seconde et par connexion
+WS_STREAMS_PER_CONNECTION = min(getattr(settings, "WS_STREAMS_PER_CONNECTION", BINANCE_MAX_STREAMS_PER_WS), BINANCE_MAX_STREAMS_PER_WS)
+
+# ⚙️ Mode des workers : "pool" (workers génériques sur une queue commune) ou "sharded" (un worker par groupe de symboles)
+WORKER_MODE = getattr(settings, "WORKER_MODE", "pool")
+
+# ⚙️ Agrégation 3m..1d en mémoire à chaque Kline 1m clôturée (au lieu des requêtes par intervalle)
+STREAMING_AGGREGATION = getattr(settings, "STREAMING_AGGREGATION", False)
+
+# ⚙️ Indicateurs des Klines clôturées calculés pour toutes les monnaies du flush en une passe numpy par intervalle
+BATCH_INDICATORS = getattr(settings, "BATCH_INDICATORS", False)
+
+# ⚙️ Indicateurs temps réel en mémoire + table LiveIndicator au lieu des colonnes de Monnaie
+LIVE_INDICATOR_STORE = getattr(settings, "LIVE_INDICATOR_STORE", False)
+LIVE_INDICATOR_SNAPSHOT_SECONDS = getattr(settings, "LIVE_INDICATOR_SNAPSHOT_SECONDS", 10)
+
+# ⚙️ Redémarrage à chaud : snapshot périodique de l'état mémoire (et sur SIGTERM)
+WARM_START = getattr(settings, "WARM_START", False)
+WARM_START_SNAPSHOT_SECONDS = getattr(settings, "WARM_START_SNAPSHOT_SECONDS", 60)
+WARM_START_MAX_AGE = getattr(settings, "WARM_START_MAX_AGE", 6 * 3600)
 
 #max_queue = 5
-kline_queue = queue.Queue()
+# Les ticks non clôturés d'un même symbole en attente sont fusionnés (seul le plus récent est traité)
+kline_queue = ConflatingKlineQueue() if getattr(settings, "CONFLATE_KLINE_QUEUE", True) else queue.Queue()
 executor = ThreadPoolExecutor(max_workers=MAX_QUEUE)
 #MAX_STREAMS_PER_WS = 75
 active_websockets = []
@@ -44,11 +100,29 @@ klines_cloturees = []
 monnaies_a_aggreger = set()
 lock = threading.Lock()  # 🔒 Protection des accès concurrents
 kline_timestamps = {}
-
-def process_kline(item):
+# Thread d'écriture dédié (DEDICATED_FLUSHER) : save_closed_klines résolu à l'appel
+kline_flusher = KlineFlusher(
+    lambda *batch: save_closed_klines(*batch), NB_MESSAGES_FLUSH, DUREE_MAX_FLUSH,
+    capacity=getattr(settings, "FLUSH_QUEUE_CAPACITY", 10000),
+)
+# Enregistrement optionnel des trames brutes (--record) pour la commande replay
+recorder = None
+# Monnaies gérées par ce processus (None = toutes), fixées par --symbols-file en mode multi-processus
+univers_symboles = None
+
+def get_univers_symboles():
+    if univers_symboles is not None:
+        return list(univers_symboles)
+    return list(Monnaie.objects.values_list("symbole", flat=True))
+
+def process_kline(item, shard=None):
+    """
+    Traite une Kline reçue. Avec `shard` (mode "sharded"), les Klines clôturées sont
+    accumulées dans le buffer propre au shard, sans verrou global.
+    """
     global klines_cloturees, monnaies_a_aggreger
     symbole = item["symbole"]
-    kline_data = item["kline"]
+    tick = item["kline"]  # KlineTick déjà décodé (core/ws_decode.py)
     timestamp_reception = item["timestamp_reception"]
     #deb_kline = item["timestamp_production"]
       
@@ -56,43 +130,48 @@ def process_kline(item):
         #print(f"✅ [DEBUG] Process Kline : {symbole} debut de process_kline {kline_data}")
 
         from core.utils import aggregate_higher_timeframe_klines, calculate_indicators, execute_strategies, execute_sell_strategy, get_loaded_symbols
-        from core.models import Kline, Monnaie
+        from core.models import Monnaie
         
         if not get_loaded_symbols().get(symbole, False):
             #print(f"✅ [DEBUG] Process Kline : {symbole} | pas initialisé")
             return
         #print(f"✅ [DEBUG] Process Kline : {symbole} | initialisé")
 
-        # Traitement de la Kline
-        is_closed = kline_data["x"]
-        
-        kline = Kline(
-            symbole=symbole,
-            intervalle="1m",
-            timestamp=kline_data["t"],
-            open_price=float(kline_data["o"]),
-            high_price=float(kline_data["h"]),
-            low_price=float(kline_data["l"]),
-            close_price=float(kline_data["c"]),
-            volume=float(kline_data["v"])
-        )
-        #print(f"✅ [DEBUG] Process Kline : {symbole} | kline: {kline}")
+        # Traitement de la Kline (valeurs déjà converties au décodage). Le KlineTick expose les mêmes
+        # attributs que le modèle Kline : l'objet ORM n'est créé qu'à l'écriture en base (upsert_klines)
+        is_closed = tick.is_closed
+        kline = tick
 
         # Mise à jour uniquement pour affichage en temps réel
-        Monnaie.objects.filter(symbole=symbole).update(
-            prix_actuel=float(kline.close_price),
-            prix_max=float(kline.high_price),
-            prix_min=float(kline.low_price)
-        )
+        if monnaie_writer.enabled:
+            monnaie_writer.stage(symbole, prix_actuel=tick.close_price, prix_max=tick.high_price, prix_min=tick.low_price)
+        else:
+            Monnaie.objects.filter(symbole=symbole).update(
+                prix_actuel=tick.close_price,
+                prix_max=tick.high_price,
+                prix_min=tick.low_price
+            )
         
         if is_closed:
-            with lock:  # 🔒 Sécurisation des accès
-                klines_cloturees.append(kline)
-                monnaies_a_aggreger.add(symbole)
-                kline_timestamps[(symbole, kline.intervalle, kline.timestamp)] = timestamp_reception
+            # Disponible immédiatement pour les indicateurs, sans attendre le flush en base
+            kline_store.append_kline(kline)
+            if kline_flusher.running:
+                # Thread d'écriture dédié : bloque si le canal est plein (contre-pression)
+                kline_flusher.put(kline, timestamp_reception)
+            elif shard is not None:
+                # Un seul thread par shard : pas de verrou nécessaire
+                shard.klines_cloturees.append(kline)
+                shard.monnaies_a_aggreger.add(symbole)
+                shard.kline_timestamps[(symbole, kline.intervalle, kline.timestamp)] = timestamp_reception
+            else:
+                with lock:  # 🔒 Sécurisation des accès
+                    klines_cloturees.append(kline)
+                    monnaies_a_aggreger.add(symbole)
+                    kline_timestamps[(symbole, kline.intervalle, kline.timestamp)] = timestamp_reception
         else:
             for interval in INTERVALS:
-                calculate_indicators(symbole, interval, kline=kline, is_closed=is_closed)
+                if live_scheduler.due(symbole, interval, tick.close_price):
+                    calculate_indicators(symbole, interval, kline=kline, is_closed=is_closed)
             temps_traitement = time.time() - timestamp_reception
             if temps_traitement >2:
                 print(f"🕒 [DEBUG] Traitement {symbole} terminé en {temps_traitement:.3f}s Sans test des strategies")
@@ -109,7 +188,11 @@ def process_kline(item):
 
 
         # Si on atteint un certain seuil, on sauvegarde en batch
-        if (len(klines_cloturees) >= NB_MESSAGES_FLUSH or (kline_timestamps and time.time() - min(kline_timestamps.values()) > DUREE_MAX_FLUSH)):
+        if kline_flusher.running:
+            pass  # Taille / délai gérés par le thread d'écriture
+        elif shard is not None:
+            flush_shard_if_due(shard)
+        elif (len(klines_cloturees) >= NB_MESSAGES_FLUSH or (kline_timestamps and time.time() - min(kline_timestamps.values()) > DUREE_MAX_FLUSH)):
             flush_klines()
    
         
@@ -117,7 +200,7 @@ def process_kline(item):
         
     except Exception as e:
         print(f"❌ [ERROR] Erreur lors du traitement d'une Kline pour {symbole} : {e}")
-        print(f"🔍 [DETAILS] Données de la Kline : {kline}")
+        print(f"🔍 [DETAILS] Données de la Kline : {tick!r}")
         print(f"🔍 [TRACEBACK]")
         traceback.print_exc()
 
@@ -125,6 +208,10 @@ def flush_klines():
     """ Enregistre les Klines clôturées et exécute aggregate en batch tout en mesurant le temps de traitement le plus long """
     global klines_cloturees, monnaies_a_aggreger, kline_timestamps
 
+    if kline_flusher.running:
+        kline_flusher.drain()
+        return
+
     if not klines_cloturees:
         print("⚠️ [DEBUG] Aucun flush : Aucune Kline à sauvegarder.")
         return
@@ -145,73 +232,132 @@ def flush_klines():
         monnaies_a_aggreger.clear()
         kline_timestamps.clear()
 
-        #print(f"📌 [DEBUG] fin du with lock {len(klines_cloturees)} Klines...")
-        max_processing_time = 0  # ⏳ Initialisation du max
-        worst_case_kline = None  # 🔍 Stockage de la pire Kline
-        min_time= 0
-
-        with transaction.atomic():  # 🔄 Garantit l'intégrité des données
-            # Charger les Klines existantes pour éviter le problème de clé primaire manquante
-            existing_klines = { (k.symbole, k.intervalle, k.timestamp): k.id 
-                for k in Kline.objects.filter(
-                    symbole__in=[k.symbole for k in klines_a_sauvegarder],
-                    intervalle__in=[k.intervalle for k in klines_a_sauvegarder],
-                    timestamp__in=[k.timestamp for k in klines_a_sauvegarder]
-                )
-            }
-
-            nouvelles_klines = []
-            mises_a_jour = []
-
-            for kline in klines_a_sauvegarder:
-                key = (kline.symbole, kline.intervalle, kline.timestamp)
-                kline_time = kline_timestamps_a_traiter.get(key, time.time())
-                min_time = min(kline_time, min_time) if min_time else kline_time
-
-                if key in existing_klines:
-                    # 🔥 On récupère l'ID de l'objet existant avant mise à jour
-                    kline.id = existing_klines[key]
-                    mises_a_jour.append(kline)
-                else:
-                    nouvelles_klines.append(kline)
-
-            if nouvelles_klines:
-                #print("📌 [DEBUG] Sauvegarde des Klines en base (Create)...")
-
-                Kline.objects.bulk_create(nouvelles_klines)
-
-            if mises_a_jour:
-                #print("📌 [DEBUG] Sauvegarde des Klines en base (update)...")
-
-                Kline.objects.bulk_update(
-                    mises_a_jour, ["close_price", "high_price", "low_price", "volume"]
-                )
-
-            for symbole in monnaies_a_traiter:
-                last_kline_1m = Kline.objects.filter(symbole=symbole, intervalle="1m").order_by("-timestamp").first()
-                if last_kline_1m:
-                    #print(f"📌 [DEBUG] Agrégation des Klines pour {symbole}...")
-                    aggregate_higher_timeframe_klines(symbole, last_kline_1m)
-                    #print(f"✅ [DEBUG] Agrégation terminée pour {symbole}.")
-                    if (time.time()-min_time) < 2 :
-                        execute_strategies(symbole)
-                        execute_sell_strategy(symbole)
-                    #else:
-                    #    print(f"🕒 [DEBUG] Traitement {symbole} Sans test des strategies dans flush")
-                else:
-                    print(f"⚠️ [DEBUG] Aucune Kline 1m trouvée pour {symbole}, agrégation annulée.")
-        if min_time==0:
-            max_processing_time = 0
-        else:    
-            max_processing_time = time.time()  -  min_time
-        print(f"⚠️ [DEBUG] Temps de traitement MAX : {max_processing_time:.3f}s")
-
-        #print(f"✅ [DEBUG] {len(nouvelles_klines)} nouvelles Klines ajoutées, {len(mises_a_jour)} mises à jour.")
+        save_closed_klines(klines_a_sauvegarder, monnaies_a_traiter, kline_timestamps_a_traiter)
     finally:
         if lock.locked():  # ✅ Vérification avant libération du lock
             lock.release()
             print("🔓 [DEBUG] Lock relâché après flush.")
 
+def flush_shard_if_due(shard, force=False):
+    """ Flush du buffer d'un shard si le seuil de taille ou de durée est atteint (sans verrou global). """
+    if not shard.klines_cloturees:
+        return
+    if not force and len(shard.klines_cloturees) < NB_MESSAGES_FLUSH and time.time() - min(shard.kline_timestamps.values()) <= DUREE_MAX_FLUSH:
+        return
+
+    klines_a_sauvegarder = shard.klines_cloturees
+    monnaies_a_traiter = shard.monnaies_a_aggreger
+    kline_timestamps_a_traiter = shard.kline_timestamps
+    shard.klines_cloturees = []
+    shard.monnaies_a_aggreger = set()
+    shard.kline_timestamps = {}
+
+    print(f"📌 [DEBUG] Flush du shard {shard.index} : {len(klines_a_sauvegarder)} Klines...")
+    save_closed_klines(klines_a_sauvegarder, monnaies_a_traiter, kline_timestamps_a_traiter)
+
+def upsert_klines(klines):
+    """
+    Insère ou met à jour un batch de Klines (KlineTick ou Kline) en une seule requête, via la contrainte
+    unique (symbole, intervalle, timestamp). Les objets Kline ne sont instanciés qu'ici.
+    """
+    if not klines:
+        return
+    # ON CONFLICT refuse deux fois la même clé dans un batch : la dernière occurrence gagne
+    klines_uniques = {(k.symbole, k.intervalle, k.timestamp): k for k in klines}
+    Kline.objects.bulk_create(
+        [
+            Kline(
+                symbole=k.symbole, intervalle=k.intervalle, timestamp=k.timestamp, open_price=k.open_price,
+                high_price=k.high_price, low_price=k.low_price, close_price=k.close_price, volume=k.volume,
+            )
+            for k in klines_uniques.values()
+        ],
+        update_conflicts=True,
+        unique_fields=["symbole", "intervalle", "timestamp"],
+        update_fields=["open_price", "close_price", "high_price", "low_price", "volume"],
+    )
+
+def aggregate_streaming(klines_1m, terminees):
+    """
+    Agrégation en continu (core/aggregator.py) : les Klines supérieures terminées par ce batch
+    (kline_aggregator.add_batch, appelé hors transaction) sont écrites en un seul upsert, ajoutées
+    au kline_store, puis leurs indicateurs sont recalculés.
+    """
+    if terminees:
+        bulk_load_klines([
+            (k.symbole, k.intervalle, k.timestamp, k.open_price, k.high_price, k.low_price, k.close_price, k.volume)
+            for k in terminees
+        ], update=True)
+        for kline in terminees:
+            kline_store.append_kline(kline)
+
+    a_recalculer = {(k.symbole, "1m") for k in klines_1m}
+    a_recalculer.update((k.symbole, k.intervalle) for k in terminees)
+    if BATCH_INDICATORS:
+        calculate_indicators_batch(a_recalculer)
+    else:
+        for symbole, interval in a_recalculer:
+            calculate_indicators(symbole, interval)
+
+def save_closed_klines(klines_a_sauvegarder, monnaies_a_traiter, kline_timestamps_a_traiter):
+    """ Sauvegarde un batch de Klines clôturées puis lance l'agrégation et les stratégies des monnaies concernées. """
+    max_processing_time = 0  # ⏳ Initialisation du max
+    worst_case_kline = None  # 🔍 Stockage de la pire Kline
+    min_time= 0
+
+    # Agrégation en mémoire avant la transaction : l'amorçage d'un groupe peut relire des Klines 1m via l'API REST
+    terminees = kline_aggregator.add_batch(klines_a_sauvegarder) if STREAMING_AGGREGATION else []
+
+    with transaction.atomic():  # 🔄 Garantit l'intégrité des données
+        # Upsert en une seule requête (INSERT ... ON CONFLICT DO UPDATE sur symbole/intervalle/timestamp) :
+        # plus de lecture préalable des Klines existantes
+        for kline in klines_a_sauvegarder:
+            kline_time = kline_timestamps_a_traiter.get((kline.symbole, kline.intervalle, kline.timestamp), time.time())
+            min_time = min(kline_time, min_time) if min_time else kline_time
+
+        upsert_klines(klines_a_sauvegarder)
+
+        if STREAMING_AGGREGATION:
+            aggregate_streaming(klines_a_sauvegarder, terminees)
+
+        # Klines 1m à agréger par monnaie, directement depuis le batch (pas de relecture en base) : la dernière,
+        # plus celles qui terminent un groupe (batch de backfill après une coupure)
+        klines_a_agreger = klines_to_aggregate(klines_a_sauvegarder)
+
+        if BATCH_INDICATORS and not STREAMING_AGGREGATION:
+            # Agrégation de toutes les monnaies, puis indicateurs en une passe vectorisée par intervalle
+            paires = set()
+            for symbole in monnaies_a_traiter:
+                for kline_1m in klines_a_agreger.get(symbole, []):
+                    intervalles = aggregate_higher_timeframe_klines(symbole, kline_1m, compute_indicators=False)
+                    paires.update((symbole, interval) for interval in intervalles)
+            calculate_indicators_batch(paires)
+
+        for symbole in monnaies_a_traiter:
+            klines_1m = klines_a_agreger.get(symbole)
+            if klines_1m:
+                if not STREAMING_AGGREGATION and not BATCH_INDICATORS:
+                    #print(f"📌 [DEBUG] Agrégation des Klines pour {symbole}...")
+                    for kline_1m in klines_1m[:-1]:
+                        aggregate_higher_timeframe_klines(symbole, kline_1m, compute_indicators=False)
+                    aggregate_higher_timeframe_klines(symbole, klines_1m[-1])
+                #print(f"✅ [DEBUG] Agrégation terminée pour {symbole}.")
+                if (time.time()-min_time) < 2 :
+                    execute_strategies(symbole)
+                    execute_sell_strategy(symbole)
+                #else:
+                #    print(f"🕒 [DEBUG] Traitement {symbole} Sans test des strategies dans flush")
+            else:
+                print(f"⚠️ [DEBUG] Aucune Kline 1m trouvée pour {symbole}, agrégation annulée.")
+
+        # Indicateurs des Klines clôturées de ce flush : un seul upsert multi-lignes
+        indicator_history.flush()
+    if min_time==0:
+        max_processing_time = 0
+    else:    
+        max_processing_time = time.time()  -  min_time
+    print(f"⚠️ [DEBUG] Temps de traitement MAX : {max_processing_time:.3f}s")
+
 def process_kline_from_queue():
     print("✅ [DEBUG] Démarrage d'un thread de traitement de la queue")
     while True:
@@ -225,29 +371,65 @@ def process_kline_from_queue():
             print(f"❌ [ERROR] Erreur lors du traitement de la Kline depuis la queue : {e}")
 
 
+def enqueue_kline_message(message):
+    """
+    Décode un message du flux combiné Binance et transmet la Kline au pool de traitement.
+    `kline_queue` est thread-safe : la fonction peut être appelée depuis un thread WebSocketApp
+    comme depuis la boucle asyncio.
+    Les messages des monnaies non chargées sont écartés avant le parsing JSON.
+    """
+    try:
+        timestamp_reception = time.time()  # Pour les logs de latence
+        if recorder is not None:
+            recorder.write(timestamp_reception, message)
+        tick = decode_kline_message(message, get_loaded_symbols())
+        if tick is not None:
+            enqueue_tick(tick, timestamp_reception)
+            #print(f"🕒 [DEBUG] Kline reçue mise en queue pour {symbole}")
+    except Exception as e:
+        print(f"❌ [ERROR] Erreur lors de la réception d'un message : {e}")
+
+def enqueue_tick(tick, timestamp_reception=None):
+    kline = {
+        "symbole": tick.symbole,
+        "kline": tick,
+        "timestamp_reception": timestamp_reception or time.time()
+    }
+    kline_queue.put(kline)
+
+def backfill_after_reconnect(symbols):
+    """
+    Après une reconnexion, récupère via REST les Klines 1m clôturées manquées pendant la coupure
+    et les injecte dans la queue avant les messages temps réel (flush + agrégation normaux).
+    """
+    loaded = get_loaded_symbols()
+    try:
+        backfill_missing_klines([s for s in symbols if loaded.get(s, False)], enqueue_tick)
+    except Exception as e:
+        print(f"❌ [ERROR] Backfill après reconnexion impossible : {e}")
+
+def subscribe_messages(streams, ws_id):
+    """ Messages SUBSCRIBE (par lots de BINANCE_SUBSCRIBE_BATCH flux) d'une connexion. """
+    for i in range(0, len(streams), BINANCE_SUBSCRIBE_BATCH):
+        yield json.dumps({
+            "method": "SUBSCRIBE",
+            "params": streams[i:i + BINANCE_SUBSCRIBE_BATCH],
+            "id": ws_id * 1000 + i // BINANCE_SUBSCRIBE_BATCH,
+        })
+
+def group_symbols(symbols):
+    """ Découpe les monnaies en groupes de WS_STREAMS_PER_CONNECTION flux (une connexion par groupe). """
+    return [symbols[i:i + WS_STREAMS_PER_CONNECTION] for i in range(0, len(symbols), WS_STREAMS_PER_CONNECTION)]
+
 def start_single_websocket(symbols, ws_id):
-    streams = "/".join([f"{s.lower()}@kline_1m" for s in symbols])
-    url = f"wss://stream.binance.com:9443/stream?streams={streams}"
-    print(f"🌐 [WS {ws_id}] Connexion à {url}")
+    # Abonnement par messages SUBSCRIBE : l'URL reste courte quel que soit le nombre de flux
+    streams = [f"{s.lower()}@kline_1m" for s in symbols]
+    url = BINANCE_WS_URL
+    print(f"🌐 [WS {ws_id}] Connexion à {url} ({len(streams)} flux)")
 
     from datetime import datetime, timezone
     def on_message(ws, message):
-        try:
-            data = json.loads(message)
-            if "data" in data and "e" in data["data"] and data["data"]["e"] == "kline":
-                kline_data = data["data"]["k"]
-                #timesstamp_production = data["data"]["E"]
-                symbole = kline_data["s"]
-                kline = {
-                    "symbole": symbole,
-                    "kline": kline_data,
-                    #"timesstamp_production" : timesstamp_production,
-                    "timestamp_reception": time.time()  # Pour les logs de latence
-                }
-                kline_queue.put(kline)
-                #print(f"🕒 [DEBUG] Kline reçue mise en queue pour {symbole}")
-        except Exception as e:
-            print(f"❌ [ERROR] Erreur lors de la réception d'un message : {e}")
+        enqueue_kline_message(message)
   
     
 
@@ -338,48 +520,236 @@ def start_single_websocket(symbols, ws_id):
         print(f"❌ [ERROR] WebSocket {ws.ws_id} : {error}")
 
     def on_close(ws, close_status_code, close_msg):
-        print(f"🔴 WebSocket {ws.ws_id} fermé. Reconnexion dans 10 secondes...")
-        time.sleep(10)
-        start_single_websocket(symbols, ws_id)
+        print(f"🔴 WebSocket {ws.ws_id} fermé (code {close_status_code}).")
+
+    backoff = ReconnectBackoff()
+    nb_connexions = 0
 
     def on_open(ws):
+        nonlocal nb_connexions
         ws.ws_id = ws_id
         ws.message_count = 0
         ws.start_count_time = time.time()
-        print(f"🟢 WebSocket {ws.ws_id} connecté pour {', '.join(symbols)}")
-
-    ws = WebSocketApp(url, on_message=on_message, on_error=on_error, on_close=on_close)
-    ws.on_open = on_open
-    ws.run_forever()
+        for message in subscribe_messages(streams, ws_id):
+            ws.send(message)
+            time.sleep(BINANCE_SUBSCRIBE_DELAY)
+        backoff.mark_connected()
+        nb_connexions += 1
+        print(f"🟢 WebSocket {ws.ws_id} connecté : {len(streams)} flux")
+        if nb_connexions > 1:
+            # Bloque la réception (même thread) tant que le trou n'est pas comblé
+            backfill_after_reconnect(symbols)
+
+    # Boucle de reconnexion (pas de récursion : la pile ne grossit pas à chaque coupure)
+    while True:
+        ws = WebSocketApp(url, on_message=on_message, on_error=on_error, on_close=on_close)
+        ws.on_open = on_open
+        ws.ws_id = ws_id
+        ws.run_forever()
+        delay = backoff.next_delay()
+        print(f"🔄 [WS {ws_id}] Reconnexion dans {delay:.1f} secondes...")
+        time.sleep(delay)
 
 def start_websockets():
     
-    symbols = list(Monnaie.objects.values_list("symbole", flat=True))
-    grouped_symbols = [symbols[i:i + MAX_STREAM_PER_WS] for i in range(0, len(symbols), MAX_STREAM_PER_WS)]
-    grouped_symbols = grouped_symbols[:5]
+    symbols = get_univers_symboles()
+    grouped_symbols = group_symbols(symbols)
+    print(f"🟢 [WS] {len(symbols)} monnaies réparties sur {len(grouped_symbols)} connexion(s)")
     threading.Thread(target=periodic_regulation, daemon=True).start()
 
     for i, symbol_group in enumerate(grouped_symbols):
-        print(f"🟢 Démarrage WebSocket Thread {i + 1} pour {symbol_group}")
+        print(f"🟢 Démarrage WebSocket Thread {i + 1} ({len(symbol_group)} monnaies)")
         ws_thread = threading.Thread(target=start_single_websocket, args=(symbol_group, i + 1))
         ws_thread.start()
         active_websockets.append(ws_thread)
         time.sleep(2)
 
+async def run_async_websocket(symbols, ws_id, connect):
+    """ Connexion WebSocket asynchrone : abonnement par messages SUBSCRIBE puis lecture continue. """
+    streams = [f"{s.lower()}@kline_1m" for s in symbols]
+    backoff = ReconnectBackoff()
+    nb_connexions = 0
+    while True:
+        try:
+            async with connect(BINANCE_WS_URL, ping_interval=20, max_queue=None) as ws:
+                for message in subscribe_messages(streams, ws_id):
+                    await ws.send(message)
+                    await asyncio.sleep(BINANCE_SUBSCRIBE_DELAY)
+                print(f"🟢 [ASYNC WS {ws_id}] Connecté : {len(streams)} flux")
+                backoff.mark_connected()
+                nb_connexions += 1
+                if nb_connexions > 1:
+                    # Les messages reçus pendant le backfill restent en attente dans la connexion
+                    await asyncio.get_running_loop().run_in_executor(None, backfill_after_reconnect, symbols)
+
+                async for message in ws:
+                    enqueue_kline_message(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ [ERROR] [ASYNC WS {ws_id}] {e}")
+        delay = backoff.next_delay()
+        print(f"🔴 [ASYNC WS {ws_id}] Connexion fermée. Reconnexion dans {delay:.1f} secondes...")
+        await asyncio.sleep(delay)
+
+async def run_async_websockets(symbols, connect):
+    grouped_symbols = group_symbols(symbols)
+    print(f"🟢 [ASYNC WS] {len(symbols)} monnaies réparties sur {len(grouped_symbols)} connexion(s)")
+    await asyncio.gather(*(
+        run_async_websocket(symbol_group, i + 1, connect) for i, symbol_group in enumerate(grouped_symbols)
+    ))
+
+def start_async_websockets():
+    """
+    Démarre toutes les connexions sur une seule boucle asyncio (thread principal).
+    Les Klines décodées sont transmises aux workers via `kline_queue`.
+    """
+    try:
+        import websockets
+    except ImportError:
+        raise CommandError("❌ WS_INGEST_MODE = \"asyncio\" nécessite le paquet websockets (pip install websockets)")
+
+    symbols = get_univers_symboles()
+    threading.Thread(target=periodic_regulation, daemon=True).start()
+    asyncio.run(run_async_websockets(symbols, websockets.connect))
+
 def periodic_regulation():
     """ Exécute la régulation toutes les 30 secondes indépendamment du reste. """
     while True:
         time.sleep(5)  # ⏳ Intervalle de régulation
         regulator.verifier_regulation()
 
+def warm_start(snapshot, symbols=None):
+    """
+    Redémarrage à chaud : restaure l'état mémoire du snapshot, ne récupère que le delta REST depuis
+    le snapshot, puis charge l'historique complet des monnaies absentes du snapshot (ou dont le
+    rattrapage a échoué). Une monnaie n'est traitée par le flux qu'une fois son rattrapage terminé.
+    """
+    restaurees = restore_snapshot(snapshot, symbols)
+    age = time.time() - snapshot["timestamp"]
+    print(f"♻️ [SNAPSHOT] {len(restaurees)} monnaies restaurées (snapshot de {age:.0f}s)")
+    rattrapees = catch_up_from_snapshot(restaurees, STREAMING_AGGREGATION)
+    Monnaie.objects.filter(symbole__in=rattrapees).update(init=True)
+
+    deja_chargees = set(rattrapees)
+    reste = [symbole for symbole in (symbols if symbols is not None else get_all_usdt_pairs()) if symbole not in deja_chargees]
+    if reste:
+        load_historical_klines(reste)
+    # Toutes les monnaies peuvent venir du snapshot : load_historical_klines ne lève alors pas le verrou
+    set_initializing(False)
+
+def sauvegarde_avant_arret(chemin_snapshot=None):
+    """
+    Arrêt du worker (SIGTERM ou réaffectation des monnaies) : écrit les Klines clôturées en attente
+    (shards, buffer global, thread d'écriture), les valeurs différées des monnaies et des indicateurs,
+    puis le snapshot de démarrage à chaud si activé. L'appelant termine ensuite le processus.
+    """
+    print("🛑 [ARRET] Arrêt demandé : sauvegarde de l'état...")
+    etapes = []
+    if isinstance(kline_queue, ShardedKlinePool):
+        def vider_shards():
+            # Shards arrêtés d'abord : leurs buffers ne sont plus modifiés pendant le flush
+            kline_queue.stop(timeout=10)
+            for shard in kline_queue.shards:
+                flush_shard_if_due(shard, force=True)
+        etapes.append(vider_shards)
+    etapes += [flush_klines, monnaie_writer.stop, indicator_history.flush]
+    if recorder is not None:
+        etapes.append(recorder.close)
+    if live_indicators.enabled:
+        etapes.append(live_indicators.snapshot)
+    if chemin_snapshot is not None:
+        etapes.append(lambda: write_snapshot(chemin_snapshot))
+    for etape in etapes:
+        try:
+            etape()
+        except Exception as e:
+            print(f"❌ [ERROR] Sauvegarde avant arrêt : {e}")
+
+def arret_sur_signal(chemin_snapshot=None):
+    """ SIGTERM : sauvegarde puis sortie immédiate (les threads des WebSockets ne sont pas joignables). """
+    try:
+        sauvegarde_avant_arret(chemin_snapshot)
+    finally:
+        os._exit(0)
+
+def start_writers():
+    """
+    Démarre les composants d'écriture en arrière-plan : write-behind des monnaies, thread d'écriture
+    des Klines (DEDICATED_FLUSHER) et store des indicateurs temps réel (aussi utilisé par replay).
+    """
+    monnaie_writer.start(DUREE_WRITE_BEHIND_MS)
+    if getattr(settings, "DEDICATED_FLUSHER", False):
+        if WORKER_MODE == "sharded":
+            # Le flush (agrégation, indicateurs, stratégies) reste dans le thread du shard propriétaire :
+            # une monnaie n'est jamais traitée par deux threads à la fois
+            print("⚠️ [FLUSH] DEDICATED_FLUSHER ignoré en WORKER_MODE \"sharded\" : chaque shard flushe ses propres Klines")
+        else:
+            kline_flusher.start()
+    if LIVE_INDICATOR_STORE:
+        live_indicators.start(LIVE_INDICATOR_SNAPSHOT_SECONDS)
+
 class Command(BaseCommand):
+    help = "Flux WebSocket Binance : réception des Klines, indicateurs et stratégies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--symbols-file",
+            help="Fichier JSON des monnaies gérées par ce worker (lancé par binance_ws_supervisor)",
+        )
+        parser.add_argument(
+            "--record",
+            help="Enregistre les trames WebSocket brutes dans ce fichier gzip (rejouable avec la commande replay)",
+        )
+
     def handle(self, *args, **kwargs):
-        Monnaie.objects.all().update(init=False)
+        global kline_queue, univers_symboles, recorder
+        if kwargs.get("record"):
+            recorder = FrameRecorder(kwargs["record"])
+            atexit.register(recorder.close)  # Fin du membre gzip aussi en cas de sortie normale
+            print(f"⏺️ [RECORD] Enregistrement des trames dans {kwargs['record']}")
+        symbols_file = kwargs.get("symbols_file")
+        chemin_snapshot = snapshot_path(symbols_file) if WARM_START else None
+        if symbols_file:
+            univers_symboles = read_symbols_file(symbols_file)
+            regulator.univers = set(univers_symboles)
+            print(f"🧩 [SHARD] {len(univers_symboles)} monnaies affectées à ce worker")
+            threading.Thread(
+                target=watch_symbols_file, args=(symbols_file,),
+                kwargs={"on_change": lambda: sauvegarde_avant_arret(chemin_snapshot)}, daemon=True,
+            ).start()
+            Monnaie.objects.filter(symbole__in=univers_symboles).update(init=False)
+        else:
+            Monnaie.objects.all().update(init=False)
         init_loaded_symbols() 
+        ensure_kline_partitions()  # Partitions 1m du mois courant et des suivants (sans effet hors PostgreSQL partitionné)
+        plan = " | ".join(f"{interval}: {', '.join(indicateurs)}" for interval, indicateurs in global_indicator_plan().items())
+        print(f"📋 [PLAN] Indicateurs calculés (toutes stratégies) : {plan or 'aucun'}")
+        start_writers()
+        snapshot = None
+        if WARM_START:
+            snapshot = read_snapshot(chemin_snapshot, max_age=WARM_START_MAX_AGE)
+            start_periodic_snapshot(chemin_snapshot, WARM_START_SNAPSHOT_SECONDS)
+        signal.signal(signal.SIGTERM, lambda signum, frame: arret_sur_signal(chemin_snapshot))
         # Lancer le chargement des klines historiques dans un thread séparé
-        historical_thread = threading.Thread(target=load_historical_klines)
+        if snapshot is not None:
+            historical_thread = threading.Thread(target=warm_start, args=(snapshot, univers_symboles))
+        else:
+            historical_thread = threading.Thread(target=load_historical_klines, args=(univers_symboles,))
         historical_thread.start()
-        for _ in range(MAX_QUEUE):  # Autant que le max_workers
-            executor.submit(process_kline_from_queue)
+        if WORKER_MODE == "sharded":
+            # Un worker (et une queue) par shard : ordre garanti par symbole, pas de lock global
+            kline_queue = ShardedKlinePool(
+                MAX_QUEUE, process_kline,
+                conflate=getattr(settings, "CONFLATE_KLINE_QUEUE", True),
+                idle_timeout=DUREE_MAX_FLUSH, on_idle=flush_shard_if_due,
+            )
+            kline_queue.start()
+        else:
+            for _ in range(MAX_QUEUE):  # Autant que le max_workers
+                executor.submit(process_kline_from_queue)
 
-        start_websockets()
+        if WS_INGEST_MODE == "asyncio":
+            start_async_websockets()
+        else:
+            start_websockets()
@@ -0,0 +1,123 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.models import Monnaie
+from core.sharding import EXIT_CODE_REASSIGN, assign_symbols, rebalance_assignment, shard_file_path, write_symbols_file
+
+
+class Command(BaseCommand):
+    help = "Répartit les monnaies sur plusieurs processus binance_ws, les relance en cas de crash et rééquilibre les monnaies actives"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Nombre de processus binance_ws")
+        parser.add_argument("--rebalance-interval", type=int, default=30, help="Secondes entre deux vérifications de l'équilibrage")
+        parser.add_argument("--tolerance", type=int, default=2, help="Écart max de monnaies actives entre deux workers")
+        parser.add_argument("--cooldown", type=int, default=600, help="Secondes après un (re)démarrage pendant lesquelles un worker n'est pas rééquilibré")
+
+    def handle(self, *args, **options):
+        self.nb_workers = options["workers"]
+        self.tolerance = options["tolerance"]
+        self.cooldown = options["cooldown"]
+        self.run_dir = getattr(settings, "WS_SHARD_DIR", os.path.join(settings.BASE_DIR, "run"))
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.processes = {}
+        self.start_times = {}
+        self.stopping = False
+
+        # Répartition initiale : les meilleures monnaies (candidates prioritaires de la régulation) sont réparties en premier
+        symbols = list(Monnaie.objects.order_by("-win_rate", "-total_profit").values_list("symbole", flat=True))
+        self.assignment = assign_symbols(symbols, self.nb_workers)
+        for index in range(self.nb_workers):
+            self.write_shard(index)
+            self.start_worker(index)
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        last_rebalance = time.time()
+        while not self.stopping:
+            time.sleep(1)
+            self.check_workers()
+            if time.time() - last_rebalance >= options["rebalance_interval"]:
+                close_old_connections()
+                self.rebalance()
+                last_rebalance = time.time()
+
+    def shard_symbols(self, index):
+        return [symbole for symbole, shard in self.assignment.items() if shard == index]
+
+    def write_shard(self, index):
+        write_symbols_file(shard_file_path(self.run_dir, index), self.shard_symbols(index))
+
+    def start_worker(self, index):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "binance_ws",
+            "--symbols-file", shard_file_path(self.run_dir, index),
+        ]
+        self.processes[index] = subprocess.Popen(command)
+        self.start_times[index] = time.time()
+        self.stdout.write(self.style.SUCCESS(
+            f"🟢 Worker {index} démarré (pid {self.processes[index].pid}, {len(self.shard_symbols(index))} monnaies)"
+        ))
+
+    def check_workers(self):
+        """ Relance les workers terminés (crash ou changement d'affectation). """
+        for index, process in self.processes.items():
+            code = process.poll()
+            if code is None or self.stopping:
+                continue
+            if code == EXIT_CODE_REASSIGN:
+                self.stdout.write(f"🔄 Worker {index} relancé avec sa nouvelle affectation")
+            else:
+                self.stderr.write(self.style.ERROR(f"❌ Worker {index} arrêté (code {code}), redémarrage..."))
+                if time.time() - self.start_times[index] < 10:
+                    time.sleep(5)  # Évite une boucle de crash trop rapide
+            self.start_worker(index)
+
+    def rebalance(self):
+        """
+        Équilibre les monnaies activées par la régulation entre les workers (voir rebalance_assignment).
+        Un worker relancé recharge l'historique et réinitialise `init` : tant qu'il est dans sa période
+        de cooldown, il est exclu des déplacements (sinon les monnaies feraient des allers-retours).
+        """
+        monnaies = list(Monnaie.objects.values_list("symbole", "init"))
+        actives = {symbole for symbole, init in monnaies if init}
+        maintenant = time.time()
+        frozen = {index for index, debut in self.start_times.items() if maintenant - debut < self.cooldown}
+
+        def choose_movable(candidates, n):
+            # Monnaies sans trade ouvert, les moins performantes d'abord
+            return (
+                Monnaie.objects.filter(symbole__in=candidates)
+                .exclude(trades__status="open")
+                .order_by("win_rate", "total_profit")
+                .values_list("symbole", flat=True)[:n]
+            )
+
+        modifies, deplacees = rebalance_assignment(
+            self.assignment, [symbole for symbole, _ in monnaies], actives, self.nb_workers, self.tolerance,
+            frozen=frozen, choose_movable=choose_movable,
+        )
+        if deplacees:
+            self.stdout.write(f"⚖️ {len(deplacees)} monnaies déplacées : {deplacees}")
+
+        # Les workers concernés détectent le changement de fichier et redémarrent (EXIT_CODE_REASSIGN)
+        for index in modifies:
+            self.write_shard(index)
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        self.stdout.write("🛑 Arrêt des workers...")
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
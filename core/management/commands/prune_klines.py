@@ -0,0 +1,68 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.archive import archive_available, archive_db_klines
+from core.models import Kline
+from core.partitions import drop_month_partition, ensure_kline_partitions, is_partitioned, list_month_partitions, next_month, to_ms
+
+# Nombre de Klines supprimées par requête DELETE (transactions et verrous courts)
+DEFAULT_BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = "Supprime les Klines plus anciennes que la rétention de leur intervalle (KLINE_RETENTION_DAYS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Affiche ce qui serait supprimé sans rien modifier")
+        parser.add_argument("--detach", action="store_true", help="Détache les partitions 1m expirées au lieu de les supprimer")
+        parser.add_argument("--archive", action="store_true", help="Archive les Klines expirées (fichiers Arrow, voir archive_klines) avant suppression")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Klines supprimées par requête DELETE")
+
+    def handle(self, *args, **options):
+        if options["archive"] and not archive_available():
+            raise CommandError("pyarrow n'est pas installé : --archive indisponible")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size doit être strictement positif")
+        retention = getattr(settings, "KLINE_RETENTION_DAYS", {})
+        now = datetime.datetime.now(datetime.timezone.utc)
+        partitionne = is_partitioned()
+
+        if partitionne and not options["dry_run"]:
+            ensure_kline_partitions(now=now)
+
+        for interval, jours in retention.items():
+            if jours is None:
+                continue
+            limite = now - datetime.timedelta(days=jours)
+            if options["archive"] and not options["dry_run"]:
+                nb_archivees = sum(nb for _, _, nb in archive_db_klines([interval], before_ms=to_ms(limite)))
+                self.stdout.write(f"📦 {interval} : {nb_archivees} Klines archivées avant suppression")
+
+            if interval == "1m" and partitionne:
+                # Partitions mensuelles entièrement expirées : DROP/DETACH instantané, sans DELETE ligne à ligne
+                for nom, debut in list_month_partitions():
+                    if next_month(debut) > limite:
+                        break
+                    action = "détachée" if options["detach"] else "supprimée"
+                    if not options["dry_run"]:
+                        drop_month_partition(nom, detach=options["detach"])
+                    self.stdout.write(self.style.SUCCESS(f"🗑️ Partition {nom} {action}"))
+
+            # Reste : intervalles non partitionnés par date, mois 1m partiellement expiré, partition DEFAULT, SQLite
+            klines = Kline.objects.filter(intervalle=interval, timestamp__lt=to_ms(limite))
+            if options["dry_run"]:
+                self.stdout.write(f"🔍 {interval} : {klines.count()} Klines antérieures au {limite:%Y-%m-%d} à supprimer")
+                continue
+            nb_supprimees = self.delete_in_batches(klines, interval, options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"✅ {interval} : {nb_supprimees} Klines antérieures au {limite:%Y-%m-%d} supprimées"))
+
+    def delete_in_batches(self, klines, interval, batch_size):
+        """ Supprime par lots d'id bornés : pas de DELETE géant qui verrouille la table et gonfle le WAL. """
+        total = 0
+        while True:
+            ids = list(klines.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return total
+            # intervalle répété pour que PostgreSQL ne parcoure que la partition concernée
+            nb, _ = Kline.objects.filter(intervalle=interval, id__in=ids).delete()
+            total += nb
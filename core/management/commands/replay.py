@@ -0,0 +1,204 @@
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.models import Monnaie
+from core.recording import read_recording
+from core.ws_decode import decode_kline_message
+
+
+class StageStats:
+    """ Mesure le temps passé et le nombre de requêtes SQL par étape du pipeline. """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.signals = defaultdict(int)  # Achats / ventes simulés
+        self.local = threading.local()
+
+    def current_stage(self):
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else "autre"
+
+    @contextmanager
+    def counting(self):
+        """ Compte les requêtes SQL de la connexion du thread courant (principal, écriture, write-behind). """
+        if getattr(self.local, "counting", False):
+            yield
+            return
+        self.local.counting = True
+        try:
+            with connection.execute_wrapper(self.count_query):
+                yield
+        finally:
+            self.local.counting = False
+
+    @contextmanager
+    def stage(self, name):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(name)
+        debut = time.perf_counter()
+        try:
+            with self.counting():
+                yield
+        finally:
+            self.durations[name].append(time.perf_counter() - debut)
+            stack.pop()
+
+    def wrap(self, name, func):
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries[self.current_stage()] += 1
+        return execute(sql, params, many, context)
+
+
+def simulate_sell_strategy(stats, symbole=None):
+    """ Comme execute_sell_strategy, sans mise à jour des prix ni clôture : compte les ventes validées. """
+    from core.live_state import live_monnaie
+    from core.models import TradeLog
+    from core.write_behind import monnaie_writer
+
+    trades = TradeLog.objects.filter(status="open").select_related("symbole__strategy")
+    if symbole is not None:
+        trades = trades.filter(symbole=symbole)
+    for trade in trades:
+        monnaie = live_monnaie(monnaie_writer.apply_pending(trade.symbole))
+        if monnaie.strategy and monnaie.strategy.evaluate_sell(symbole=monnaie, trade=trade):
+            stats.signals["vente"] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue un enregistrement de trames WebSocket (binance_ws --record) dans le pipeline de binance_ws "
+        "(process_kline, flush, write-behind) et mesure les performances. Écrit Klines, indicateurs et monnaies "
+        "dans la base configurée : à lancer sur une base jetable avec --allow-db-writes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier gzip produit par binance_ws --record")
+        parser.add_argument("--speed", type=float, default=0, help="Vitesse : 1 = temps réel, N = N fois plus vite, 0 = maximum")
+        parser.add_argument("--limit", type=int, default=None, help="Nombre max de trames rejouées")
+        parser.add_argument(
+            "--allow-db-writes", action="store_true",
+            help="Confirme que la base configurée est jetable (Klines, indicateurs et monnaies y sont écrits)",
+        )
+        parser.add_argument(
+            "--with-trades", action="store_true",
+            help="Exécute réellement les achats / ventes (crée et clôture des TradeLog) : base jetable uniquement",
+        )
+
+    def handle(self, *args, **options):
+        if not options["allow_db_writes"]:
+            raise CommandError(
+                "replay écrit les Klines, les indicateurs et les monnaies dans la base configurée : "
+                "pointez les settings vers une base jetable et relancez avec --allow-db-writes"
+            )
+        from core import utils
+        from core.management.commands import binance_ws
+        from core.write_behind import monnaie_writer
+
+        # Monnaies avec stratégie considérées comme chargées (comme après l'initialisation)
+        for symbole in Monnaie.objects.filter(strategy__isnull=False).values_list("symbole", flat=True):
+            utils.set_loaded_symbol(symbole, True)
+
+        stats = StageStats()
+        originaux = {
+            (utils, "calculate_indicators"): utils.calculate_indicators,
+            (utils, "execute_strategies"): utils.execute_strategies,
+            (utils, "execute_sell_strategy"): utils.execute_sell_strategy,
+            (binance_ws, "save_closed_klines"): binance_ws.save_closed_klines,
+            (monnaie_writer, "flush"): monnaie_writer.flush,
+        }
+        remplacements = {}
+        if not options["with_trades"]:
+            # Conditions d'achat / vente évaluées, mais aucun TradeLog créé ni modifié
+            def simulate_buy(symbole):
+                stats.signals["achat"] += 1
+
+            originaux[(utils, "acheter")] = utils.acheter
+            remplacements[(utils, "acheter")] = simulate_buy
+            remplacements[(utils, "execute_sell_strategy")] = lambda symbole=None: simulate_sell_strategy(stats, symbole)
+        etapes = {
+            "calculate_indicators": "indicateurs",
+            "execute_strategies": "strategies",
+            "execute_sell_strategy": "strategies",
+            "save_closed_klines": "flush",
+            "flush": "write_behind",
+        }
+        for (module, nom), func in originaux.items():
+            func = remplacements.get((module, nom), func)
+            setattr(module, nom, stats.wrap(etapes[nom], func) if nom in etapes else func)
+        # process_kline et flush_klines utilisent les noms importés dans binance_ws
+        for nom in ("calculate_indicators", "execute_strategies", "execute_sell_strategy"):
+            setattr(binance_ws, nom, getattr(utils, nom))
+        if not options["with_trades"]:
+            self.stdout.write("ℹ️ Achats / ventes simulés (aucun TradeLog modifié) ; --with-trades pour les exécuter")
+        # Mêmes composants d'écriture que binance_ws (write-behind, thread d'écriture, store temps réel)
+        binance_ws.start_writers()
+
+        nb_frames = nb_klines = 0
+        debut = time.perf_counter()
+        premier_enregistrement = None
+        try:
+            with stats.counting():
+                for timestamp, message in read_recording(options["path"]):
+                    if options["limit"] is not None and nb_frames >= options["limit"]:
+                        break
+                    if options["speed"] > 0:
+                        if premier_enregistrement is None:
+                            premier_enregistrement = timestamp
+                        attente = (timestamp - premier_enregistrement) / options["speed"] - (time.perf_counter() - debut)
+                        if attente > 0:
+                            time.sleep(attente)
+                    nb_frames += 1
+
+                    with stats.stage("decodage"):
+                        tick = decode_kline_message(message, utils.get_loaded_symbols())
+                    if tick is None:
+                        continue
+                    nb_klines += 1
+                    with stats.stage("process_kline"):
+                        binance_ws.process_kline({
+                            "symbole": tick.symbole,
+                            "kline": tick,
+                            "timestamp_reception": time.time(),
+                        })
+                with stats.stage("process_kline"):
+                    binance_ws.flush_klines()  # Vide le reste du buffer (ou du thread d'écriture)
+                monnaie_writer.flush()  # Dernières valeurs différées des monnaies
+        finally:
+            for (module, nom), func in originaux.items():
+                setattr(module, nom, func)
+            for nom in ("calculate_indicators", "execute_strategies", "execute_sell_strategy"):
+                setattr(binance_ws, nom, originaux[(utils, nom)])
+
+        duree = time.perf_counter() - debut
+        self.report(stats, nb_frames, nb_klines, duree)
+
+    def report(self, stats, nb_frames, nb_klines, duree):
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 {nb_frames} trames, {nb_klines} Klines traitées en {duree:.2f}s "
+            f"({nb_frames / duree if duree else 0:,.0f} trames/s, {nb_klines / duree if duree else 0:,.0f} Klines/s)"
+        ))
+        self.stdout.write(f"{'étape':<16}{'appels':>9}{'moy ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'requêtes':>11}")
+        for nom in ("decodage", "process_kline", "indicateurs", "strategies", "flush", "write_behind"):
+            durees = stats.durations.get(nom, [])
+            if not durees:
+                continue
+            durees_ms = sorted(d * 1000 for d in durees)
+            p95 = durees_ms[min(len(durees_ms) - 1, int(len(durees_ms) * 0.95))]
+            self.stdout.write(
+                f"{nom:<16}{len(durees_ms):>9}{statistics.mean(durees_ms):>10.3f}{statistics.median(durees_ms):>10.3f}"
+                f"{p95:>10.3f}{durees_ms[-1]:>10.3f}{stats.queries.get(nom, 0):>11}"
+            )
+        total_requetes = sum(stats.queries.values())
+        self.stdout.write(f"Requêtes SQL : {total_requetes} au total, {total_requetes / nb_klines if nb_klines else 0:.2f} par Kline")
+        if stats.signals:
+            self.stdout.write(f"Signaux simulés : {stats.signals['achat']} achats, {stats.signals['vente']} ventes")
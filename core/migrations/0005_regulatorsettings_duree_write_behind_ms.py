@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_monnaie_nb_trades_gagnants_monnaie_nb_trades_perdus_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regulatorsettings',
+            name='duree_write_behind_ms',
+            field=models.IntegerField(default=500, help_text='Intervalle en ms entre deux écritures groupées des prix et indicateurs (0 = écriture immédiate)'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+import datetime
+
+from django.db import migrations, models
+
+# SQL figé à l'état de cette migration (indépendant de core/partitions.py, qui peut évoluer)
+KLINE_TABLE = "core_kline"
+KLINE_1M_TABLE = "core_kline_1m"
+PARTITIONED_INTERVALS = ("1m", "3m", "5m", "15m", "1h", "4h", "1d")
+
+
+def month_start(date):
+    return datetime.datetime(date.year, date.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def next_month(date):
+    return month_start(month_start(date) + datetime.timedelta(days=32))
+
+
+def create_month_partition(cursor, date):
+    debut = month_start(date)
+    fin = next_month(debut)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {KLINE_1M_TABLE}_p{debut.year}{debut.month:02d} PARTITION OF {KLINE_1M_TABLE} "
+        f"FOR VALUES FROM ({int(debut.timestamp() * 1000)}) TO ({int(fin.timestamp() * 1000)})"
+    )
+
+
+def partition_klines(apps, schema_editor):
+    """
+    Convertit core_kline en table partitionnée (PostgreSQL uniquement) :
+    - LIST sur intervalle : une partition par intervalle + DEFAULT ;
+    - la partition 1m est elle-même découpée par mois (RANGE sur timestamp) + DEFAULT.
+    La clé primaire inclut les clés de partitionnement (id, intervalle, timestamp).
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {KLINE_TABLE} RENAME TO {KLINE_TABLE}_old")
+        cursor.execute(f"CREATE SEQUENCE {KLINE_TABLE}_part_id_seq")
+        cursor.execute(f"""
+            CREATE TABLE {KLINE_TABLE} (
+                id bigint NOT NULL DEFAULT nextval('{KLINE_TABLE}_part_id_seq'),
+                symbole varchar(20) NOT NULL,
+                intervalle varchar(5) NOT NULL,
+                "timestamp" bigint NOT NULL,
+                open_price double precision NOT NULL,
+                high_price double precision NOT NULL,
+                low_price double precision NOT NULL,
+                close_price double precision NOT NULL,
+                volume double precision NOT NULL,
+                PRIMARY KEY (id, intervalle, "timestamp"),
+                CONSTRAINT {KLINE_TABLE}_symbole_intervalle_timestamp_part_uniq UNIQUE (symbole, intervalle, "timestamp")
+            ) PARTITION BY LIST (intervalle)
+        """)
+        cursor.execute(f"ALTER SEQUENCE {KLINE_TABLE}_part_id_seq OWNED BY {KLINE_TABLE}.id")
+
+        for interval in PARTITIONED_INTERVALS:
+            sql = f"CREATE TABLE {KLINE_TABLE}_{interval} PARTITION OF {KLINE_TABLE} FOR VALUES IN ('{interval}')"
+            if interval == "1m":
+                sql += ' PARTITION BY RANGE ("timestamp")'
+            cursor.execute(sql)
+        cursor.execute(f"CREATE TABLE {KLINE_TABLE}_default PARTITION OF {KLINE_TABLE} DEFAULT")
+        cursor.execute(f"CREATE TABLE {KLINE_1M_TABLE}_default PARTITION OF {KLINE_1M_TABLE} DEFAULT")
+
+        # Partitions mensuelles 1m : de la plus ancienne Kline existante jusqu'à 2 mois après aujourd'hui
+        cursor.execute(f"SELECT MIN(\"timestamp\") FROM {KLINE_TABLE}_old WHERE intervalle = '1m'")
+        min_timestamp = cursor.fetchone()[0]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        date = datetime.datetime.fromtimestamp(min_timestamp / 1000, datetime.timezone.utc) if min_timestamp else now
+        fin = next_month(next_month(next_month(now)))
+        while date < fin:
+            create_month_partition(cursor, date)
+            date = next_month(date)
+
+        cursor.execute(f"""
+            INSERT INTO {KLINE_TABLE} (id, symbole, intervalle, "timestamp", open_price, high_price, low_price, close_price, volume)
+            SELECT id, symbole, intervalle, "timestamp", open_price, high_price, low_price, close_price, volume
+            FROM {KLINE_TABLE}_old
+        """)
+        cursor.execute(
+            f"SELECT setval('{KLINE_TABLE}_part_id_seq', COALESCE((SELECT MAX(id) FROM {KLINE_TABLE}_old), 0) + 1, false)"
+        )
+        cursor.execute(f"DROP TABLE {KLINE_TABLE}_old")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_regulatorsettings_duree_write_behind_ms'),
+    ]
+
+    operations = [
+        # Pas de retour arrière automatique : la table partitionnée reste compatible avec le modèle
+        migrations.RunPython(partition_klines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='kline',
+            index=models.Index(fields=['symbole', 'intervalle', '-timestamp'], include=['open_price', 'high_price', 'low_price', 'close_price', 'volume'], name='kline_dernieres_idx'),
+        ),
+    ]
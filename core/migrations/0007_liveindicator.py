@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_kline_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveIndicator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbole', models.CharField(max_length=20)),
+                ('intervalle', models.CharField(max_length=5)),
+                ('rsi', models.FloatField(blank=True, null=True)),
+                ('stoch_rsi', models.FloatField(blank=True, null=True)),
+                ('macd', models.FloatField(blank=True, null=True)),
+                ('macd_signal', models.FloatField(blank=True, null=True)),
+                ('bollinger_upper', models.FloatField(blank=True, null=True)),
+                ('bollinger_middle', models.FloatField(blank=True, null=True)),
+                ('bollinger_lower', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('symbole', 'intervalle')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_liveindicator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strategy',
+            name='indicator_backend',
+            field=models.CharField(blank=True, choices=[('', 'Selon settings.STREAMING_INDICATORS'), ('reference', 'Référence (pandas)'), ('numpy', 'Numpy vectorisé'), ('talib', 'TA-Lib'), ('incremental', 'Incrémental')], default='', max_length=20),
+        ),
+    ]
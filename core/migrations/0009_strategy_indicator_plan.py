@@ -0,0 +1,90 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:19
+
+import ast
+
+from django.db import migrations, models
+
+# Compilateur du plan figé à l'état de cette migration (indépendant de core/indicator_plan.py, qui peut évoluer)
+FIELD_TO_INDICATOR = {
+    "rsi": "rsi",
+    "stoch_rsi": "stoch_rsi",
+    "macd": "macd",
+    "macd_signal": "macd",
+    "bollinger_upper": "bollinger",
+    "bollinger_middle": "bollinger",
+    "bollinger_lower": "bollinger",
+}
+
+
+def expression_fields(expression):
+    try:
+        arbre = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(arbre) if isinstance(node, ast.Name) and node.id in FIELD_TO_INDICATOR}
+
+
+def add_requirement(plan, indicator, interval):
+    if indicator is not None and interval:
+        plan.setdefault(interval, set()).add(indicator)
+
+
+def compile_calculation(calculation, interval, plan, vus):
+    if calculation is None or calculation.pk in vus:
+        return
+    vus.add(calculation.pk)
+    for field in expression_fields(calculation.expression):
+        add_requirement(plan, FIELD_TO_INDICATOR[field], interval)
+    for sub_calculation in calculation.sub_calculations.all():
+        compile_calculation(sub_calculation, interval, plan, vus)
+
+
+def compile_indicator_test(test, plan):
+    add_requirement(plan, FIELD_TO_INDICATOR.get(test.indicator), test.interval)
+    if test.threshold_indicator_test:
+        seuil = test.threshold_indicator_test
+        add_requirement(plan, FIELD_TO_INDICATOR.get(seuil.indicator), seuil.interval)
+    if test.threshold_calculation:
+        compile_calculation(test.threshold_calculation, test.interval, plan, set())
+
+
+def compile_combined_test(combined_test, plan, vus=None):
+    vus = set() if vus is None else vus
+    if combined_test is None or combined_test.pk in vus:
+        return
+    vus.add(combined_test.pk)
+    for test in combined_test.tests.all():
+        compile_indicator_test(test, plan)
+    for sub_combined in combined_test.sub_combined_tests.all():
+        compile_combined_test(sub_combined, plan, vus)
+
+
+def to_json(plan):
+    return {interval: sorted(indicators) for interval, indicators in sorted(plan.items())}
+
+
+def compile_plans(apps, schema_editor):
+    """ Compile le plan des stratégies existantes (intervalles et drapeaux use_* inchangés). """
+    Strategy = apps.get_model('core', 'Strategy')
+    for strategy in Strategy.objects.all():
+        plan = {}
+        compile_combined_test(strategy.buy_test, plan)
+        compile_combined_test(strategy.sell_test, plan)
+        strategy.indicator_plan = to_json(plan)
+        strategy.save(update_fields=['indicator_plan'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_strategy_indicator_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strategy',
+            name='indicator_plan',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(compile_plans, migrations.RunPython.noop),
+    ]
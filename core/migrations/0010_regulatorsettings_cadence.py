@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:21
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_strategy_indicator_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regulatorsettings',
+            name='cadence_intervalles',
+            field=models.JSONField(default=core.models.default_cadence_intervalles, help_text='Secondes minimum entre deux recalculs temps réel par intervalle, ex: {"1m": 0, "1h": 60} (0 = à chaque tick)'),
+        ),
+        migrations.AddField(
+            model_name='regulatorsettings',
+            name='seuil_variation_prix',
+            field=models.FloatField(default=0.5, help_text='Variation du prix (%) depuis le dernier recalcul qui force un recalcul avant la cadence (0 = désactivé)'),
+        ),
+    ]
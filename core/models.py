@@ -76,7 +76,7 @@ class IndicatorTest(models.Model):
                 threshold = getattr(symbole, threshold_field)
 
         elif self.threshold_calculation:
-            threshold = self.threshold_calculation.evaluate(symbole, trade)
+            threshold = self.threshold_calculation.evaluate(symbole, trade, interval=self.interval)
         else:
             raise ValueError("Aucun seuil défini pour l'indicateur.")
 
@@ -125,7 +125,7 @@ class Calculation(models.Model):
         """
         sub_results = {}
         for calc in self.sub_calculations.all():
-            sub_results[calc.name] = calc.evaluate(trade, symbole, interval)
+            sub_results[calc.name] = calc.evaluate(symbole, trade, interval)
 
         variables = {
             "prix_achat": float(trade.prix_achat or 0) if trade else 0,
@@ -222,6 +222,19 @@ class Strategy(models.Model):
     # Intervalles de calcul nécessaires
     intervals = models.JSONField(default=list)  # Ex: ["1m", "3m", "5m"]
 
+    # Noyau de calcul des indicateurs (core/indicator_backends.py)
+    INDICATOR_BACKENDS = [
+        ('', 'Selon settings.STREAMING_INDICATORS'),
+        ('reference', 'Référence (pandas)'),
+        ('numpy', 'Numpy vectorisé'),
+        ('talib', 'TA-Lib'),
+        ('incremental', 'Incrémental'),
+    ]
+    indicator_backend = models.CharField(max_length=20, choices=INDICATOR_BACKENDS, default='', blank=True)
+
+    # Plan compilé : indicateurs exacts à calculer par intervalle, ex: {"1m": ["rsi"], "15m": ["stoch_rsi"]}
+    indicator_plan = models.JSONField(default=dict, blank=True)
+
     def __str__(self):
         return self.name
 
@@ -238,34 +251,33 @@ class Strategy(models.Model):
     def update_strategy_requirements(self):
         """
         Met à jour les indicateurs et intervalles nécessaires pour cette stratégie
-        en fonction des tests d'achat et de vente.
+        en fonction des tests d'achat et de vente : parcours complet du graphe (sous-tests combinés,
+        indicateurs de seuil et expressions des calculs) compilé en un plan (indicateur, intervalle).
         """
-        used_intervals = set()
-        used_indicators = set()
-
-        def extract_requirements(combined_test):
-            if not combined_test:
-                return
+        from core.indicator_plan import compile_combined_test, to_json
 
-            for test in combined_test.tests.all():
-                used_intervals.add(test.interval)
-                used_indicators.add(test.indicator)
+        plan = {}
+        compile_combined_test(self.buy_test, plan)
+        compile_combined_test(self.sell_test, plan)
+        used_indicators = set().union(*plan.values())
 
-            for sub_combined in combined_test.sub_combined_tests.all():
-                extract_requirements(sub_combined)
-
-        extract_requirements(self.buy_test)
-        extract_requirements(self.sell_test)
-
-        # Mise à jour des intervalles et indicateurs
-        self.intervals = list(used_intervals)
+        # Mise à jour du plan, des intervalles et des indicateurs
+        self.indicator_plan = to_json(plan)
+        self.intervals = list(plan)
         self.use_rsi = "rsi" in used_indicators
         self.use_stoch_rsi = "stoch_rsi" in used_indicators
         self.use_macd = "macd" in used_indicators
-        self.use_bollinger = "bollinger_middle" in used_indicators
+        self.use_bollinger = "bollinger" in used_indicators
 
         self.save()
 
+    def planned_indicators(self, interval):
+        """ Indicateurs à calculer sur `interval` (drapeaux use_* si le plan n'a pas encore été compilé). """
+        if self.indicator_plan:
+            return self.indicator_plan.get(interval, [])
+        return [nom for nom, actif in (("rsi", self.use_rsi), ("stoch_rsi", self.use_stoch_rsi),
+                                       ("macd", self.use_macd), ("bollinger", self.use_bollinger)) if actif]
+
 @receiver(pre_save, sender=Strategy)
 def update_monnaies_on_interval_change(sender, instance, **kwargs):
     """
@@ -408,6 +420,14 @@ class Kline(models.Model):
 
     class Meta:
         unique_together = ("symbole", "intervalle", "timestamp")
+        indexes = [
+            # Index couvrant pour "les N dernières Klines de (symbole, intervalle)" (INCLUDE ignoré hors PostgreSQL)
+            models.Index(
+                fields=["symbole", "intervalle", "-timestamp"],
+                include=["open_price", "high_price", "low_price", "close_price", "volume"],
+                name="kline_dernieres_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.symbole} - {self.intervalle} - {self.timestamp}"
@@ -432,6 +452,25 @@ class Indicator(models.Model):
     def __str__(self):
         return f"{self.symbole} - {self.intervalle} - {self.timestamp}"
 
+class LiveIndicator(models.Model):
+    """ Dernières valeurs temps réel des indicateurs par (symbole, intervalle) : table étroite, hors de Monnaie. """
+    symbole = models.CharField(max_length=20)
+    intervalle = models.CharField(max_length=5)
+    rsi = models.FloatField(null=True, blank=True)
+    stoch_rsi = models.FloatField(null=True, blank=True)
+    macd = models.FloatField(null=True, blank=True)
+    macd_signal = models.FloatField(null=True, blank=True)
+    bollinger_upper = models.FloatField(null=True, blank=True)
+    bollinger_middle = models.FloatField(null=True, blank=True)
+    bollinger_lower = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("symbole", "intervalle")
+
+    def __str__(self):
+        return f"{self.symbole} - {self.intervalle}"
+
 class TradeLog(models.Model):
     symbole = models.ForeignKey(Monnaie, on_delete=models.CASCADE, to_field='symbole', related_name='trades')
     prix_achat = models.DecimalField(max_digits=30, decimal_places=20, default=0.00) 
@@ -473,6 +512,11 @@ class APIKey(models.Model):
     def __str__(self):
         return f"{self.name} (Ajouté le {self.created_at.strftime('%Y-%m-%d')})"
     
+def default_cadence_intervalles():
+    """ Secondes minimum entre deux recalculs temps réel par intervalle (0 = à chaque tick). """
+    return {"1m": 0, "3m": 0, "5m": 5, "15m": 10, "1h": 60, "4h": 60, "1d": 60}
+
+
 class RegulatorSettings(models.Model):
     """Stocke les paramètres de régulation des monnaies et des performances."""
     
@@ -503,6 +547,13 @@ class RegulatorSettings(models.Model):
     # Récupération de l'historique
     nb_klines_historique = models.IntegerField(default=100, help_text="Nombre de Klines à charger par intervalle")
 
+    # Écriture différée de l'état temps réel des monnaies
+    duree_write_behind_ms = models.IntegerField(default=500, help_text="Intervalle en ms entre deux écritures groupées des prix et indicateurs (0 = écriture immédiate)")
+
+    # Cadence du recalcul des indicateurs sur les Klines en cours
+    cadence_intervalles = models.JSONField(default=default_cadence_intervalles, help_text="Secondes minimum entre deux recalculs temps réel par intervalle, ex: {\"1m\": 0, \"1h\": 60} (0 = à chaque tick)")
+    seuil_variation_prix = models.FloatField(default=0.5, help_text="Variation du prix (%) depuis le dernier recalcul qui force un recalcul avant la cadence (0 = désactivé)")
+
     def __str__(self):
         return "Paramètres de régulation du trading"
 
@@ -0,0 +1,99 @@
+import datetime
+
+from django.db import connection
+
+KLINE_TABLE = "core_kline"
+KLINE_1M_TABLE = "core_kline_1m"
+# Intervalles ayant leur propre partition (liste) ; les autres vont dans core_kline_default
+PARTITIONED_INTERVALS = ("1m", "3m", "5m", "15m", "1h", "4h", "1d")
+
+
+def month_start(date):
+    return datetime.datetime(date.year, date.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def next_month(date):
+    return month_start(month_start(date) + datetime.timedelta(days=32))
+
+
+def to_ms(date):
+    return int(date.timestamp() * 1000)
+
+
+def partition_name(date):
+    """ Nom de la partition mensuelle 1m contenant `date` (ex : core_kline_1m_p202610). """
+    return f"{KLINE_1M_TABLE}_p{date.year}{date.month:02d}"
+
+
+def interval_partition_name(interval):
+    return f"{KLINE_TABLE}_{interval}"
+
+
+def is_partitioned():
+    """ True si core_kline est une table partitionnée PostgreSQL (migration 0006 appliquée sous PostgreSQL). """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [KLINE_1M_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def create_month_partition(cursor, date):
+    debut = month_start(date)
+    fin = next_month(debut)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(debut)} PARTITION OF {KLINE_1M_TABLE} "
+        f"FOR VALUES FROM ({to_ms(debut)}) TO ({to_ms(fin)})"
+    )
+
+
+def ensure_kline_partitions(months_ahead=2, now=None):
+    """
+    Crée les partitions mensuelles 1m du mois courant et des `months_ahead` mois suivants.
+    À appeler régulièrement (démarrage de binance_ws, prune_klines) pour que les nouvelles
+    Klines n'arrivent jamais dans la partition DEFAULT.
+    """
+    if not is_partitioned():
+        return 0
+    date = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    created = 0
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            try:
+                create_month_partition(cursor, date)
+                created += 1
+            except Exception as e:
+                # Des lignes de ce mois sont déjà dans la partition DEFAULT : elles y restent
+                print(f"⚠️ [PARTITIONS] Partition {partition_name(date)} non créée : {e}")
+            date = next_month(date)
+    return created
+
+
+def list_month_partitions():
+    """ Renvoie [(nom, début du mois)] des partitions mensuelles 1m, de la plus ancienne à la plus récente. """
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)", [KLINE_1M_TABLE]
+        )
+        noms = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    prefix = f"{KLINE_1M_TABLE}_p"
+    for nom in noms:
+        suffixe = nom[len(prefix):] if nom.startswith(prefix) else ""
+        if len(suffixe) == 6 and suffixe.isdigit():
+            partitions.append((nom, datetime.datetime(int(suffixe[:4]), int(suffixe[4:]), 1, tzinfo=datetime.timezone.utc)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def drop_month_partition(nom, detach=False):
+    """ Supprime (ou détache pour archivage externe) une partition mensuelle 1m. """
+    with connection.cursor() as cursor:
+        if detach:
+            cursor.execute(f"ALTER TABLE {KLINE_1M_TABLE} DETACH PARTITION {nom}")
+        else:
+            cursor.execute(f"DROP TABLE {nom}")
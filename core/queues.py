@@ -0,0 +1,157 @@
+import queue
+import threading
+import zlib
+from collections import deque
+
+
+def is_closed_kline(item):
+    """ Indique si l'élément de queue porte une Kline clôturée (k.x == True). """
+    return item["kline"].is_closed
+
+
+class ConflatingKlineQueue:
+    """
+    Queue FIFO thread-safe qui ne conserve que la dernière mise à jour non clôturée
+    en attente pour chaque symbole.
+
+    - Une Kline non clôturée remplace, à sa place dans la file, la précédente mise à jour
+      non clôturée du même symbole si celle-ci n'a pas encore été traitée.
+    - Une Kline clôturée n'est jamais supprimée ni réordonnée : elle est ajoutée en fin de file
+      et les ticks arrivés après elle ne peuvent plus remplacer ceux arrivés avant.
+
+    La profondeur de la queue reste ainsi bornée par le nombre de symboles (plus les Klines clôturées
+    en attente), quel que soit le débit des messages.
+    """
+
+    def __init__(self, is_closed=is_closed_kline):
+        self.is_closed = is_closed
+        self.slots = deque()  # Chaque emplacement est une liste [item] modifiable sur place
+        self.pending = {}  # symbole -> emplacement de la mise à jour non clôturée remplaçable
+        self.condition = threading.Condition()
+        self.nb_conflated = 0  # Nombre de ticks remplacés avant traitement
+
+    def put(self, item, block=True, timeout=None):
+        with self.condition:
+            if item is None:  # Signal d'arrêt des workers
+                self.slots.append([None])
+            else:
+                symbole = item["symbole"]
+                if self.is_closed(item):
+                    self.pending.pop(symbole, None)
+                    self.slots.append([item])
+                else:
+                    slot = self.pending.get(symbole)
+                    if slot is not None:
+                        slot[0] = item
+                        self.nb_conflated += 1
+                        return
+                    slot = [item]
+                    self.pending[symbole] = slot
+                    self.slots.append(slot)
+            self.condition.notify()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self.condition:
+            if not block:
+                if not self.slots:
+                    raise queue.Empty
+            elif not self.condition.wait_for(lambda: self.slots, timeout):
+                raise queue.Empty
+            slot = self.slots.popleft()
+            item = slot[0]
+            if item is not None and self.pending.get(item["symbole"]) is slot:
+                del self.pending[item["symbole"]]
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        with self.condition:
+            return len(self.slots)
+
+    def empty(self):
+        return self.qsize() == 0
+
+
+def shard_index(symbole, nb_shards):
+    """ Index de shard stable (identique d'un processus à l'autre) pour un symbole. """
+    return zlib.crc32(symbole.encode()) % nb_shards
+
+
+class KlineShard:
+    """
+    Worker dédié à un sous-ensemble de symboles : sa propre queue, son propre thread et
+    son propre buffer de Klines clôturées (aucun verrou global nécessaire).
+    """
+
+    def __init__(self, index, handler, conflate=True, idle_timeout=None, on_idle=None):
+        self.index = index
+        self.handler = handler
+        self.queue = ConflatingKlineQueue() if conflate else queue.Queue()
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self.thread = None
+        # Klines clôturées en attente de flush pour ce shard
+        self.klines_cloturees = []
+        self.monnaies_a_aggreger = set()
+        self.kline_timestamps = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"kline-shard-{self.index}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        print(f"✅ [DEBUG] Démarrage du shard {self.index}")
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                if self.on_idle:
+                    self.on_idle(self)
+                continue
+            if item is None:
+                break
+            try:
+                self.handler(item, self)
+            except Exception as e:
+                print(f"❌ [ERROR] Erreur dans le shard {self.index} : {e}")
+
+
+class ShardedKlinePool:
+    """
+    Pool de workers avec affinité par symbole : chaque symbole est toujours traité par le même shard,
+    ce qui garantit l'ordre de traitement par symbole et évite les traitements concurrents d'une même monnaie.
+    Expose `put` comme une queue pour pouvoir remplacer `kline_queue`.
+    """
+
+    def __init__(self, nb_shards, handler, conflate=True, idle_timeout=None, on_idle=None):
+        self.shards = [
+            KlineShard(i, handler, conflate=conflate, idle_timeout=idle_timeout, on_idle=on_idle)
+            for i in range(nb_shards)
+        ]
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    def stop(self, timeout=None):
+        """ Arrête les shards après les éléments déjà en file ; attend leur fin si `timeout` est fourni. """
+        for shard in self.shards:
+            shard.queue.put(None)
+        if timeout is not None:
+            for shard in self.shards:
+                if shard.thread is not None:
+                    shard.thread.join(timeout)
+
+    def shard_for(self, symbole):
+        return self.shards[shard_index(symbole, len(self.shards))]
+
+    def put(self, item, block=True, timeout=None):
+        self.shard_for(item["symbole"]).queue.put(item, block, timeout)
+
+    def qsize(self):
+        return sum(shard.queue.qsize() for shard in self.shards)
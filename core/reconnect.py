@@ -0,0 +1,104 @@
+import random
+import time
+
+from core.kline_store import kline_store
+from core.ws_decode import KlineTick
+
+INTERVAL_1M_MS = 60 * 1000
+# Durées des groupes reconstruits par aggregate_higher_timeframe_klines (15m et 1h sont des multiples de 3m et 5m)
+GROUP_MS = (3 * INTERVAL_1M_MS, 5 * INTERVAL_1M_MS)
+BINANCE_KLINES_MAX_LIMIT = 1000
+
+
+class ReconnectBackoff:
+    """
+    Délai de reconnexion exponentiel avec jitter. Le compteur n'est remis à zéro que si la
+    connexion précédente est restée stable `stable_after` secondes (évite les boucles rapides).
+    """
+
+    def __init__(self, base=1.0, factor=2.0, max_delay=60.0, jitter=0.5, stable_after=60.0):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.stable_after = stable_after
+        self.attempts = 0
+        self.connected_at = None
+
+    def mark_connected(self):
+        self.connected_at = time.time()
+
+    def next_delay(self):
+        if self.connected_at is not None and time.time() - self.connected_at >= self.stable_after:
+            self.attempts = 0
+        self.connected_at = None
+        delay = min(self.max_delay, self.base * (self.factor ** self.attempts))
+        self.attempts += 1
+        # Jitter : évite que toutes les connexions se reconnectent en même temps
+        return delay * (1 - self.jitter + random.random() * self.jitter * 2)
+
+
+def fetch_missing_1m_klines(symbole, now_ms=None):
+    """
+    Récupère via l'API REST les Klines 1m clôturées manquantes depuis la dernière Kline connue
+    en mémoire. Renvoie une liste de KlineTick (vide si aucune Kline connue ou aucun trou).
+    """
+    from core.utils import get_historical_klines
+
+    last_timestamp = kline_store.get_last_timestamp(symbole, "1m")
+    if last_timestamp is None:
+        return []
+    now_ms = now_ms or int(time.time() * 1000)
+
+    ticks = []
+    start_time = last_timestamp + INTERVAL_1M_MS
+    while start_time + INTERVAL_1M_MS <= now_ms:
+        klines = get_historical_klines(symbole, "1m", limit=BINANCE_KLINES_MAX_LIMIT, start_time=start_time)
+        if not klines:
+            break
+        for k in klines:
+            if k[6] >= now_ms:  # Kline encore ouverte : elle arrivera par le WebSocket
+                break
+            ticks.append(KlineTick(
+                symbole, k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]), True
+            ))
+        if len(klines) < BINANCE_KLINES_MAX_LIMIT:
+            break
+        start_time = klines[-1][0] + INTERVAL_1M_MS
+    return ticks
+
+
+def backfill_missing_klines(symbols, handler):
+    """
+    Comble le trou laissé par une déconnexion : les Klines 1m manquantes de chaque monnaie
+    sont transmises dans l'ordre à `handler(tick)` (chemin normal flush + agrégation).
+    """
+    total = 0
+    for symbole in symbols:
+        ticks = fetch_missing_1m_klines(symbole)
+        for tick in ticks:
+            handler(tick)
+        total += len(ticks)
+    if total:
+        print(f"🩹 [BACKFILL] {total} Klines 1m récupérées via REST pour {len(symbols)} monnaies")
+    return total
+
+
+def klines_to_aggregate(klines_1m):
+    """
+    Klines 1m d'un batch à agréger, par monnaie et dans l'ordre chronologique : celles qui terminent un
+    groupe 3m/5m (donc 15m/1h), plus la dernière. Un batch de backfill couvre plusieurs groupes :
+    chaque groupe terminé pendant la coupure est ainsi reconstruit, pas seulement le dernier.
+    """
+    par_monnaie = {}
+    for kline in klines_1m:
+        if kline.intervalle == "1m":
+            par_monnaie.setdefault(kline.symbole, {})[kline.timestamp] = kline
+    resultat = {}
+    for symbole, klines in par_monnaie.items():
+        ordonnees = [klines[timestamp] for timestamp in sorted(klines)]
+        resultat[symbole] = [
+            kline for kline in ordonnees[:-1]
+            if any((kline.timestamp + INTERVAL_1M_MS) % duree == 0 for duree in GROUP_MS)
+        ] + ordonnees[-1:]
+    return resultat
@@ -0,0 +1,50 @@
+import gzip
+import threading
+import zlib
+
+
+class FrameRecorder:
+    """
+    Enregistre les trames WebSocket brutes avec leur heure de réception dans un fichier
+    gzip en ajout seul (une ligne "timestamp<TAB>trame" par message).
+    """
+
+    def __init__(self, path, flush_every=1000):
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.flush_every = flush_every
+        self.count = 0
+
+    def write(self, timestamp_reception, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        with self.lock:
+            self.file.write(f"{timestamp_reception:.6f}\t{message}\n")
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self.file.flush()
+
+    def close(self):
+        """ Termine le membre gzip (sans quoi le fichier est tronqué) ; sans effet si déjà fermé. """
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def read_recording(path):
+    """
+    Relit un enregistrement : génère des tuples (timestamp_reception, trame).
+    Un fichier dont la fin est tronquée (processus tué avant close) est relu jusqu'à la dernière
+    trame complète.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Dernière ligne incomplète
+                timestamp, _, message = line.rstrip("\n").partition("\t")
+                if message:
+                    yield float(timestamp), message
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            print(f"⚠️ [REPLAY] Enregistrement {path} tronqué, lecture arrêtée à la dernière trame complète ({e})")
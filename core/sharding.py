@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+# Code de sortie d'un worker binance_ws dont la liste de monnaies a changé :
+# le superviseur le relance immédiatement avec sa nouvelle affectation.
+EXIT_CODE_REASSIGN = 3
+
+
+def shard_file_path(run_dir, index):
+    return os.path.join(run_dir, f"binance_ws_shard_{index}.json")
+
+
+def read_symbols_file(path):
+    """ Lit la liste des monnaies affectées à un worker. """
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_symbols_file(path, symbols):
+    """ Écrit la liste des monnaies d'un worker de façon atomique (fichier temporaire + rename). """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(sorted(symbols), f)
+    os.replace(tmp_path, path)
+
+
+def watch_symbols_file(path, interval=5, on_change=None):
+    """
+    Surveille le fichier d'affectation d'un worker et termine le processus s'il change.
+    Le superviseur relance alors le worker avec ses nouvelles monnaies. `on_change` est appelé
+    avant la sortie (sauvegarde des Klines et de l'état en attente).
+    """
+    initial = read_symbols_file(path)
+    while True:
+        time.sleep(interval)
+        try:
+            current = read_symbols_file(path)
+        except (OSError, ValueError):
+            continue  # Fichier en cours de réécriture
+        if current != initial:
+            print(f"🔄 [SHARD] Affectation modifiée ({path}), redémarrage du worker...")
+            try:
+                if on_change is not None:
+                    on_change()
+            finally:
+                os._exit(EXIT_CODE_REASSIGN)
+
+
+def assign_symbols(symbols, nb_shards):
+    """ Répartition initiale équilibrée (round-robin sur la liste triée par priorité). """
+    assignment = {}
+    for i, symbole in enumerate(symbols):
+        assignment[symbole] = i % nb_shards
+    return assignment
+
+
+def rebalance_assignment(assignment, symbols, actives, nb_shards, tolerance, frozen=(), choose_movable=None):
+    """
+    Rééquilibrage de l'affectation (modifiée sur place) :
+    - les nouvelles monnaies vont au worker qui a le moins de monnaies affectées ;
+    - si l'écart de monnaies actives entre le plus et le moins chargé dépasse `tolerance`,
+      au plus écart // 2 monnaies actives sont déplacées de l'un vers l'autre.
+    Les workers de `frozen` (relancés récemment, monnaies actives en cours de rechargement) ne sont
+    ni source ni cible d'un déplacement : leur charge apparente est faussée par le redémarrage.
+    `choose_movable(candidates, n)` choisit les monnaies déplaçables (par défaut les n premières triées).
+    Renvoie (workers modifiés, monnaies déplacées).
+    """
+    modifies = set()
+    counts = {index: 0 for index in range(nb_shards)}
+    for shard in assignment.values():
+        counts[shard] += 1
+    for symbole in symbols:
+        if symbole not in assignment:
+            index = min(counts, key=counts.get)
+            assignment[symbole] = index
+            counts[index] += 1
+            modifies.add(index)
+
+    actives_par_shard = {index: [] for index in range(nb_shards) if index not in frozen}
+    for symbole in actives:
+        shard = assignment.get(symbole)
+        if shard in actives_par_shard:
+            actives_par_shard[shard].append(symbole)
+    if len(actives_par_shard) < 2:
+        return modifies, []
+
+    plus_charge = max(actives_par_shard, key=lambda index: len(actives_par_shard[index]))
+    moins_charge = min(actives_par_shard, key=lambda index: len(actives_par_shard[index]))
+    ecart = len(actives_par_shard[plus_charge]) - len(actives_par_shard[moins_charge])
+    if ecart <= tolerance:
+        return modifies, []
+
+    candidates = actives_par_shard[plus_charge]
+    deplacees = list(choose_movable(candidates, ecart // 2) if choose_movable else sorted(candidates)[:ecart // 2])
+    for symbole in deplacees:
+        assignment[symbole] = moins_charge
+    if deplacees:
+        modifies.update({plus_charge, moins_charge})
+    return modifies, deplacees
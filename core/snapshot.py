@@ -0,0 +1,154 @@
+import copy
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from core.aggregator import kline_aggregator
+from core.kline_store import kline_store
+
+SNAPSHOT_VERSION = 2
+
+
+def snapshot_path(symbols_file=None):
+    """ Un fichier par worker : binance_ws.snapshot, ou <fichier de shard>.snapshot en mode supervisé. """
+    nom = Path(symbols_file).stem if symbols_file else "binance_ws"
+    return Path(getattr(settings, "WS_SHARD_DIR", Path(settings.BASE_DIR) / "run")) / f"{nom}.snapshot"
+
+
+def build_snapshot():
+    """ Copie cohérente (par buffer) de l'état mémoire du worker. """
+    from core.utils import get_loaded_symbols
+
+    with kline_store.lock:
+        buffers = list(kline_store.buffers.items())
+    with kline_aggregator.lock:
+        rollups = copy.deepcopy(kline_aggregator.rollups)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "timestamp": time.time(),
+        "loaded_symbols": dict(get_loaded_symbols()),
+        "klines": {key: buffer.to_array() for key, buffer in buffers},
+        "rollups": rollups,
+    }
+
+
+def write_snapshot(path):
+    """ Écrit le snapshot de façon atomique (fichier temporaire puis os.replace). """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot = build_snapshot()
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def read_snapshot(path, max_age=None):
+    """ Relit un snapshot ; None s'il n'existe pas, est illisible ou plus vieux que `max_age` secondes. """
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ [SNAPSHOT] Snapshot {path} illisible : {e}")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    if max_age is not None and time.time() - snapshot["timestamp"] > max_age:
+        print(f"⚠️ [SNAPSHOT] Snapshot {path} trop ancien, chargement complet de l'historique")
+        return None
+    return snapshot
+
+
+def restore_snapshot(snapshot, symbols=None):
+    """
+    Recharge en mémoire les Klines et agrégations partielles du snapshot (limités à `symbols` si
+    fourni) ; les états d'indicateurs sont reconstruits au premier calcul. Renvoie la liste des monnaies restaurées. Elles ne sont pas
+    marquées chargées : le flux temps réel ne doit les traiter qu'après catch_up_from_snapshot.
+    """
+    garder = (lambda symbole: True) if symbols is None else set(symbols).__contains__
+    for (symbole, interval), rows in snapshot["klines"].items():
+        if garder(symbole):
+            kline_store.load(symbole, interval, rows)
+    with kline_aggregator.lock:
+        kline_aggregator.rollups.update({symbole: r for symbole, r in snapshot["rollups"].items() if garder(symbole)})
+
+    return [symbole for symbole, charge in snapshot["loaded_symbols"].items() if charge and garder(symbole)]
+
+
+def start_periodic_snapshot(path, interval_seconds):
+    """ Sauvegarde le snapshot toutes les `interval_seconds` secondes dans un thread dédié. """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                write_snapshot(path)
+            except Exception as e:
+                print(f"❌ [ERROR] Écriture du snapshot {path} : {e}")
+
+    thread = threading.Thread(target=run, name="warm-start-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def catch_up_from_snapshot(symbols, streaming_aggregation=False):
+    """
+    Après restauration : récupère via REST uniquement les Klines publiées depuis le snapshot.
+    Les Klines 1m manquantes sont ajoutées au kline_store. Les intervalles supérieurs sont soit
+    ré-agrégés depuis ces Klines 1m (agrégation streaming), soit relus par intervalle depuis la
+    dernière Kline connue. Tout est écrit en base en un seul chargement par monnaie.
+
+    Chaque monnaie n'est marquée chargée qu'une fois son rattrapage terminé : avant, process_kline
+    l'ignore, si bien qu'aucune Kline temps réel ne peut précéder le delta dans le kline_store ou
+    l'agrégateur (elle masquerait le trou). Renvoie les monnaies rattrapées.
+    """
+    from core.utils import set_loaded_symbol
+
+    total = 0
+    rattrapees = []
+    for symbole in symbols:
+        try:
+            total += catch_up_symbol(symbole, streaming_aggregation)
+        except Exception as e:
+            print(f"❌ [ERROR] Rattrapage de {symbole} depuis le snapshot : {e}")
+            continue
+        set_loaded_symbol(symbole, True)
+        rattrapees.append(symbole)
+    print(f"🔁 [SNAPSHOT] {total} Klines récupérées depuis le snapshot pour {len(rattrapees)} monnaies")
+    return rattrapees
+
+
+def catch_up_symbol(symbole, streaming_aggregation=False):
+    """ Rattrapage d'une monnaie restaurée ; renvoie le nombre de Klines chargées. """
+    from core.bulk_loader import bulk_load_klines, binance_klines_to_rows
+    from core.reconnect import fetch_missing_1m_klines
+    from core.utils import get_historical_klines
+
+    ticks = fetch_missing_1m_klines(symbole)
+    if streaming_aggregation:
+        ticks += kline_aggregator.add_batch(ticks)
+    rows = [
+        (k.symbole, k.intervalle, k.timestamp, k.open_price, k.high_price, k.low_price, k.close_price, k.volume)
+        for k in ticks
+    ]
+
+    if not streaming_aggregation:
+        for interval in [key[1] for key in list(kline_store.buffers) if key[0] == symbole and key[1] != "1m"]:
+            last_timestamp = kline_store.get_last_timestamp(symbole, interval)
+            if last_timestamp is None:
+                continue
+            # La dernière Kline connue était peut-être encore ouverte au moment du snapshot : elle est relue
+            rows += binance_klines_to_rows(
+                symbole, interval, get_historical_klines(symbole, interval, limit=1000, start_time=last_timestamp)
+            )
+
+    for row in rows:
+        kline_store.append(*row)
+    bulk_load_klines(rows, update=True)
+    return len(rows)
@@ -1,3 +1,1249 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import archive, snapshot as snapshot_module, utils
+from core.aggregator import SymbolRollup, kline_aggregator
+from core.batch_indicators import compute_indicators_batch
+from core.bulk_loader import bulk_load_klines
+from core.flusher import KlineFlusher
+from core.indicator_backends import BACKENDS, INDICATOR_OUTPUTS, talib
+from core.indicator_history import IndicatorHistoryBuffer, get_latest_indicators
+from core.indicator_plan import compile_combined_test, to_json
+from core.indicators import ClosedBarCache, IndicatorState, get_indicator_state, reset_indicator_state
+from core.kline_store import CLOSE, KlineRingBuffer, KlineStore, kline_store
+from core.live_scheduler import LiveRecomputeScheduler
+from core.live_state import LiveIndicatorStore, MonnaieLiveProxy, live_monnaie, split_indicator_field
+from core.models import Calculation, CombinedTest, Indicator, IndicatorTest, Kline, Monnaie, Strategy
+from core.queues import ConflatingKlineQueue, ShardedKlinePool, shard_index
+from core.reconnect import ReconnectBackoff, backfill_missing_klines, fetch_missing_1m_klines, klines_to_aggregate
+from core.recording import FrameRecorder, read_recording
+from core.sharding import assign_symbols, rebalance_assignment
+from core.utils import calculate_rsi, calculate_stoch_rsi, calculate_macd, calculate_bollinger_bands
+from core.write_behind import MonnaieWriteBehind
+from core.ws_decode import KlineTick, decode_kline_message, extract_symbol
+
+
+def random_closes(n, seed=42, start=100.0):
+    rng = random.Random(seed)
+    closes = [start]
+    for _ in range(n - 1):
+        closes.append(max(0.01, closes[-1] * (1 + rng.gauss(0, 0.01))))
+    return closes
+
+
+class StreamingIndicatorParityTest(SimpleTestCase):
+    """ Les indicateurs incrémentaux doivent donner les mêmes valeurs que les fonctions de référence. """
+
+    def assertIndicatorsEqual(self, values, closes):
+        rsi = calculate_rsi(closes)
+        stoch_rsi = calculate_stoch_rsi(closes)
+        macd, macd_signal = calculate_macd(closes)
+        upper, middle, lower = calculate_bollinger_bands(closes)
+        expected = {
+            'rsi': rsi,
+            'stoch_rsi': stoch_rsi,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'bollinger_upper': upper,
+            'bollinger_middle': middle,
+            'bollinger_lower': lower,
+        }
+        for name, value in expected.items():
+            if value is None:
+                self.assertIsNone(values[name], f"{name} (n={len(closes)})")
+            else:
+                self.assertAlmostEqual(values[name], value, places=6, msg=f"{name} (n={len(closes)})")
+
+    def check_series(self, closes):
+        state = IndicatorState()
+        for i, close in enumerate(closes):
+            # Tick non clôturé : peek ne doit pas modifier l'état
+            self.assertIndicatorsEqual(state.peek(close), closes[:i + 1])
+            self.assertIndicatorsEqual(state.update(close), closes[:i + 1])
+
+    def test_random_walk(self):
+        self.check_series(random_closes(120))
+
+    def test_high_prices(self):
+        self.check_series(random_closes(120, seed=7, start=65000.0))
+
+    def test_flat_and_monotonic_segments(self):
+        closes = [10.0] * 20 + [10.0 + i * 0.1 for i in range(30)] + random_closes(40, seed=3, start=13.0) + [12.0] * 25
+        self.check_series(closes)
+
+
+class IndicatorBackendParityTest(SimpleTestCase):
+    """ Chaque backend doit reproduire les valeurs du backend de référence (pandas). """
+
+    SERIES = {
+        "random_walk": random_closes(100),
+        "high_prices": random_closes(100, seed=7, start=65000.0),
+        "flat_segments": [10.0] * 20 + [10.0 + i * 0.1 for i in range(30)] + random_closes(40, seed=3, start=13.0) + [12.0] * 10,
+    }
+
+    def check_backend(self, name, macd_tolerance=None):
+        backend, reference = BACKENDS[name], BACKENDS["reference"]
+        for serie, closes in self.SERIES.items():
+            for n in range(14, len(closes) + 1):
+                expected = reference.compute(closes[:n])
+                values = backend.compute(closes[:n])
+                for field, value in expected.items():
+                    msg = f"{name} {field} ({serie}, n={n})"
+                    if value is None:
+                        self.assertIsNone(values[field], msg)
+                    elif macd_tolerance is not None and field in ("macd", "macd_signal"):
+                        # EMA amorcées sur une moyenne simple : comparées sur la fenêtre de 100 Klines du temps réel
+                        if n == len(closes):
+                            self.assertAlmostEqual(values[field], value, delta=macd_tolerance * closes[n - 1], msg=msg)
+                    else:
+                        self.assertAlmostEqual(values[field], value, places=6, msg=msg)
+
+    def test_numpy(self):
+        self.check_backend("numpy")
+
+    def test_incremental(self):
+        self.check_backend("incremental")
+
+    @skipUnless(talib is not None, "TA-Lib non installé")
+    def test_talib(self):
+        self.check_backend("talib", macd_tolerance=5e-5)
+
+    def test_indicator_selection(self):
+        for name in BACKENDS:
+            if name == "talib" and talib is None:
+                continue
+            values = BACKENDS[name].compute(self.SERIES["random_walk"], ["rsi"])
+            self.assertIsNotNone(values["rsi"], name)
+            self.assertTrue(all(value is None for field, value in values.items() if field != "rsi"), name)
+
+
+class BatchIndicatorParityTest(SimpleTestCase):
+    """ Calcul vectorisé (monnaies x Klines) : mêmes valeurs que les fonctions de référence de core/utils.py. """
+
+    LIGNES = [
+        random_closes(100),
+        random_closes(100, seed=7, start=65000.0),
+        IndicatorBackendParityTest.SERIES["flat_segments"],
+        [10.0] * 100,
+    ]
+
+    def reference(self, closes):
+        macd, signal = calculate_macd(closes)
+        upper, middle, lower = calculate_bollinger_bands(closes)
+        return {
+            "rsi": calculate_rsi(closes), "stoch_rsi": calculate_stoch_rsi(closes), "macd": macd, "macd_signal": signal,
+            "bollinger_upper": upper, "bollinger_middle": middle, "bollinger_lower": lower,
+        }
+
+    def test_parity_with_reference_functions(self):
+        for n in (14, 20, 26, 31, 45, 60, 100):
+            lignes = [closes[-n:] for closes in self.LIGNES]
+            resultats, a_recalculer = compute_indicators_batch(lignes)
+            for i, (closes, indicateurs, recalcul) in enumerate(zip(lignes, resultats, a_recalculer)):
+                if recalcul:
+                    # Même repli que calculate_indicators_batch : StochRSI recalculé par la fonction de référence
+                    indicateurs["stoch_rsi"] = calculate_stoch_rsi(closes)
+                for field, value in self.reference(closes).items():
+                    msg = f"{field} (ligne {i}, n={n})"
+                    if value is None or value != value:  # Référence indisponible (None ou NaN)
+                        self.assertIsNone(indicateurs[field], msg)
+                    else:
+                        self.assertAlmostEqual(indicateurs[field], value, places=6, msg=msg)
+
+    def test_flat_segments_are_flagged_for_recompute(self):
+        resultats, a_recalculer = compute_indicators_batch(self.LIGNES)
+        self.assertEqual(a_recalculer.tolist(), [False, False, True, True])
+        self.assertIsNone(resultats[3]["stoch_rsi"])
+        self.assertEqual(resultats[3]["rsi"], 100.0)
+
+
+class ClosedBarCacheTest(SimpleTestCase):
+    """ Le cache de la fenêtre clôturée doit donner les valeurs de référence et suivre le buffer. """
+
+    SYMBOLE = "CACHETESTUSDT"
+
+    def setUp(self):
+        self.closes = random_closes(150, seed=11)
+        kline_store.load(self.SYMBOLE, "5m", [(i * 300000, c, c, c, c, 1.0) for i, c in enumerate(self.closes)])
+        self.cache = ClosedBarCache(window=100)
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+
+    def assertPeekMatchesReference(self, closes, live_close):
+        values = self.cache.get(self.SYMBOLE, "5m").peek(live_close)
+        expected = BACKENDS["reference"].compute(closes[-100:] + [live_close])
+        for field, value in expected.items():
+            self.assertAlmostEqual(values[field], value, places=6, msg=field)
+
+    def test_live_ticks_reuse_closed_window(self):
+        for live_close in (self.closes[-1] * 1.01, self.closes[-1] * 0.98, self.closes[-1]):
+            self.assertPeekMatchesReference(self.closes, live_close)
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 2))
+
+    def test_invalidated_on_new_closed_bar(self):
+        self.cache.get(self.SYMBOLE, "5m")
+        kline_store.append(self.SYMBOLE, "5m", 150 * 300000, 1, 1, 1, 101.0, 1.0)
+        self.assertPeekMatchesReference(self.closes + [101.0], 102.0)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_invalidated_on_replaced_or_reloaded_history(self):
+        self.cache.get(self.SYMBOLE, "5m")
+        # Dernière Kline réécrite (même timestamp)
+        kline_store.append(self.SYMBOLE, "5m", 149 * 300000, 1, 1, 1, 90.0, 1.0)
+        self.assertPeekMatchesReference(self.closes[:-1] + [90.0], 91.0)
+        # Historique rechargé
+        rechargees = random_closes(120, seed=12)
+        kline_store.load(self.SYMBOLE, "5m", [(i * 300000, c, c, c, c, 1.0) for i, c in enumerate(rechargees)])
+        self.assertPeekMatchesReference(rechargees, rechargees[-1])
+        self.assertEqual(self.cache.misses, 3)
+
+
+class LiveRecomputeSchedulerTest(SimpleTestCase):
+    """ Cadence par intervalle, seuil de variation du prix et clôture d'une nouvelle Kline. """
+
+    SYMBOLE = "SCHEDTESTUSDT"
+
+    def setUp(self):
+        kline_store.load(self.SYMBOLE, "1h", [(0, 100.0, 100.0, 100.0, 100.0, 1.0)])
+        self.scheduler = LiveRecomputeScheduler({"1m": 0, "1h": 60}, seuil_variation=1.0)
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+
+    def test_every_tick_interval(self):
+        self.assertTrue(all(self.scheduler.due(self.SYMBOLE, "1m", 100.0, maintenant=t) for t in range(5)))
+
+    def test_cadence_and_price_threshold(self):
+        due = lambda prix, t: self.scheduler.due(self.SYMBOLE, "1h", prix, maintenant=t)
+        self.assertTrue(due(100.0, 0))
+        self.assertFalse(due(100.5, 10))   # Cadence non écoulée, variation < 1 %
+        self.assertTrue(due(101.5, 20))    # Variation >= 1 % depuis le dernier recalcul
+        self.assertFalse(due(101.0, 30))
+        self.assertTrue(due(101.0, 80))    # Cadence écoulée
+
+    def test_new_closed_bar_forces_recompute(self):
+        self.assertTrue(self.scheduler.due(self.SYMBOLE, "1h", 100.0, maintenant=0))
+        kline_store.append(self.SYMBOLE, "1h", 3600000, 100.0, 100.0, 100.0, 100.0, 1.0)
+        self.assertTrue(self.scheduler.due(self.SYMBOLE, "1h", 100.0, maintenant=1))
+
+
+class ProcessKlineRecomputeTest(TestCase):
+    """ process_kline : un tick non clôturé ne recalcule que les intervalles dus (cadence, variation, clôture). """
+
+    SYMBOLE = "RECOMPUTETESTUSDT"
+    CADENCES = {"1m": 0, "3m": 60, "5m": 60, "15m": 60, "1h": 60, "4h": 60, "1d": 60}
+
+    def setUp(self):
+        from core.management.commands import binance_ws
+
+        self.binance_ws = binance_ws
+        kline_store.load(self.SYMBOLE, "5m", [(0, 100.0, 100.0, 100.0, 100.0, 1.0)])
+        self.addCleanup(kline_store.drop_symbol, self.SYMBOLE)
+        self.calculate = mock.Mock()
+        for patcher in (
+            mock.patch.object(binance_ws, "live_scheduler", LiveRecomputeScheduler(self.CADENCES, seuil_variation=0.5)),
+            mock.patch("core.utils.get_loaded_symbols", return_value={self.SYMBOLE: True}),
+            mock.patch("core.utils.calculate_indicators", self.calculate),
+            mock.patch("core.utils.execute_strategies"),
+            mock.patch("core.utils.execute_sell_strategy"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tick(self, close):
+        kline = KlineTick(self.SYMBOLE, 600000, 100.0, max(close, 100.0), min(close, 100.0), close, 1.0, False)
+        self.calculate.reset_mock()
+        self.binance_ws.process_kline({"symbole": self.SYMBOLE, "kline": kline, "timestamp_reception": time.time()})
+        return [appel.args[1] for appel in self.calculate.call_args_list]
+
+    def test_skips_recompute_below_threshold_within_cadence(self):
+        self.assertEqual(self.tick(100.0), list(self.CADENCES))  # Premier tick : tout est calculé
+        self.assertEqual(self.tick(100.2), ["1m"])  # Variation 0.2 % < 0.5 %, cadence non écoulée
+        self.assertEqual(self.tick(100.4), ["1m"])
+        self.assertEqual(self.tick(101.0), list(self.CADENCES))  # Variation 1 % depuis le dernier recalcul
+        self.assertEqual(self.binance_ws.live_scheduler.nb_ignores, 12)
+
+    def test_new_closed_kline_forces_recompute(self):
+        self.tick(100.0)
+        kline_store.append(self.SYMBOLE, "5m", 300000, 100.0, 100.0, 100.0, 100.0, 1.0)
+        self.assertEqual(self.tick(100.1), ["1m", "5m"])
+
+
+class WindowedIndicatorStateTest(SimpleTestCase):
+    """
+    L'état partagé du moteur incrémental doit suivre la fenêtre des 100 dernières Klines clôturées
+    (comme la référence en production), y compris sur un historique plus long et en concurrence.
+    """
+
+    SYMBOLE = "WINDOWTESTUSDT"
+
+    def setUp(self):
+        self.closes = random_closes(400, seed=5)
+        kline_store.load(self.SYMBOLE, "1m", [(i * 60000, c, c, c, c, 1.0) for i, c in enumerate(self.closes)])
+        reset_indicator_state(self.SYMBOLE)
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+        reset_indicator_state(self.SYMBOLE)
+
+    def assertMatchesReference(self, values, closes):
+        for field, value in BACKENDS["reference"].compute(closes).items():
+            self.assertAlmostEqual(values[field], value, places=6, msg=field)
+
+    def test_long_history_matches_reference_window(self):
+        state = get_indicator_state(self.SYMBOLE, "1m")
+        self.assertMatchesReference(state.current(), self.closes[-100:])
+        self.assertMatchesReference(state.peek(123.0), self.closes[-100:] + [123.0])
+
+        kline_store.append(self.SYMBOLE, "1m", 400 * 60000, 1, 1, 1, 124.0, 1.0)
+        state = get_indicator_state(self.SYMBOLE, "1m")
+        self.assertMatchesReference(state.current(), (self.closes + [124.0])[-100:])
+
+    def test_concurrent_sync_does_not_replay_bars(self):
+        kline_store.append(self.SYMBOLE, "1m", 400 * 60000, 1, 1, 1, 124.0, 1.0)
+        states = []
+        threads = [threading.Thread(target=lambda: states.append(get_indicator_state(self.SYMBOLE, "1m"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for state in states:
+            self.assertEqual(state.count, 100)
+            self.assertMatchesReference(state.current(), (self.closes + [124.0])[-100:])
+
+
+def minute(symbole, i, close, volume=1.0):
+    """ Kline 1m clôturée numéro `i` (timestamp i minutes). """
+    return KlineTick(symbole, i * 60000, close - 0.5, close + 1.0, close - 1.0, close, volume, True)
+
+
+class AggregatorTest(SimpleTestCase):
+    """ Agrégation des Klines 1m clôturées : émission, trous et reconstitution du groupe en cours. """
+
+    SYMBOLE = "AGGTESTUSDT"
+
+    def setUp(self):
+        self.fetches = []
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+
+    def rollup(self, rows=None):
+        def fetch_1m(symbole, start_ms, end_ms):
+            self.fetches.append((start_ms, end_ms))
+            if rows is None:
+                raise ConnectionError("API indisponible")
+            return [row for row in rows if start_ms <= row[0] < end_ms]
+        return SymbolRollup(self.SYMBOLE, intervals=("3m", "5m"), fetch_1m=fetch_1m)
+
+    def feed(self, rollup, indices):
+        emises = []
+        for i in indices:
+            kline = minute(self.SYMBOLE, i, 100.0 + i, volume=i + 1.0)
+            kline_store.append_kline(kline)
+            emises.extend(rollup.add(kline))
+        return {(k.intervalle, k.timestamp): k for k in emises}
+
+    def assertBar(self, bar, first, last):
+        self.assertEqual(bar.open_price, 100.0 + first - 0.5)
+        self.assertEqual(bar.high_price, 100.0 + last + 1.0)
+        self.assertEqual(bar.low_price, 100.0 + first - 1.0)
+        self.assertEqual(bar.close_price, 100.0 + last)
+        self.assertEqual(bar.volume, sum(i + 1.0 for i in range(first, last + 1)))
+
+    def test_emits_on_last_minute_of_group(self):
+        emises = self.feed(self.rollup(), range(0, 10))
+        self.assertEqual(sorted(emises), [("3m", 0), ("3m", 180000), ("3m", 360000), ("5m", 0), ("5m", 300000)])
+        self.assertBar(emises[("3m", 180000)], 3, 5)
+        self.assertBar(emises[("5m", 300000)], 5, 9)
+        self.assertEqual(self.fetches, [])
+
+    def test_gap_drops_incomplete_group(self):
+        rollup = self.rollup()
+        self.feed(rollup, range(0, 2))
+        emises = self.feed(rollup, [6])
+        self.assertEqual(emises, {})   # Groupes 0-2 et 0-4 interrompus : jamais émis
+        self.assertEqual(rollup.partial("3m").timestamp, 360000)
+        emises = self.feed(rollup, [7, 8])
+        self.assertEqual(sorted(emises), [("3m", 360000)])
+        self.assertBar(emises[("3m", 360000)], 6, 8)
+
+    def test_seed_from_store(self):
+        for i in range(0, 4):
+            kline_store.append_kline(minute(self.SYMBOLE, i, 100.0 + i, volume=i + 1.0))
+        emises = self.feed(self.rollup(), [4])   # Démarrage en milieu de groupe, minutes 0-3 en mémoire
+        self.assertBar(emises[("5m", 0)], 0, 4)
+        self.assertEqual(self.fetches, [])
+
+    def test_seed_from_rest(self):
+        rows = [(i * 60000, 100.0 + i - 0.5, 100.0 + i + 1.0, 100.0 + i - 1.0, 100.0 + i, i + 1.0) for i in range(0, 4)]
+        rollup = self.rollup(rows)
+        emises = self.feed(rollup, [4])
+        self.assertBar(emises[("5m", 0)], 0, 4)
+        self.assertEqual(self.fetches, [(180000, 240000), (0, 240000)])
+        emises = self.feed(rollup, [5])
+        self.assertBar(emises[("3m", 180000)], 3, 5)
+
+    def test_inexact_seed_is_not_emitted(self):
+        rows = [(i * 60000, 100.0, 101.0, 99.0, 100.0, 1.0) for i in (0, 1, 3)]  # Minute 2 manquante
+        rollup = self.rollup(rows)
+        emises = self.feed(rollup, [4])
+        self.assertNotIn(("5m", 0), emises)
+        self.assertIsNone(rollup.partial("5m"))
+
+        emises = self.feed(self.rollup(), [4])  # API indisponible
+        self.assertEqual(emises, {})
+        # Le groupe suivant repart normalement
+        emises = self.feed(rollup, range(5, 10))
+        self.assertBar(emises[("5m", 300000)], 5, 9)
+
+
+class ConflatingKlineQueueTest(SimpleTestCase):
+    """ Conflation des ticks non clôturés sans jamais perdre ni réordonner une Kline clôturée. """
+
+    def item(self, symbole, i, is_closed=False):
+        return {"symbole": symbole, "kline": KlineTick(symbole, i * 60000, 1.0, 1.0, 1.0, float(i), 1.0, is_closed)}
+
+    def drain(self, file):
+        items = []
+        while not file.empty():
+            items.append(file.get_nowait())
+        return [(item["symbole"], item["kline"].close_price, item["kline"].is_closed) for item in items]
+
+    def test_unclosed_ticks_are_conflated_in_place(self):
+        file = ConflatingKlineQueue()
+        for i in range(5):
+            file.put(self.item("AAAUSDT", i))
+            file.put(self.item("BBBUSDT", i))
+        self.assertEqual(self.drain(file), [("AAAUSDT", 4.0, False), ("BBBUSDT", 4.0, False)])
+        self.assertEqual(file.nb_conflated, 8)
+
+    def test_closed_klines_are_never_dropped_or_reordered(self):
+        file = ConflatingKlineQueue()
+        for i in range(3):
+            file.put(self.item("AAAUSDT", i, is_closed=True))
+            file.put(self.item("BBBUSDT", i))
+        self.assertEqual(self.drain(file), [
+            ("AAAUSDT", 0.0, True), ("BBBUSDT", 2.0, False), ("AAAUSDT", 1.0, True), ("AAAUSDT", 2.0, True),
+        ])
+
+    def test_tick_after_close_does_not_replace_earlier_tick(self):
+        file = ConflatingKlineQueue()
+        file.put(self.item("AAAUSDT", 1))
+        file.put(self.item("AAAUSDT", 2, is_closed=True))
+        file.put(self.item("AAAUSDT", 3))
+        file.put(self.item("AAAUSDT", 4))
+        self.assertEqual(self.drain(file), [("AAAUSDT", 1.0, False), ("AAAUSDT", 2.0, True), ("AAAUSDT", 4.0, False)])
+
+    def test_tick_after_dequeue_is_queued_again(self):
+        file = ConflatingKlineQueue()
+        file.put(self.item("AAAUSDT", 1))
+        self.assertEqual(file.get_nowait()["kline"].close_price, 1.0)
+        file.put(self.item("AAAUSDT", 2))
+        self.assertEqual(self.drain(file), [("AAAUSDT", 2.0, False)])
+
+
+class ShardAssignmentTest(SimpleTestCase):
+    """ Répartition des monnaies entre workers binance_ws et rééquilibrage du superviseur. """
+
+    def setUp(self):
+        self.symbols = [f"S{i:02d}USDT" for i in range(12)]
+        self.assignment = assign_symbols(self.symbols, 3)
+
+    def test_initial_assignment_is_round_robin(self):
+        self.assertEqual([self.assignment[s] for s in self.symbols[:6]], [0, 1, 2, 0, 1, 2])
+
+    def test_new_symbols_go_to_smallest_shard(self):
+        del self.assignment["S01USDT"], self.assignment["S04USDT"]  # Worker 1 : 2 monnaies
+        modifies, deplacees = rebalance_assignment(self.assignment, ["NEWUSDT", "NEW2USDT"], set(), 3, tolerance=2)
+        self.assertEqual((self.assignment["NEWUSDT"], self.assignment["NEW2USDT"]), (1, 1))
+        self.assertEqual((modifies, deplacees), ({1}, []))
+
+    def test_moves_half_of_gap_then_stays_stable(self):
+        actives = {s for s in self.symbols if self.assignment[s] == 0}  # 4 actives sur le worker 0, 0 ailleurs
+        modifies, deplacees = rebalance_assignment(self.assignment, self.symbols, actives, 3, tolerance=2)
+        self.assertEqual(len(deplacees), 2)
+        self.assertEqual(modifies, {0, self.assignment[deplacees[0]]})
+        # Même situation au passage suivant : plus d'écart au-delà de la tolérance, aucun aller-retour
+        self.assertEqual(rebalance_assignment(self.assignment, self.symbols, actives, 3, tolerance=2), (set(), []))
+
+    def test_within_tolerance_does_nothing(self):
+        actives = {s for s in self.symbols if self.assignment[s] == 0} - {"S00USDT", "S03USDT"}
+        self.assertEqual(rebalance_assignment(self.assignment, self.symbols, actives, 3, tolerance=2), (set(), []))
+
+    def test_recently_restarted_shards_are_frozen(self):
+        # Workers 1 et 2 relancés : leurs monnaies ne sont pas encore réactivées, leur charge est faussée
+        actives = {s for s in self.symbols if self.assignment[s] == 0}
+        avant = dict(self.assignment)
+        self.assertEqual(rebalance_assignment(self.assignment, self.symbols, actives, 3, tolerance=2, frozen={1, 2}), (set(), []))
+        modifies, deplacees = rebalance_assignment(self.assignment, self.symbols, actives, 3, tolerance=2, frozen={1})
+        self.assertEqual(modifies, {0, 2})
+        self.assertTrue(all(self.assignment[s] == 2 for s in deplacees))
+        self.assertTrue(all(self.assignment[s] == avant[s] for s in self.symbols if s not in deplacees))
+
+    def test_choose_movable_limits_candidates(self):
+        actives = {s for s in self.symbols if self.assignment[s] == 0}
+        _, deplacees = rebalance_assignment(
+            self.assignment, self.symbols, actives, 3, tolerance=2, choose_movable=lambda candidates, n: ["S09USDT"],
+        )
+        self.assertEqual(deplacees, ["S09USDT"])
+
+
+class ReconnectBackoffTest(SimpleTestCase):
+    """ Délai exponentiel, plafond, bornes du jitter et remise à zéro après une connexion stable. """
+
+    def delays(self, backoff, n, alea=0.5):
+        with mock.patch("core.reconnect.random.random", return_value=alea):
+            return [backoff.next_delay() for _ in range(n)]
+
+    def test_exponential_growth_and_cap(self):
+        self.assertEqual(self.delays(ReconnectBackoff(base=1.0, factor=2.0, max_delay=10.0), 6), [1.0, 2.0, 4.0, 8.0, 10.0, 10.0])
+
+    def test_jitter_bounds(self):
+        self.assertEqual(self.delays(ReconnectBackoff(base=4.0, jitter=0.5), 1, alea=0.0), [2.0])
+        self.assertAlmostEqual(self.delays(ReconnectBackoff(base=4.0, jitter=0.5), 1, alea=0.999999)[0], 6.0, places=4)
+        backoff = ReconnectBackoff(base=1.0, max_delay=8.0, jitter=0.5)
+        for attempt in range(200):
+            delay = backoff.next_delay()
+            nominal = min(8.0, 2.0 ** min(attempt, 10))
+            self.assertTrue(nominal * 0.5 <= delay <= nominal * 1.5, (attempt, delay))
+
+    def test_reset_only_after_stable_connection(self):
+        backoff = ReconnectBackoff(base=1.0, stable_after=60.0)
+        with mock.patch("core.reconnect.time.time", return_value=1000.0):
+            self.delays(backoff, 3)
+            backoff.mark_connected()
+        with mock.patch("core.reconnect.time.time", return_value=1010.0):
+            self.assertEqual(self.delays(backoff, 1), [8.0])  # Connexion instable : pas de remise à zéro
+            backoff.mark_connected()
+        with mock.patch("core.reconnect.time.time", return_value=1100.0):
+            self.assertEqual(self.delays(backoff, 1), [1.0])
+
+
+class BackfillTest(SimpleTestCase):
+    """ Récupération REST (stubbée) des Klines 1m manquées pendant une coupure. """
+
+    SYMBOLE = "BACKFILLTESTUSDT"
+
+    def setUp(self):
+        kline_store.load(self.SYMBOLE, "1m", [(i * 60000, 1.0, 1.0, 1.0, 1.0, 1.0) for i in range(10)])
+        self.appels = []
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+
+    def fake_klines(self, symbole, interval, limit=None, start_time=None):
+        """ API REST simulée : Klines 1m jusqu'à la minute 2500 (encore ouverte). """
+        self.appels.append(start_time)
+        debut = start_time // 60000
+        return [
+            [i * 60000, "1", "2", "0.5", str(i), "3", i * 60000 + 59999] for i in range(debut, min(debut + limit, 2501))
+        ]
+
+    def test_fetch_pages_until_open_kline(self):
+        with mock.patch("core.utils.get_historical_klines", side_effect=self.fake_klines):
+            ticks = fetch_missing_1m_klines(self.SYMBOLE, now_ms=2500 * 60000 + 30000)
+        self.assertEqual([t.timestamp // 60000 for t in ticks], list(range(10, 2500)))  # Minute 2500 ouverte : exclue
+        self.assertTrue(all(t.is_closed and t.intervalle == "1m" for t in ticks))
+        self.assertEqual(ticks[0].close_price, 10.0)
+        self.assertEqual(self.appels, [600000, 1010 * 60000, 2010 * 60000])
+
+    def test_no_gap_and_unknown_symbol(self):
+        with mock.patch("core.utils.get_historical_klines", side_effect=self.fake_klines):
+            self.assertEqual(fetch_missing_1m_klines(self.SYMBOLE, now_ms=10 * 60000 + 30000), [])
+            self.assertEqual(fetch_missing_1m_klines("INCONNUUSDT", now_ms=2500 * 60000), [])
+        self.assertEqual(self.appels, [])
+
+    def test_backfill_feeds_handler_in_order(self):
+        recues = []
+        with mock.patch("core.utils.get_historical_klines", side_effect=self.fake_klines), \
+                mock.patch("core.reconnect.time.time", return_value=20.5 * 60):
+            total = backfill_missing_klines([self.SYMBOLE, "INCONNUUSDT"], recues.append)
+        self.assertEqual(total, 10)
+        self.assertEqual([t.timestamp // 60000 for t in recues], list(range(10, 20)))
+
+    def test_backfilled_batch_aggregates_every_closed_group(self):
+        ticks = [minute(self.SYMBOLE, i, 1.0) for i in range(10, 21)] + [minute("AUTREUSDT", 4, 1.0)]
+        par_monnaie = klines_to_aggregate(list(reversed(ticks)))
+        # Fins de groupes 3m/5m (minutes 11, 14, 17, 19) puis la dernière Kline du batch
+        self.assertEqual([k.timestamp // 60000 for k in par_monnaie[self.SYMBOLE]], [11, 14, 17, 19, 20])
+        self.assertEqual([k.timestamp // 60000 for k in par_monnaie["AUTREUSDT"]], [4])
+
+
+class SnapshotTest(SimpleTestCase):
+    """ Relecture (version, âge) et restauration filtrée du snapshot de démarrage à chaud. """
+
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.chemin = os.path.join(self.dossier.name, "binance_ws.snapshot")
+
+    def tearDown(self):
+        self.dossier.cleanup()
+        for symbole in ("SNAPAUSDT", "SNAPBUSDT", "SNAPCUSDT"):
+            kline_store.drop_symbol(symbole)
+            kline_aggregator.drop_symbol(symbole)
+
+    def ecrire(self, **champs):
+        snapshot = {"version": snapshot_module.SNAPSHOT_VERSION, "timestamp": time.time(), **champs}
+        with open(self.chemin, "wb") as f:
+            pickle.dump(snapshot, f)
+        return snapshot
+
+    def test_read_rejects_old_version_and_age(self):
+        self.assertIsNone(snapshot_module.read_snapshot(self.chemin))  # Absent
+        self.ecrire(version=snapshot_module.SNAPSHOT_VERSION - 1)
+        self.assertIsNone(snapshot_module.read_snapshot(self.chemin))
+        self.ecrire(timestamp=time.time() - 3600)
+        self.assertIsNone(snapshot_module.read_snapshot(self.chemin, max_age=600))
+        self.assertIsNotNone(snapshot_module.read_snapshot(self.chemin, max_age=7200))
+        with open(self.chemin, "wb") as f:
+            f.write(b"tronque")
+        self.assertIsNone(snapshot_module.read_snapshot(self.chemin))
+
+    def test_restore_filters_symbols_and_keeps_them_unloaded(self):
+        lignes = [(i * 60000, 1.0, 1.0, 1.0, float(i), 1.0) for i in range(5)]
+        snapshot = {
+            "klines": {(s, "1m"): lignes for s in ("SNAPAUSDT", "SNAPBUSDT", "SNAPCUSDT")},
+            "rollups": {s: SymbolRollup(s) for s in ("SNAPAUSDT", "SNAPBUSDT")},
+            "loaded_symbols": {"SNAPAUSDT": True, "SNAPBUSDT": True, "SNAPCUSDT": False},
+        }
+        restaurees = snapshot_module.restore_snapshot(snapshot, ["SNAPAUSDT", "SNAPCUSDT"])
+        self.assertEqual(restaurees, ["SNAPAUSDT"])  # SNAPCUSDT n'était pas chargée, SNAPBUSDT hors du worker
+        self.assertEqual(kline_store.get_last_timestamp("SNAPAUSDT", "1m"), 4 * 60000)
+        self.assertEqual(kline_store.get_last_timestamp("SNAPCUSDT", "1m"), 4 * 60000)
+        self.assertFalse(kline_store.has("SNAPBUSDT", "1m"))
+        self.assertIn("SNAPAUSDT", kline_aggregator.rollups)
+        self.assertNotIn("SNAPBUSDT", kline_aggregator.rollups)
+        self.assertFalse(utils.get_loaded_symbols().get("SNAPAUSDT", False))
+
+
+class CatchUpTest(TestCase):
+    """ Rattrapage d'une monnaie restaurée : seul le delta REST (stubbé) est chargé, en mémoire et en base. """
+
+    SYMBOLE = "CATCHUPUSDT"
+
+    def setUp(self):
+        kline_store.load(self.SYMBOLE, "1m", [(i * 60000, 1.0, 1.0, 1.0, 1.0, 1.0) for i in range(10)])
+        kline_store.load(self.SYMBOLE, "5m", [(0, 1.0, 1.0, 1.0, 1.0, 5.0), (300000, 1.0, 1.0, 1.0, 1.0, 5.0)])
+        self.appels = []
+
+    def tearDown(self):
+        kline_store.drop_symbol(self.SYMBOLE)
+        kline_aggregator.drop_symbol(self.SYMBOLE)
+
+    def fake_klines(self, symbole, interval, limit=None, start_time=None):
+        """ API REST simulée jusqu'à la minute 15 (minute 15 encore ouverte). """
+        self.appels.append((interval, start_time))
+        duree = 60000 if interval == "1m" else 300000
+        return [
+            [t, "1", "3", "0.5", "2", "1", t + duree - 1] for t in range(start_time, 16 * 60000, duree)
+        ]
+
+    def catch_up(self, streaming):
+        with mock.patch("core.utils.get_historical_klines", side_effect=self.fake_klines), \
+                mock.patch("core.reconnect.time.time", return_value=15.5 * 60):
+            return snapshot_module.catch_up_symbol(self.SYMBOLE, streaming)
+
+    def test_rest_delta_per_interval(self):
+        self.assertEqual(self.catch_up(streaming=False), 5 + 3)
+        self.assertEqual(self.appels, [("1m", 600000), ("5m", 300000)])
+        self.assertEqual(kline_store.get_last_timestamp(self.SYMBOLE, "1m"), 14 * 60000)
+        self.assertEqual(kline_store.get_last_timestamp(self.SYMBOLE, "5m"), 900000)
+        self.assertEqual(Kline.objects.filter(symbole=self.SYMBOLE, intervalle="1m").count(), 5)
+        # La Kline 5m du snapshot (peut-être encore ouverte à ce moment) est relue et corrigée
+        self.assertEqual(Kline.objects.get(symbole=self.SYMBOLE, intervalle="5m", timestamp=300000).close_price, 2.0)
+
+    def test_streaming_aggregates_delta(self):
+        # 5 Klines 1m + groupes terminés par le delta : 3m (9-11, 12-14), 5m (10-14) et 15m (0-14)
+        self.assertEqual(self.catch_up(streaming=True), 5 + 4)
+        self.assertEqual(self.appels, [("1m", 600000)])
+        self.assertEqual(Kline.objects.get(symbole=self.SYMBOLE, intervalle="15m").volume, 15.0)
+        kline = Kline.objects.get(symbole=self.SYMBOLE, intervalle="5m")
+        self.assertEqual((kline.timestamp, kline.volume, kline.high_price), (600000, 5.0, 3.0))
+
+
+class WarmStartTest(TestCase):
+    """ Démarrage à chaud entièrement servi par le snapshot : la régulation doit être réactivée. """
+
+    def test_regulation_unlocked_when_every_symbol_is_restored(self):
+        from core.management.commands import binance_ws
+
+        utils.set_initializing(True)
+        self.addCleanup(utils.set_initializing, True)
+        with mock.patch.object(binance_ws, "restore_snapshot", return_value=["WARMUSDT"]), \
+                mock.patch.object(binance_ws, "catch_up_from_snapshot", return_value=["WARMUSDT"]), \
+                mock.patch.object(binance_ws, "load_historical_klines") as load:
+            binance_ws.warm_start({"timestamp": time.time()}, ["WARMUSDT"])
+        load.assert_not_called()
+        self.assertFalse(utils.is_initializing)
+
+
+class IndicatorPlanTest(TestCase):
+    """
+    Plan (indicateur, intervalle) compilé depuis le graphe des tests d'une stratégie : il doit couvrir
+    tout ce que l'évaluation lit, de sorte qu'avec les seuls indicateurs du plan les décisions
+    d'achat et de vente soient celles obtenues en calculant tous les indicateurs.
+    """
+
+    INTERVALLES = ("1m", "3m", "5m", "15m", "1h", "4h", "1d")
+
+    def setUp(self):
+        signal_1h = IndicatorTest.objects.create(name="signal_1h", indicator="macd_signal", interval="1h", operator=">", threshold_value=0)
+        demi_rsi = Calculation.objects.create(name="demi_rsi", expression="rsi / 2")
+        seuil_macd = Calculation.objects.create(name="seuil_macd", expression="bollinger_upper - bollinger_lower + demi_rsi")
+        seuil_macd.sub_calculations.add(demi_rsi)
+
+        ou = CombinedTest.objects.create(name="ou", condition_type="OR")
+        ou.tests.add(IndicatorTest.objects.create(
+            name="stoch_15m", indicator="stoch_rsi", interval="15m", operator=">", threshold_indicator_test=signal_1h,
+        ))
+        achat = CombinedTest.objects.create(name="achat", condition_type="AND")
+        achat.tests.add(IndicatorTest.objects.create(name="rsi_1m", indicator="rsi", interval="1m", operator="<", threshold_value=50))
+        achat.sub_combined_tests.add(ou)
+        vente = CombinedTest.objects.create(name="vente", condition_type="OR")
+        vente.tests.add(IndicatorTest.objects.create(
+            name="macd_5m", indicator="macd", interval="5m", operator=">", threshold_calculation=seuil_macd,
+        ))
+
+        self.strategy = Strategy.objects.create(name="plan", buy_test=achat, sell_test=vente)
+        self.strategy.update_strategy_requirements()
+
+    def test_plan_covers_nested_tests_thresholds_and_calculations(self):
+        attendu = {"15m": ["stoch_rsi"], "1h": ["macd"], "1m": ["rsi"], "5m": ["bollinger", "macd", "rsi"]}
+        self.assertEqual(self.strategy.indicator_plan, attendu)
+        self.assertEqual(sorted(self.strategy.intervals), ["15m", "1h", "1m", "5m"])
+        self.assertTrue(all((self.strategy.use_rsi, self.strategy.use_stoch_rsi, self.strategy.use_macd, self.strategy.use_bollinger)))
+        self.assertEqual(self.strategy.planned_indicators("1h"), ["macd"])
+        self.assertEqual(self.strategy.planned_indicators("4h"), [])
+
+    def test_frozen_migration_compiler_matches(self):
+        migration = importlib.import_module("core.migrations.0009_strategy_indicator_plan")
+        for combined_test in (self.strategy.buy_test, self.strategy.sell_test):
+            plan, plan_migration = {}, {}
+            compile_combined_test(combined_test, plan)
+            migration.compile_combined_test(combined_test, plan_migration)
+            self.assertEqual(to_json(plan), migration.to_json(plan_migration))
+
+    def monnaies(self, rng):
+        """ Monnaie avec tous les indicateurs calculés, et la même limitée aux indicateurs du plan. """
+        complete, planifiee = Monnaie(symbole="PLANUSDT"), Monnaie(symbole="PLANUSDT")
+        for interval in self.INTERVALLES:
+            prevus = self.strategy.planned_indicators(interval)
+            for indicator, champs in INDICATOR_OUTPUTS.items():
+                for champ in champs:
+                    valeur = rng.uniform(-100, 100)
+                    setattr(complete, f"{champ}_{interval}", valeur)
+                    setattr(planifiee, f"{champ}_{interval}", valeur if indicator in prevus else None)
+        return complete, planifiee
+
+    def test_planned_indicators_give_same_decisions(self):
+        rng = random.Random(3)
+        decisions = set()
+        for _ in range(300):
+            complete, planifiee = self.monnaies(rng)
+            for combined_test in (self.strategy.buy_test, self.strategy.sell_test):
+                decision = combined_test.evaluate(complete)
+                self.assertEqual(combined_test.evaluate(planifiee), decision)
+                decisions.add((combined_test.name, decision))
+        self.assertEqual(len(decisions), 4)  # Achat et vente pris chacun dans les deux sens
+
+    def test_sub_calculations_receive_symbol_trade_and_interval(self):
+        monnaie, _ = self.monnaies(random.Random(4))
+        seuil = Calculation.objects.get(name="seuil_macd")
+        attendu = monnaie.bollinger_upper_5m - monnaie.bollinger_lower_5m + monnaie.rsi_5m / 2
+        self.assertAlmostEqual(seuil.evaluate(monnaie, None, "5m"), attendu)
+
+        stop = Calculation.objects.create(name="stop", expression="prix_max * 0.9")
+        sortie = Calculation.objects.create(name="sortie", expression="stop + 1")
+        sortie.sub_calculations.add(stop)
+        trade = mock.Mock(prix_achat=10.0, prix_actuel=11.0, prix_max=12.0)
+        self.assertAlmostEqual(sortie.evaluate(monnaie, trade, "5m"), 11.8)
+
+    def test_indicator_test_passes_its_interval_to_calculation(self):
+        test = IndicatorTest.objects.create(
+            name="macd_signal_5m", indicator="macd", interval="5m", operator=">",
+            threshold_calculation=Calculation.objects.create(name="signal", expression="macd_signal"),
+        )
+        monnaie = Monnaie(symbole="PLANUSDT", macd_5m=2.0, macd_signal_5m=1.0, macd_signal_1m=5.0)
+        self.assertTrue(test.evaluate(monnaie))
+        monnaie.macd_signal_5m = 3.0
+        self.assertFalse(test.evaluate(monnaie))
+
+
+class RecordingTest(SimpleTestCase):
+    """ Enregistrement des trames brutes (binance_ws --record) et relecture par replay. """
+
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+        self.chemin = os.path.join(self.dossier.name, "trames.gz")
+        self.trames = [(1000.0 + i * 0.25, '{"stream":"btcusdt@kline_1m","data":{"i":%d}}' % i) for i in range(50)]
+
+    def enregistrer(self, trames, flush_every=1000):
+        recorder = FrameRecorder(self.chemin, flush_every=flush_every)
+        for i, (timestamp, trame) in enumerate(trames):
+            recorder.write(timestamp, trame.encode() if i % 2 else trame)  # Trames texte ou binaires
+        return recorder
+
+    def test_round_trip(self):
+        recorder = self.enregistrer(self.trames)
+        recorder.close()
+        recorder.close()  # Idempotent (SIGTERM puis atexit)
+        self.assertEqual(list(read_recording(self.chemin)), self.trames)
+
+    def test_appends_across_sessions(self):
+        self.enregistrer(self.trames[:20]).close()
+        self.enregistrer(self.trames[20:]).close()
+        self.assertEqual(list(read_recording(self.chemin)), self.trames)
+
+    def test_truncated_tail_is_ignored(self):
+        self.enregistrer(self.trames).close()
+        with open(self.chemin, "rb") as f:
+            contenu = f.read()
+        with open(self.chemin, "wb") as f:
+            f.write(contenu[:len(contenu) - 30])  # Processus tué : fin du membre gzip manquante
+        relues = list(read_recording(self.chemin))
+        self.assertLess(len(relues), len(self.trames))
+        self.assertEqual(relues, self.trames[:len(relues)])
+
+    def test_replay_requires_explicit_db_writes(self):
+        self.enregistrer(self.trames).close()
+        with self.assertRaisesMessage(CommandError, "--allow-db-writes"):
+            call_command("replay", self.chemin)
+
+
+class MonnaieWriteBehindTest(TestCase):
+    """ Écriture différée des monnaies : valeurs coalescées par symbole, état vidé à l'arrêt. """
+
+    def setUp(self):
+        Monnaie.objects.bulk_create([Monnaie(symbole="WBAUSDT"), Monnaie(symbole="WBBUSDT")])
+        self.writer = MonnaieWriteBehind()
+
+    def test_updates_coalesce_into_one_bulk_update_with_latest_values(self):
+        for prix in (1.0, 2.0, 3.0):
+            self.writer.stage("WBAUSDT", prix_actuel=prix, prix_max=prix * 2)
+        self.writer.stage("WBAUSDT", rsi_1m=55.0)
+        self.writer.stage("WBBUSDT", prix_actuel=7.0)
+        self.writer.stage("WBBUSDT", prix_actuel=8.0, prix_max=9.0, rsi_1m=40.0)
+
+        with mock.patch.object(Monnaie.objects, "bulk_update", wraps=Monnaie.objects.bulk_update) as bulk_update:
+            self.assertEqual(self.writer.flush(), 2)
+        bulk_update.assert_called_once()
+        monnaies, champs = bulk_update.call_args.args
+        self.assertEqual(sorted(champs), ["prix_actuel", "prix_max", "rsi_1m"])
+        self.assertEqual(sorted(m.symbole for m in monnaies), ["WBAUSDT", "WBBUSDT"])
+
+        a, b = Monnaie.objects.get(symbole="WBAUSDT"), Monnaie.objects.get(symbole="WBBUSDT")
+        self.assertEqual((a.prix_actuel, a.prix_max, a.rsi_1m), (3.0, 6.0, 55.0))
+        self.assertEqual((b.prix_actuel, b.prix_max, b.rsi_1m), (8.0, 9.0, 40.0))
+        self.assertEqual(self.writer.flush(), 0)  # Rien de nouveau depuis le dernier flush
+
+    def test_pending_values_applied_to_reads(self):
+        self.writer.stage("WBAUSDT", prix_actuel=5.0)
+        monnaie = self.writer.apply_pending(Monnaie.objects.get(symbole="WBAUSDT"))
+        self.assertEqual(monnaie.prix_actuel, 5.0)
+        self.assertIsNone(Monnaie.objects.get(symbole="WBAUSDT").prix_actuel)
+
+    def test_stop_drains_pending_state(self):
+        self.writer.start(60 * 60 * 1000)  # Aucun flush périodique pendant le test
+        self.assertTrue(self.writer.enabled)
+        self.writer.stage("WBAUSDT", prix_actuel=4.0)
+        self.assertEqual(self.writer.stop(), 1)
+        self.assertFalse(self.writer.enabled)
+        self.assertEqual(Monnaie.objects.get(symbole="WBAUSDT").prix_actuel, 4.0)
+
+
+class KlineFlusherTest(SimpleTestCase):
+    """ Thread d'écriture des Klines : flush sur taille de batch, sur délai, et contre-pression du canal borné. """
+
+    SYMBOLE = "FLUSHTESTUSDT"
+
+    def setUp(self):
+        self.batches = []
+        self.flushed = threading.Event()
+
+    def save_batch(self, klines, monnaies, timestamps):
+        self.batches.append([k.timestamp // 60000 for k in klines])
+        self.flushed.set()
+
+    def flusher(self, **options):
+        flusher = KlineFlusher(options.pop("save_batch", self.save_batch), **options)
+        flusher.start()
+        self.addCleanup(flusher.stop, 5)
+        return flusher
+
+    def put(self, flusher, indices):
+        for i in indices:
+            flusher.put(minute(self.SYMBOLE, i, 1.0), time.time())
+
+    def test_flush_on_batch_size(self):
+        flusher = self.flusher(max_batch=3, max_delay=60)
+        self.put(flusher, range(7))
+        self.assertTrue(flusher.drain(5))  # Le reste (1 Kline) est écrit sans attendre le délai
+        self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual((flusher.nb_flushes, flusher.last_batch_size), (3, 1))
+
+    def test_flush_on_deadline(self):
+        flusher = self.flusher(max_batch=100, max_delay=0.2)
+        debut = time.time()
+        self.put(flusher, range(2))
+        self.assertTrue(self.flushed.wait(5))
+        self.assertGreaterEqual(time.time() - debut, 0.15)
+        self.assertEqual(self.batches, [[0, 1]])
+
+    def test_backpressure_when_channel_is_full(self):
+        libere = threading.Event()
+
+        def save_lent(klines, monnaies, timestamps):
+            libere.wait(5)
+            self.save_batch(klines, monnaies, timestamps)
+
+        flusher = self.flusher(save_batch=save_lent, max_batch=1, max_delay=60, capacity=2)
+        self.put(flusher, [0])
+        time.sleep(0.1)  # Kline 0 en cours d'écriture (bloquée)
+        self.put(flusher, [1, 2])  # Canal plein
+        producteur = threading.Thread(target=self.put, args=(flusher, [3]))
+        producteur.start()
+        producteur.join(0.3)
+        self.assertTrue(producteur.is_alive())  # Bloqué tant que le canal est plein
+        libere.set()
+        producteur.join(5)
+        self.assertFalse(producteur.is_alive())
+        self.assertTrue(flusher.drain(5))
+        self.assertEqual(self.batches, [[0], [1], [2], [3]])
+        self.assertGreater(flusher.blocked_time, 0.2)
+
+    def test_stop_flushes_pending_klines(self):
+        flusher = self.flusher(max_batch=100, max_delay=60)
+        self.put(flusher, range(4))
+        flusher.stop(5)
+        self.assertFalse(flusher.running)
+        self.assertEqual(self.batches, [[0, 1, 2, 3]])
+
+
+class IndicatorHistoryTest(TestCase):
+    """ Historique des indicateurs : upsert idempotent par (symbole, intervalle, timestamp) et lecture des dernières valeurs. """
+
+    SYMBOLE = "HISTOTESTUSDT"
+
+    def add(self, buffer, i, rsi, interval="1m"):
+        buffer.add(self.SYMBOLE, interval, i * 60000, {"rsi": rsi, "macd": rsi / 10})
+
+    def test_flush_upserts_latest_values(self):
+        buffer = IndicatorHistoryBuffer()
+        for i in range(3):
+            self.add(buffer, i, 50.0 + i)
+        self.add(buffer, 1, 99.0)  # Même clé avant flush : la dernière valeur remplace la précédente
+        buffer.add(self.SYMBOLE, "1m", None, {"rsi": 1.0})  # Sans timestamp : ignoré
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.flush(), 0)
+
+        self.add(buffer, 2, 70.0)  # Ré-écriture d'une ligne existante
+        self.add(buffer, 3, 53.0)
+        self.assertEqual(buffer.flush(), 2)
+
+        lignes = Indicator.objects.filter(symbole=self.SYMBOLE).order_by("timestamp")
+        self.assertEqual([(l.timestamp, l.rsi) for l in lignes], [(0, 50.0), (60000, 99.0), (120000, 70.0), (180000, 53.0)])
+        self.assertAlmostEqual(lignes[2].macd, 7.0)
+        self.assertIsNone(lignes[2].bollinger_upper)
+
+    def test_get_latest_indicators_is_chronological(self):
+        buffer = IndicatorHistoryBuffer()
+        for i in range(5):
+            self.add(buffer, i, 40.0 + i)
+        self.add(buffer, 9, 10.0, interval="5m")
+        buffer.flush()
+
+        lignes = get_latest_indicators(self.SYMBOLE, "1m", n=3)
+        self.assertEqual([l["timestamp"] for l in lignes], [120000, 180000, 240000])
+        self.assertEqual([l["rsi"] for l in lignes], [42.0, 43.0, 44.0])
+        self.assertIn("bollinger_lower", lignes[0])
+        self.assertEqual(len(get_latest_indicators(self.SYMBOLE, "5m")), 1)
+        self.assertEqual(get_latest_indicators("INCONNUUSDT", "1m"), [])
+
+
+class UpsertKlinesTest(TestCase):
+    """ Upsert des Klines en une requête : doublons dans un même batch et mise à jour des lignes existantes. """
+
+    SYMBOLE = "UPSERTTESTUSDT"
+
+    def test_duplicate_keys_in_batch_keep_last(self):
+        from core.management.commands import binance_ws
+
+        binance_ws.upsert_klines([minute(self.SYMBOLE, 0, 10.0), minute(self.SYMBOLE, 1, 11.0), minute(self.SYMBOLE, 0, 12.0)])
+        lignes = Kline.objects.filter(symbole=self.SYMBOLE, intervalle="1m").order_by("timestamp")
+        self.assertEqual([(k.timestamp, k.close_price) for k in lignes], [(0, 12.0), (60000, 11.0)])
+
+        binance_ws.upsert_klines([minute(self.SYMBOLE, 1, 13.0, volume=5.0), minute(self.SYMBOLE, 1, 14.0, volume=6.0)])
+        kline = Kline.objects.get(symbole=self.SYMBOLE, intervalle="1m", timestamp=60000)
+        self.assertEqual((kline.close_price, kline.high_price, kline.volume), (14.0, 15.0, 6.0))
+        self.assertEqual(Kline.objects.filter(symbole=self.SYMBOLE).count(), 2)
+
+
+class BulkLoadKlinesTest(TestCase):
+    """ Chargement en masse hors PostgreSQL (bulk_create) : DO NOTHING par défaut, mise à jour avec update=True. """
+
+    SYMBOLE = "BULKTESTUSDT"
+
+    def rows(self, closes, interval="1m"):
+        return [(self.SYMBOLE, interval, i * 60000, c - 0.5, c + 1.0, c - 1.0, c, 1.0) for i, c in enumerate(closes)]
+
+    def closes(self):
+        return list(Kline.objects.filter(symbole=self.SYMBOLE).order_by("timestamp").values_list("close_price", flat=True))
+
+    def test_insert_then_update(self):
+        self.assertEqual(bulk_load_klines(self.rows([10.0, 11.0, 12.0])), 3)
+        self.assertEqual(self.closes(), [10.0, 11.0, 12.0])
+
+        self.assertEqual(bulk_load_klines(self.rows([20.0, 21.0])), 2)  # Conflits ignorés
+        self.assertEqual(self.closes(), [10.0, 11.0, 12.0])
+
+        self.assertEqual(bulk_load_klines(self.rows([20.0, 21.0, 22.0, 23.0]), update=True), 4)
+        self.assertEqual(self.closes(), [20.0, 21.0, 22.0, 23.0])
+        kline = Kline.objects.get(symbole=self.SYMBOLE, timestamp=60000)
+        self.assertEqual((kline.open_price, kline.high_price, kline.low_price), (20.5, 22.0, 20.0))
+
+    def test_duplicate_rows_keep_last(self):
+        rows = self.rows([10.0, 11.0]) + self.rows([30.0])
+        self.assertEqual(bulk_load_klines(rows, update=True), 2)
+        self.assertEqual(self.closes(), [30.0, 11.0])
+        self.assertEqual(bulk_load_klines([]), 0)
+
+
+@skipUnless(archive.archive_available(), "pyarrow n'est pas installé")
+class ArchiveTest(SimpleTestCase):
+    """ Archive Arrow IPC : écriture par mois puis relecture (memory-map), doublons et bornes. """
+
+    SYMBOLE = "ARCHIVETESTUSDT"
+    DEBUT = 1706745600000 - 3 * 3600000  # 31/01/2024 21:00 UTC : les Klines 1h chevauchent deux mois
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        override = override_settings(KLINE_ARCHIVE_DIR=dossier.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def rows(self, n, decalage=0.0):
+        return [
+            [self.DEBUT + i * 3600000, 10.0 + i, 11.0 + i, 9.0 + i, 10.5 + i + decalage, 100.0 + i]
+            for i in range(n)
+        ]
+
+    def test_round_trip(self):
+        self.assertEqual(archive.write_klines(self.SYMBOLE, "1h", self.rows(6)), 6)
+        self.assertEqual(archive.list_months(self.SYMBOLE, "1h"), ["2024-01", "2024-02"])
+
+        lues = archive.read_klines(self.SYMBOLE, "1h")
+        self.assertEqual(lues["timestamp"].tolist(), [r[0] for r in self.rows(6)])
+        self.assertEqual(lues["close"].tolist(), [r[4] for r in self.rows(6)])
+        self.assertEqual(archive.read_last_klines(self.SYMBOLE, "1h", 4).tolist(), self.rows(6)[2:])
+
+        fevrier = archive.read_klines(self.SYMBOLE, "1h", start_ms=1706745600000, end_ms=self.DEBUT + 5 * 3600000)
+        self.assertEqual(fevrier["timestamp"].tolist(), [1706745600000, 1706749200000])
+        self.assertIsNone(archive.read_klines("INCONNUUSDT", "1h"))
+
+    def test_rewrite_merges_and_last_row_wins(self):
+        archive.write_klines(self.SYMBOLE, "1h", self.rows(4))
+        archive.write_klines(self.SYMBOLE, "1h", self.rows(6, decalage=0.25)[2:])  # Recouvre les 2 dernières
+        lues = archive.read_klines(self.SYMBOLE, "1h")
+        self.assertEqual(len(lues["timestamp"]), 6)
+        self.assertEqual(lues["close"].tolist(), [10.5, 11.5] + [r[4] for r in self.rows(6, decalage=0.25)[2:]])
+
+
+class KlineRingBufferTest(SimpleTestCase):
+    """ Buffer circulaire : ordre chronologique après rotation, remplacement et Klines en retard. """
+
+    def append(self, buffer, indices):
+        for i in indices:
+            buffer.append(i * 60000, i, i + 1.0, i - 1.0, i + 0.5, 1.0)
+
+    def test_to_array_after_wrap_around(self):
+        buffer = KlineRingBuffer(5)
+        self.append(buffer, range(13))  # 2 tours et demi : head au milieu du tableau
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.to_array()[:, 0].tolist(), [i * 60000 for i in range(8, 13)])
+        self.assertEqual(buffer.to_array(limit=3)[:, 0].tolist(), [i * 60000 for i in range(10, 13)])
+        self.assertEqual(buffer.column(CLOSE, 2).tolist(), [11.5, 12.5])
+
+        buffer.to_array()[0, 0] = -1  # Copie : le buffer n'est pas modifié
+        self.assertEqual(buffer.to_array()[0, 0], 8 * 60000)
+
+    def test_last_timestamp_after_wrap_around(self):
+        store = KlineStore(capacity=4)
+        for i in range(10):
+            store.append("RINGTESTUSDT", "1m", i * 60000, i, i + 1.0, i - 1.0, i + 0.5, 1.0)
+        self.assertEqual(store.get_last_timestamp("RINGTESTUSDT"), 9 * 60000)
+        self.assertEqual(store.get_last_close("RINGTESTUSDT"), 9.5)
+
+        store.append("RINGTESTUSDT", "1m", 9 * 60000, 9, 20.0, 8.0, 19.0, 2.0)  # Même timestamp : remplace
+        store.append("RINGTESTUSDT", "1m", 5 * 60000, 5, 6.0, 4.0, 5.5, 1.0)  # Plus ancienne : ignorée
+        self.assertEqual(store.get_last_close("RINGTESTUSDT"), 19.0)
+        self.assertEqual(store.get_buffer("RINGTESTUSDT", "1m").to_array()[:, 0].tolist(), [i * 60000 for i in range(6, 10)])
+        self.assertIsNone(store.get_last_timestamp("INCONNUUSDT"))
+
+
+class ShardedKlinePoolTest(SimpleTestCase):
+    """ Pool shardé : un symbole est toujours traité par le même shard, dans l'ordre, et stop() draine les files. """
+
+    SYMBOLES = [f"SHARD{i}USDT" for i in range(12)]
+
+    def test_symbol_affinity_and_ordered_drain(self):
+        traites = []
+        lock = threading.Lock()
+
+        def handler(item, shard):
+            time.sleep(0.001)  # Les files sont encore pleines quand stop() est appelé
+            with lock:
+                traites.append((item["symbole"], item["kline"].timestamp // 60000, shard.index, threading.current_thread().name))
+
+        pool = ShardedKlinePool(3, handler)
+        pool.start()
+        for i in range(20):
+            for symbole in self.SYMBOLES:
+                pool.put({"symbole": symbole, "kline": minute(symbole, i, 1.0)})
+        pool.stop(timeout=10)
+
+        self.assertTrue(all(not shard.thread.is_alive() for shard in pool.shards))
+        self.assertEqual(len(traites), 20 * len(self.SYMBOLES))  # Rien n'est perdu à l'arrêt
+        self.assertEqual(pool.qsize(), 0)
+        for symbole in self.SYMBOLES:
+            lignes = [t for t in traites if t[0] == symbole]
+            index = shard_index(symbole, 3)
+            self.assertIs(pool.shard_for(symbole), pool.shards[index])
+            self.assertEqual({(t[2], t[3]) for t in lignes}, {(index, f"kline-shard-{index}")})
+            self.assertEqual([t[1] for t in lignes], list(range(20)))
+        self.assertGreater(len({t[2] for t in traites}), 1)
+
+
+class DecodeKlineMessageTest(SimpleTestCase):
+    """ Décodage des messages du flux combiné : filtrage des monnaies avant parsing, Kline ouverte/clôturée, JSON invalide. """
+
+    def message(self, symbole="BTCUSDT", closed=True, close="42.5"):
+        return json.dumps({
+            "stream": f"{symbole.lower()}@kline_1m",
+            "data": {
+                "e": "kline", "E": 1700000059999, "s": symbole,
+                "k": {"t": 1700000000000, "T": 1700000059999, "s": symbole, "i": "1m",
+                      "o": "40.0", "h": "43.0", "l": "39.5", "c": close, "v": "12.25", "x": closed},
+            },
+        }, separators=(",", ":"))
+
+    def test_closed_and_open_klines(self):
+        tick = decode_kline_message(self.message(), {"BTCUSDT": True})
+        self.assertEqual(
+            (tick.symbole, tick.intervalle, tick.timestamp, tick.open_price, tick.high_price, tick.low_price, tick.close_price, tick.volume),
+            ("BTCUSDT", "1m", 1700000000000, 40.0, 43.0, 39.5, 42.5, 12.25),
+        )
+        self.assertTrue(tick.is_closed)
+        ouverte = decode_kline_message(self.message(closed=False, close="41").encode())  # bytes acceptés
+        self.assertFalse(ouverte.is_closed)
+        self.assertEqual(ouverte.close_price, 41.0)
+
+    def test_foreign_or_inactive_symbol_is_ignored(self):
+        self.assertEqual(extract_symbol(self.message("ETHUSDT")), "ETHUSDT")
+        self.assertIsNone(decode_kline_message(self.message("ETHUSDT"), {"BTCUSDT": True}))
+        self.assertIsNone(decode_kline_message(self.message(), {"BTCUSDT": False}))
+        self.assertIsNone(decode_kline_message('{"result":null,"id":1}', {"BTCUSDT": True}))  # Réponse au SUBSCRIBE
+        self.assertIsNone(decode_kline_message('{"result":null,"id":1}'))
+
+    def test_invalid_json(self):
+        # Ignoré avant parsing si la monnaie n'est pas suivie ; sinon l'erreur remonte à on_message
+        self.assertIsNone(decode_kline_message('{"data":{"s":"ETHUSDT",', {"BTCUSDT": True}))
+        with self.assertRaises(ValueError):
+            decode_kline_message('{"data":{"s":"BTCUSDT",', {"BTCUSDT": True})
+        with self.assertRaises(ValueError):
+            decode_kline_message("pas du json")
+
+
+class MonnaieLiveProxyTest(SimpleTestCase):
+    """ Adaptateur Monnaie : indicateurs lus dans le store temps réel, tout le reste délégué à la Monnaie. """
+
+    def setUp(self):
+        self.monnaie = Monnaie(symbole="PROXYTESTUSDT", prix_actuel=12.5, rsi_1m=30.0, macd_5m=0.5, rsi_4h=55.0)
+        self.store = LiveIndicatorStore()
+        self.store.update("PROXYTESTUSDT", "1m", {"rsi": 71.0, "stoch_rsi": 88.0})
+        self.proxy = MonnaieLiveProxy(self.monnaie, self.store)
+
+    def test_live_values_are_preferred(self):
+        self.assertEqual(self.proxy.rsi_1m, 71.0)
+        self.assertEqual(self.proxy.stoch_rsi_1m, 88.0)
+        self.assertIsNone(self.proxy.macd_1m)  # Intervalle présent dans le store : pas de repli sur la Monnaie
+        self.assertEqual(getattr(self.proxy, "rsi_1m"), 71.0)  # Contrat de IndicatorTest / Calculation
+
+    def test_fallthrough_to_model(self):
+        self.assertEqual(self.proxy.macd_5m, 0.5)  # Intervalle absent du store
+        self.assertEqual(self.proxy.rsi_4h, 55.0)
+        self.assertEqual(self.proxy.prix_actuel, 12.5)
+        self.assertEqual(self.proxy.symbole, "PROXYTESTUSDT")
+        self.assertEqual(self.proxy.pk, "PROXYTESTUSDT")
+        self.assertEqual(str(self.proxy), str(self.monnaie))
+        with self.assertRaises(AttributeError):
+            self.proxy.champ_inexistant
+
+        self.proxy.prix_actuel = 13.0  # Écritures déléguées à la Monnaie
+        self.assertEqual(self.monnaie.prix_actuel, 13.0)
+
+    def test_field_split_and_disabled_store(self):
+        self.assertEqual(split_indicator_field("bollinger_upper_1h"), ("bollinger_upper", "1h"))
+        self.assertEqual(split_indicator_field("stoch_rsi_1d"), ("stoch_rsi", "1d"))
+        self.assertIsNone(split_indicator_field("prix_actuel"))
+        self.assertIsNone(split_indicator_field("rsi_2m"))
+        self.assertIs(live_monnaie(self.monnaie), self.monnaie)  # Store temps réel non démarré
+
+
+@override_settings(KLINE_RETENTION_DAYS={"1m": 1, "5m": 10, "1d": None})
+class PruneKlinesTest(TestCase):
+    """ Purge par rétention : seules les Klines antérieures à la limite de leur intervalle sont supprimées, par lots. """
+
+    SYMBOLE = "PRUNETESTUSDT"
+
+    def setUp(self):
+        maintenant = int(time.time() * 1000)
+        jour = 86400000
+        self.ages = {
+            "1m": [2 * jour + i * 60000 for i in range(25)] + [jour - 3600000 + i * 60000 for i in range(5)],
+            "5m": [20 * jour, 10 * jour + 3600000, 9 * jour, jour],
+            "1d": [1000 * jour, 10 * jour],
+        }
+        bulk_load_klines([
+            (self.SYMBOLE, interval, maintenant - age, 1.0, 1.0, 1.0, 1.0, 1.0)
+            for interval, ages in self.ages.items() for age in ages
+        ])
+
+    def counts(self):
+        return {interval: Kline.objects.filter(symbole=self.SYMBOLE, intervalle=interval).count() for interval in self.ages}
+
+    def test_prune_by_interval_in_batches(self):
+        with CaptureQueriesContext(connection) as requetes:
+            call_command("prune_klines", batch_size=7, stdout=StringIO())
+        self.assertEqual(self.counts(), {"1m": 5, "5m": 2, "1d": 2})
+        suppressions = [q["sql"] for q in requetes.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(suppressions), 4 + 1)  # 25 Klines 1m par lots de 7, 2 Klines 5m en un lot
+
+        restantes = Kline.objects.filter(symbole=self.SYMBOLE, intervalle="1m").values_list("timestamp", flat=True)
+        limite = int(time.time() * 1000) - 86400000
+        self.assertTrue(all(ts >= limite for ts in restantes))
+
+    def test_dry_run_and_batch_size_validation(self):
+        sortie = StringIO()
+        call_command("prune_klines", dry_run=True, stdout=sortie)
+        self.assertEqual(self.counts(), {"1m": 30, "5m": 4, "1d": 2})
+        self.assertIn("1m : 25 Klines", sortie.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("prune_klines", batch_size=0, stdout=StringIO())
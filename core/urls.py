@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from core.views import MonnaieViewSet, dashboard, get_monnaies, get_dashboard_data, monnaie_detail
+from core.views import MonnaieViewSet, dashboard, get_monnaies, get_dashboard_data, monnaie_detail, get_indicator_history
 from . import views
 
 router = DefaultRouter()
@@ -14,5 +14,6 @@ urlpatterns = [
     path('stats/', views.stats_view, name='stats_view'),
     path('stats_partial/', views.stats_partial, name='stats_partial'),
     path('monnaie/<str:symbole>/', monnaie_detail, name='monnaie_detail'),
+    path('api/indicateurs/<str:symbole>/<str:interval>/', get_indicator_history, name='api_indicateurs'),
 
 ]
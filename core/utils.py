@@ -9,10 +9,19 @@ import operator
 import decimal
 from django.utils.timezone import now
 from django.db import transaction
-import talib
 from django.conf import settings
 from collections import deque
 import random
+from core.kline_store import kline_store
+from core.indicators import closed_bar_cache, get_indicator_state
+from core.write_behind import monnaie_writer
+from core.indicator_history import indicator_history
+from core.live_state import live_indicators, live_monnaie
+from core.batch_indicators import compute_indicators_batch
+from core.indicator_backends import get_backend, select_indicators
+from core.bulk_loader import bulk_load_klines, binance_klines_to_rows
+from core.archive import read_last_klines
+from core.aggregator import INTERVAL_MS
 
 regul_max_atteint = False
 processing_times = deque(maxlen=100)
@@ -88,9 +97,10 @@ def get_all_usdt_pairs():
         print(f"❌ Erreur lors de la récupération des paires Binance: {response.status_code}")
         return []
 
-def get_historical_klines(symbol, interval, limit=None):
+def get_historical_klines(symbol, interval, limit=None, start_time=None):
     """
     Récupère l'historique des Klines depuis Binance avec gestion des erreurs.
+    Si `start_time` (ms) est fourni, les Klines sont renvoyées à partir de cette date.
     """
     api_key, secret_key = get_binance_credentials()
     if not api_key or not secret_key:
@@ -103,6 +113,8 @@ def get_historical_klines(symbol, interval, limit=None):
 
     headers = {"X-MBX-APIKEY": api_key}
     params = {"symbol": symbol, "interval": interval, "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
     
     for _ in range(3):  # 🔄 Retry 3 fois en cas d'erreur
         try:
@@ -122,6 +134,11 @@ def get_historical_klines(symbol, interval, limit=None):
     print(f"❌ Impossible de récupérer les Klines après 3 tentatives ({symbol}, {interval}).")
     return []
 
+def set_initializing(valeur):
+    """ Verrou de la régulation : aucune monnaie n'est ajoutée tant que l'initialisation n'est pas terminée. """
+    global is_initializing
+    is_initializing = valeur
+
 def load_historical_klines(symbols=None):
     """
     Charge l'historique des Klines pour toutes les paires USDT et tous les intervalles nécessaires.
@@ -132,7 +149,7 @@ def load_historical_klines(symbols=None):
     
     if symbols is None:
         symbols = get_all_usdt_pairs()
-    else:
+    elif isinstance(symbols, str):
         symbols = [symbols]
     
     intervals = ["1m", "3m", "5m", "15m", "1h", "4h", "1d"]
@@ -147,12 +164,28 @@ def load_historical_klines(symbols=None):
         print(f"🔄 Chargement des Klines pour {symbol} (intervalles: {intervals})...")
 
         if not regul_max_atteint:
+            rows = []
             for interval in intervals:
-                klines = get_historical_klines(symbol, interval)
+                archive = read_last_klines(symbol, interval, kline_store.capacity)
+                klines = get_historical_klines_delta(symbol, interval, archive)
                 if klines:
-                    save_klines_to_db(symbol, interval, klines)
-                    #for interval in INTERVALS:
-                    #    calculate_indicators(symbol, interval)
+                    rows.extend(binance_klines_to_rows(symbol, interval, klines))
+                # L'archive n'est conservée que si le REST la prolonge : après un rechargement complet (trou trop
+                # grand), le buffer contiendrait sinon un saut dans le temps lu par les indicateurs et l'agrégateur
+                prolonge_archive = (
+                    archive is not None and len(archive) > 0 and bool(klines)
+                    and int(klines[0][0]) <= int(archive[-1][0]) + INTERVAL_MS[interval]
+                )
+                if prolonge_archive:
+                    # Archive locale + delta REST (le delta remplace la dernière Kline archivée si même timestamp)
+                    kline_store.load(symbol, interval, archive.tolist())
+                    kline_store.get_buffer(symbol, interval).extend(
+                        (k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in klines
+                    )
+                elif klines:
+                    kline_store.load_binance_klines(symbol, interval, klines)
+            # Un seul chargement (COPY + INSERT ... ON CONFLICT) pour tous les intervalles de la monnaie
+            bulk_load_klines(rows)
             
             set_loaded_symbol(symbol, True)
             Monnaie.objects.filter(symbole=symbol).update(init=True)
@@ -166,31 +199,32 @@ def load_historical_klines(symbols=None):
     is_initializing = False
     print("🔓 Régulation activée : les nouvelles monnaies peuvent être ajoutées.")    
 
+def get_historical_klines_delta(symbol, interval, archive=None):
+    """
+    Ne récupère via l'API REST que les Klines postérieures à l'archive locale (core/archive.py).
+    Sans archive, ou si le trou dépasse NB_KLINES_HISTORIQUE Klines, chargement REST classique.
+    """
+    if archive is None or not len(archive):
+        return get_historical_klines(symbol, interval)
+    limit = getattr(settings, "NB_KLINES_HISTORIQUE", 100)
+    start_time = int(archive[-1][0])  # La dernière Kline archivée peut être incomplète : elle est relue
+    if time.time() * 1000 - start_time > limit * INTERVAL_MS[interval]:
+        return get_historical_klines(symbol, interval)
+    return get_historical_klines(symbol, interval, start_time=start_time)
+
 def save_klines_to_db(symbol, interval, klines):
     """
-    Enregistre les Klines récupérées en base de données.
+    Enregistre les Klines récupérées en base de données (COPY sous PostgreSQL, voir core.bulk_loader).
     """
-    from core.models import Kline
-    klines_to_insert = [
-        Kline(
-            symbole=symbol,
-            intervalle=interval,
-            timestamp=k[0],
-            open_price=float(k[1]),
-            high_price=float(k[2]),
-            low_price=float(k[3]),
-            close_price=float(k[4]),
-            volume=float(k[5])
-        ) for k in klines
-    ]
-
-    Kline.objects.bulk_create(klines_to_insert, ignore_conflicts=True)
-    #print(f"✅ {len(klines_to_insert)} Klines enregistrées pour {symbol} ({interval})")
-
-def aggregate_higher_timeframe_klines(symbole, kline_1m):
+    bulk_load_klines(binance_klines_to_rows(symbol, interval, klines))
+    #print(f"✅ {len(klines)} Klines enregistrées pour {symbol} ({interval})")
+
+def aggregate_higher_timeframe_klines(symbole, kline_1m, compute_indicators=True):
     """
     Agrège les Klines 1m en intervalles supérieurs.
     Utilise des niveaux intermédiaires pour limiter le nombre de calculs directs depuis 1m.
+    Avec `compute_indicators=False`, les indicateurs ne sont pas recalculés : la fonction renvoie
+    les intervalles concernés (calcul groupé par calculate_indicators_batch).
     """
     from core.models import Kline, Monnaie
     import datetime
@@ -198,9 +232,10 @@ def aggregate_higher_timeframe_klines(symbole, kline_1m):
 
     if not monnaie.strategy:
         print(f"⚠️ [DEBUG] {symbole} ignoré (pas de stratégie définie).")
-        return
+        return []
 
     required_intervals = set(monnaie.strategy.intervals)
+    intervalles_a_calculer = []
 
     INTERVAL_MAPPING = {
         "3m": {"base": "1m", "factor": 3},  # 3x 1m
@@ -245,11 +280,17 @@ def aggregate_higher_timeframe_klines(symbole, kline_1m):
                     },
                 )
 
+                kline_store.append_kline(kline)
+
                 if created:
                     print(f"✅ [DEBUG] Kline {interval} créée pour {symbole} à {datetime.datetime.fromtimestamp(timestamp_group / 1000)}")
-            calculate_indicators(symbole, interval)
+            if compute_indicators:
+                calculate_indicators(symbole, interval)
+            else:
+                intervalles_a_calculer.append(interval)
         #else:
         #    print(f"⚠️ [DEBUG] Aggrégat de {symbole} ignoré pour l'interval {interval}")
+    return intervalles_a_calculer
 
 
 
@@ -262,12 +303,12 @@ def calculate_indicators_with_live(symbol, interval, live_close_price):
     monnaie = Monnaie.objects.get(symbole=symbol)
 
     # Récupère les 13 dernières Klines clôturées
-    klines = Kline.objects.filter(symbole=symbol, intervalle=interval).order_by('-timestamp')[:13]
+    closes = get_closes(symbol, interval, 13)
 
-    if len(klines) < 13:
+    if len(closes) < 13:
         return  # Pas assez de Klines pour calculer
 
-    closes = [float(k.close_price) for k in klines][::-1]
+    closes = closes.tolist()
 
     # Ajoute la valeur de la Kline non clôturée en cours
     closes.append(live_close_price)
@@ -283,13 +324,12 @@ def calculate_indicators_with_live(symbol, interval, live_close_price):
 
 
 def calculate_stoch_rsi_with_current(symbol, interval, current_price=None, rsi_length=14, stoch_length=14, smooth_k=3):
-    from core.models import Kline
-    klines = list(Kline.objects.filter(symbole=symbol, intervalle=interval).order_by("-timestamp")[:rsi_length + stoch_length + smooth_k])
+    closes = get_closes(symbol, interval, rsi_length + stoch_length + smooth_k)
 
-    if len(klines) < (rsi_length + stoch_length + smooth_k):
+    if len(closes) < (rsi_length + stoch_length + smooth_k):
         return None
 
-    closes = [float(k.close_price) for k in reversed(klines)]
+    closes = closes.tolist()
 
     # Remplacement de la dernière valeur si current_price est fourni
     if current_price is not None:
@@ -325,6 +365,15 @@ def calculate_stoch_rsi_with_current(symbol, interval, current_price=None, rsi_l
 
 from django.db.models import Max
 
+def get_closes(symbole, interval, limit=100):
+    """
+    Renvoie les derniers prix de clôture (ordre chronologique) depuis le stockage en mémoire.
+    Le buffer n'est rechargé depuis la base que s'il est vide (ex: monnaie chargée par un autre processus).
+    """
+    if not kline_store.has(symbole, interval):
+        kline_store.load_from_db(symbole, interval)
+    return kline_store.get_closes(symbole, interval, limit)
+
 def calculate_indicators(symbole, interval, kline=None, is_closed=False):
     """
     Calcule les indicateurs techniques pour une monnaie sur un intervalle donné,
@@ -332,7 +381,7 @@ def calculate_indicators(symbole, interval, kline=None, is_closed=False):
     """
     from core.models import Kline, Monnaie
     #monnaie = get_loaded_symbols().get(symbole)
-    monnaie = Monnaie.objects.get(symbole=symbole)
+    monnaie = Monnaie.objects.select_related("strategy").get(symbole=symbole)
     #if not isinstance(monnaie, Monnaie):  # Vérifie que c'est bien un objet Monnaie
     #    print(f"⚠️ [WARNING] {symbole} est invalide ou non chargé correctement.")
     #    return
@@ -345,88 +394,130 @@ def calculate_indicators(symbole, interval, kline=None, is_closed=False):
         #print(f"⚠️ [DEBUG] {symbole} {interval} ignoré (non utilisé par la stratégie).")
         return
 
-    # Récupération des 14 dernières Klines (ou plus selon tes besoins pour MACD et Bollinger)
-    klines_qs = Kline.objects.filter(symbole=symbole, intervalle=interval).order_by('-timestamp')[:100]
-    klines = list(klines_qs)
-
-    # Ajout de la Kline en cours si fournie (pour le calcul temps réel)
-    if kline:
-        klines.append(kline)
-                    
-    # Inversion dans le bon sens chronologique
-    klines.reverse()
-
-    # Vérification pour éviter les calculs inutiles
-    if len(klines) < 14:
+    # Indicateurs du plan de la stratégie pour cet intervalle
+    indicateurs_prevus = monnaie.strategy.planned_indicators(interval)
+    if not indicateurs_prevus:
         return
 
-    closes = [k.close_price for k in klines]
+    # Noyau choisi par la stratégie ; à défaut, moteur incrémental si STREAMING_INDICATORS
+    backend = monnaie.strategy.indicator_backend or ("incremental" if getattr(settings, "STREAMING_INDICATORS", False) else "reference")
 
-    # Calcul des indicateurs
-    if monnaie.strategy.use_rsi:
-        rsi_value = calculate_rsi(closes)
-    else:
-        rsi_value = None
-    
-    if monnaie.strategy.use_stoch_rsi:
-        stoch_rsi_value = calculate_stoch_rsi(closes)
-    else:
-        stoch_rsi_value = None    
-    
-    if monnaie.strategy.use_macd:
-        macd_value, macd_signal = calculate_macd(closes)
+    if backend == "incremental":
+        # Moteur incrémental : état reconstruit une fois par Kline clôturée (fenêtre de 100), tick en cours évalué en O(1)
+        if not kline_store.has(symbole, interval):
+            kline_store.load_from_db(symbole, interval)
+        state = get_indicator_state(symbole, interval)
+        if state.count + (1 if kline else 0) < 14:
+            return
+        indicateurs = select_indicators(state.peek(kline.close_price) if kline else state.current(), indicateurs_prevus)
+    elif kline and not is_closed and backend in ("reference", "numpy") and getattr(settings, "INDICATOR_LIVE_CACHE", True):
+        # Fenêtre des 100 Klines clôturées mise en cache jusqu'à la prochaine clôture :
+        # le tick en cours ne recalcule que le dernier pas (mêmes valeurs que la référence)
+        if not kline_store.has(symbole, interval):
+            kline_store.load_from_db(symbole, interval)
+        state = closed_bar_cache.get(symbole, interval)
+        if state is None or state.count + 1 < 14:
+            return
+        indicateurs = select_indicators(state.peek(kline.close_price), indicateurs_prevus)
     else:
-        macd_value, macd_signal = None, None      
-        
+        # Récupération des 100 dernières Klines clôturées (ordre chronologique) depuis la mémoire
+        closes = get_closes(symbole, interval, 100).tolist()
 
-    if monnaie.strategy.use_bollinger:
-        bollinger_upper, bollinger_middle, bollinger_lower = calculate_bollinger_bands(closes)
-    else:
-        bollinger_upper, bollinger_middle, bollinger_lower = None, None, None
-    
-    
+        # Ajout de la Kline en cours si fournie (pour le calcul temps réel)
+        if kline:
+            closes.append(kline.close_price)
+
+        # Vérification pour éviter les calculs inutiles
+        if len(closes) < 14:
+            return
+
+        # Calcul des seuls indicateurs prévus par le plan de la stratégie
+        indicateurs = get_backend(backend).compute(closes, indicateurs_prevus)
 
     #rsi_value = calculate_rsi(closes)
     #stoch_rsi_value = calculate_stoch_rsi(closes)
     #macd_value, macd_signal = calculate_macd(closes)
     #bollinger_upper, bollinger_middle, bollinger_lower = calculate_bollinger_bands(closes)
-
-    indicateurs = {
-        'rsi': rsi_value,
-        'stoch_rsi': stoch_rsi_value,
-        'macd': macd_value,
-        'macd_signal': macd_signal,
-        'bollinger_upper': bollinger_upper,
-        'bollinger_middle': bollinger_middle,
-        'bollinger_lower': bollinger_lower
-    }
     
+    if kline is None or is_closed:
+        # Valeurs de la dernière Kline clôturée : historisées dans Indicator au prochain flush des Klines
+        indicator_history.add(symbole, interval, kline.timestamp if kline else kline_store.get_last_timestamp(symbole, interval), indicateurs)
+
+    if publish_indicators(symbole, interval, indicateurs):
+        return
+
     # Mise à jour des indicateurs en mémoire sur l'objet Monnaie
     monnaie = Monnaie.objects.get(symbole=symbole)
-    setattr(monnaie, f"rsi_{interval}", rsi_value)
-    setattr(monnaie, f"stoch_rsi_{interval}", stoch_rsi_value)
-    setattr(monnaie, f"macd_{interval}", macd_value)
-    setattr(monnaie, f"macd_signal_{interval}", macd_signal)
-    setattr(monnaie, f"bollinger_middle_{interval}", bollinger_middle)
-    setattr(monnaie, f"bollinger_upper_{interval}", bollinger_upper)
-    setattr(monnaie, f"bollinger_lower_{interval}", bollinger_lower)
+    for name, value in indicateurs.items():
+        setattr(monnaie, f"{name}_{interval}", value)
 
     monnaie.save()
     
     
+def publish_indicators(symbole, interval, indicateurs):
+    """
+    Transmet les indicateurs calculés au store temps réel ou à l'écriture différée.
+    Renvoie False si aucun des deux n'est actif (l'appelant écrit alors directement dans Monnaie).
+    """
+    if live_indicators.enabled:
+        # Store temps réel étroit (core/live_state.py) : la ligne Monnaie n'est plus réécrite
+        live_indicators.update(symbole, interval, indicateurs)
+        return True
+
+    if monnaie_writer.enabled:
+        # Écriture différée : un bulk_update groupé toutes les N ms au lieu d'un save() par intervalle
+        monnaie_writer.stage(symbole, **{f"{name}_{interval}": value for name, value in indicateurs.items()})
+        return True
+    return False
+
+def calculate_indicators_batch(paires):
+    """
+    Calcule les indicateurs des Klines clôturées de plusieurs (symbole, intervalle) en une passe
+    vectorisée par intervalle (core/batch_indicators.py), puis écrit les résultats en bloc.
+    Mêmes valeurs que calculate_indicators sans Kline en cours.
+    """
+    from core.models import Monnaie
+    from collections import defaultdict
+
+    monnaies = {
+        monnaie.symbole: monnaie
+        for monnaie in Monnaie.objects.select_related("strategy").filter(
+            symbole__in={symbole for symbole, _ in paires}, strategy__isnull=False
+        )
+    }
+
+    # Séries de même longueur empilées ensemble : (intervalle, longueur) -> [(symbole, clôtures)]
+    groupes = defaultdict(list)
+    for symbole, interval in paires:
+        monnaie = monnaies.get(symbole)
+        if monnaie is None or interval not in monnaie.strategy.intervals:
+            continue
+        closes = get_closes(symbole, interval, 100)
+        if len(closes) >= 14:
+            groupes[(interval, len(closes))].append((symbole, closes))
+
+    champs_a_sauver = set()
+    a_sauver = {}
+    for (interval, _), lignes in groupes.items():
+        resultats, a_recalculer = compute_indicators_batch(np.vstack([closes for _, closes in lignes]))
+        for (symbole, closes), indicateurs, recalcul in zip(lignes, resultats, a_recalculer):
+            if recalcul:
+                # RSI indéfini au milieu de la série (prix plat) : fonction de référence pour le StochRSI
+                indicateurs['stoch_rsi'] = calculate_stoch_rsi(closes.tolist())
+            indicateurs = select_indicators(indicateurs, monnaies[symbole].strategy.planned_indicators(interval))
+
+            indicator_history.add(symbole, interval, kline_store.get_last_timestamp(symbole, interval), indicateurs)
+            if not publish_indicators(symbole, interval, indicateurs):
+                monnaie = monnaies[symbole]
+                for name, value in indicateurs.items():
+                    setattr(monnaie, f"{name}_{interval}", value)
+                    champs_a_sauver.add(f"{name}_{interval}")
+                a_sauver[symbole] = monnaie
+
+    if a_sauver:
+        # Un seul bulk_update pour toutes les monnaies au lieu d'un save() par (monnaie, intervalle)
+        Monnaie.objects.bulk_update(list(a_sauver.values()), sorted(champs_a_sauver), batch_size=500)
 
-    ## Si la Kline est clôturée, on sauvegarde les indicateurs en base
-    #if is_closed:
-    #    # Prendre le timestamp de la dernière Kline (clôturée)
-    #    last_timestamp = klines[-1].timestamp
-#
-    #    # Met à jour ou crée une nouvelle entrée en base pour les indicateurs clôturés
-    #    Indicator.objects.update_or_create(
-    #        symbole=symbole,
-    #        intervalle=interval,
-    #        timestamp=last_timestamp,
-    #        defaults=indicateurs
-    #    )
 import pandas as pd
 import numpy as np
 
@@ -576,13 +667,14 @@ def acheter(symbole):
         return
 
     # 🔍 Récupérer le dernier prix de la monnaie
-    last_kline = Kline.objects.filter(symbole=symbole, intervalle="1m").order_by("-timestamp").first()
-    if not last_kline or not last_kline.close_price:
+    last_price = kline_store.get_last_close(symbole, "1m")
+    if last_price is None:
+        last_kline = Kline.objects.filter(symbole=symbole, intervalle="1m").order_by("-timestamp").first()
+        last_price = last_kline.close_price if last_kline else None
+    if not last_price:
         print(f"⚠️ Pas de prix disponible pour {symbole}, achat annulé.")
         return
 
-    last_price = last_kline.close_price
-
     # 🔄 Déterminer le montant à investir
     montant_investissement = MONTANT_INVESTISSEMENT_FIXE  # Peut être dynamique
 
@@ -619,7 +711,9 @@ def execute_strategies(symbole):
     """
     from core.models import Monnaie
     
-    monnaie = Monnaie.objects.filter(symbole=symbole).first()
+    # Valeurs encore en attente d'écriture différée appliquées sur l'instance lue en base
+    # Indicateurs lus dans le store temps réel via l'adaptateur si celui-ci est actif
+    monnaie = live_monnaie(monnaie_writer.apply_pending(Monnaie.objects.filter(symbole=symbole).first()))
     
     if not monnaie:
         print(f"❌ Monnaie {symbole} introuvable.")
@@ -653,7 +747,7 @@ def execute_sell_strategy(symbole=None):
         open_trades = TradeLog.objects.filter(status="open")
 
     for trade in open_trades:
-        monnaie = trade.symbole
+        monnaie = live_monnaie(monnaie_writer.apply_pending(trade.symbole))
         if monnaie.strategy:
             print(f"indicateur avant evaluation : stoch_rsi_1m :{monnaie.stoch_rsi_1m} | stoch_rsi_3m :{monnaie.stoch_rsi_3m} | stoch_rsi_5m :{monnaie.stoch_rsi_5m}")
             result = monnaie.strategy.evaluate_sell(symbole=monnaie, trade=trade)
@@ -680,10 +774,14 @@ def execute_sell_strategy(symbole=None):
 
 def get_latest_price(symbole):
     """
-    Récupère le dernier prix connu de la monnaie à partir des Klines en base.
+    Récupère le dernier prix connu de la monnaie à partir des Klines en mémoire (ou en base à défaut).
     """
     from core.models import Kline
 
+    dernier_prix = kline_store.get_last_close(symbole, "1m")
+    if dernier_prix is not None:
+        return decimal.Decimal(dernier_prix)
+
     dernier_kline = Kline.objects.filter(symbole=symbole, intervalle="1m").order_by("-timestamp").first()
     
     if dernier_kline:
@@ -712,7 +810,7 @@ def update_trade_prices(symbole=None):
     
     for trade in trades:
         
-        monnaie = trade.symbole  # Symbole est une FK vers Monnaie
+        monnaie = monnaie_writer.apply_pending(trade.symbole)  # Symbole est une FK vers Monnaie
         
         # Utilise le prix_actuel de Monnaie au lieu de la dernière Kline
         prix_actuel = monnaie.prix_actuel
@@ -770,6 +868,7 @@ class TradingRegulator:
         self.start_time_max = time.time()
         self.start_time_critique = time.time()
         self.monnaies_actives = set()
+        self.univers = None  # Monnaies gérées par ce processus (None = toutes)
 
     def verifier_regulation(self):
         """ Vérifie si on doit ajuster le nombre de monnaies actives """
@@ -815,7 +914,10 @@ class TradingRegulator:
         global regul_max_atteint
         regul_max_atteint= False
 
-        monnaies_disponibles = Monnaie.objects.filter(init=False).exclude(symbole__in=self.monnaies_actives).order_by("-win_rate", "-total_profit").values_list("symbole", flat=True)
+        monnaies_disponibles = Monnaie.objects.filter(init=False).exclude(symbole__in=self.monnaies_actives)
+        if self.univers is not None:
+            monnaies_disponibles = monnaies_disponibles.filter(symbole__in=self.univers)
+        monnaies_disponibles = monnaies_disponibles.order_by("-win_rate", "-total_profit").values_list("symbole", flat=True)
 
         if monnaies_disponibles.exists():
             nouvelle_monnaie = monnaies_disponibles.first()
@@ -73,13 +73,23 @@ def get_monnaies(request):
 
 from django.http import JsonResponse
 from core.models import Monnaie, Kline, Indicator
+from core.live_state import LiveIndicatorStore, MonnaieLiveProxy
+from django.conf import settings
 
 def get_dashboard_data(request):
     monnaies_data = []
 
     monnaies = Monnaie.objects.prefetch_related('trades').all()
 
+    # Indicateurs temps réel stockés hors de Monnaie (snapshot LiveIndicator de binance_ws)
+    live_store = None
+    if getattr(settings, "LIVE_INDICATOR_STORE", False):
+        live_store = LiveIndicatorStore()
+        live_store.load()
+
     for monnaie in monnaies:
+        if live_store is not None:
+            monnaie = MonnaieLiveProxy(monnaie, live_store)
         # Comptage des Klines par intervalle
         klines_count = {
             interval: Kline.objects.filter(symbole=monnaie.symbole, intervalle=interval).count()
@@ -228,3 +238,14 @@ def get_dashboard_data(request):
 
 
     
+
+from core.indicator_history import get_latest_indicators
+
+def get_indicator_history(request, symbole, interval):
+    """ Historique des indicateurs des Klines clôturées (graphiques du dashboard). """
+    try:
+        n = int(request.GET.get("n", 100))
+    except ValueError:
+        n = 100
+    n = max(1, min(n, 1000))
+    return JsonResponse({"symbole": symbole, "intervalle": interval, "indicateurs": get_latest_indicators(symbole, interval, n)})
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class MonnaieWriteBehind:
+    """
+    Écriture différée de l'état temps réel des monnaies (prix et indicateurs).
+
+    Les valeurs sont accumulées en mémoire par symbole et écrites toutes les `interval_ms`
+    millisecondes avec un `bulk_update` par groupe de champs pour toutes les monnaies modifiées,
+    au lieu d'un UPDATE / save() par tick et par intervalle.
+    """
+
+    def __init__(self):
+        self.interval_ms = 0
+        self.state = {}  # symbole -> {champ: dernière valeur connue}
+        self.dirty = set()  # symboles modifiés depuis le dernier flush
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_flush_duration = 0.0
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def start(self, interval_ms):
+        """ Démarre le flush périodique. Avec `interval_ms` <= 0 l'écriture reste immédiate. """
+        if interval_ms <= 0 or self.thread is not None:
+            return
+        self.interval_ms = interval_ms
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="monnaie-write-behind", daemon=True)
+        self.thread.start()
+        print(f"✅ [WRITE-BEHIND] Écriture différée des monnaies toutes les {interval_ms} ms")
+
+    def run(self):
+        while not self.stopping.wait(self.interval_ms / 1000):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ [ERROR] Write-behind des monnaies : {e}")
+
+    def stop(self, timeout=10):
+        """ Arrête le flush périodique puis écrit l'état encore en attente (arrêt du worker). """
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join(timeout)
+            self.thread = None
+        return self.flush()
+
+    def stage(self, symbole, **fields):
+        """ Enregistre de nouvelles valeurs pour une monnaie (écrites au prochain flush). """
+        with self.lock:
+            self.state.setdefault(symbole, {}).update(fields)
+            self.dirty.add(symbole)
+
+    def apply_pending(self, monnaie):
+        """ Applique sur une instance Monnaie lue en base les valeurs plus récentes encore en mémoire. """
+        if monnaie is None:
+            return monnaie
+        with self.lock:
+            fields = self.state.get(monnaie.symbole)
+            if fields:
+                for field, value in fields.items():
+                    setattr(monnaie, field, value)
+        return monnaie
+
+    def drop(self, symbole):
+        with self.lock:
+            self.state.pop(symbole, None)
+            self.dirty.discard(symbole)
+
+    def flush(self):
+        """ Écrit toutes les monnaies modifiées : un bulk_update par ensemble de champs. """
+        from core.models import Monnaie
+
+        with self.lock:
+            if not self.dirty:
+                return 0
+            groupes = defaultdict(list)
+            for symbole in self.dirty:
+                fields = dict(self.state[symbole])
+                groupes[tuple(sorted(fields))].append(Monnaie(symbole=symbole, **fields))
+            self.dirty = set()
+
+        debut = time.time()
+        total = 0
+        for update_fields, monnaies in groupes.items():
+            Monnaie.objects.bulk_update(monnaies, list(update_fields), batch_size=500)
+            total += len(monnaies)
+        self.last_flush_duration = time.time() - debut
+        return total
+
+
+monnaie_writer = MonnaieWriteBehind()
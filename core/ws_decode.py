@@ -0,0 +1,65 @@
+import json
+
+try:
+    import orjson  # Backend JSON optionnel, nettement plus rapide que json
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+SYMBOL_MARKER = '"s":"'
+
+
+class KlineTick:
+    """
+    Kline 1m décodée depuis le flux WebSocket : uniquement les champs utiles (s, t, o, h, l, c, v, x),
+    déjà convertis. Expose les mêmes noms d'attributs que le modèle Kline.
+    """
+    __slots__ = ("symbole", "intervalle", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume", "is_closed")
+
+    def __init__(self, symbole, timestamp, open_price, high_price, low_price, close_price, volume, is_closed, intervalle="1m"):
+        self.symbole = symbole
+        self.intervalle = intervalle
+        self.timestamp = timestamp
+        self.open_price = open_price
+        self.high_price = high_price
+        self.low_price = low_price
+        self.close_price = close_price
+        self.volume = volume
+        self.is_closed = is_closed
+
+    def __repr__(self):
+        return f"KlineTick({self.symbole}, {self.intervalle}, {self.timestamp}, c={self.close_price}, x={self.is_closed})"
+
+
+def extract_symbol(message):
+    """ Lit le symbole (champ "s") sans parser le JSON. Renvoie None s'il est absent. """
+    start = message.find(SYMBOL_MARKER)
+    if start < 0:
+        return None
+    start += len(SYMBOL_MARKER)
+    end = message.find('"', start)
+    return message[start:end] if end > start else None
+
+
+def decode_kline_message(message, active_symbols=None):
+    """
+    Décode un message du flux combiné Binance en KlineTick.
+    Si `active_symbols` (dict symbole -> actif) est fourni, les messages des monnaies
+    inactives sont ignorés avant tout parsing JSON. Renvoie None si le message est ignoré.
+    """
+    if isinstance(message, bytes):
+        message = message.decode()
+    if active_symbols is not None:
+        symbole = extract_symbol(message)
+        if symbole is None or not active_symbols.get(symbole, False):
+            return None
+
+    data = _loads(message).get("data")
+    if not data or data.get("e") != "kline":
+        return None
+    k = data["k"]
+    return KlineTick(
+        k["s"], k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]), k["x"]
+    )
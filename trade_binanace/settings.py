@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -92,6 +94,12 @@ DATABASES = {
     }
 }
 
+# Tests (manage.py test) : SQLite en mémoire, sans serveur PostgreSQL.
+# TEST_POSTGRES=1 pour les exécuter sur PostgreSQL (COPY, partitions).
+if sys.argv[1:2] == ["test"] and not os.environ.get("TEST_POSTGRES"):
+    DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    SILENCED_SYSTEM_CHECKS = ['models.W040']  # INCLUDE des index ignoré par SQLite
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -158,3 +166,32 @@ DUREE_MAX_FLUSH = 5  # Temps max avant flush
 
 # ⚙️ Récupération de l'historique
 NB_KLINES_HISTORIQUE = 100  # Nombre de Klines à charger par intervalle
+
+# ⚙️ Stockage des Klines en mémoire
+KLINE_STORE_CAPACITY = 500  # Nombre de Klines clôturées conservées par (symbole, intervalle)
+
+# ⚙️ Calcul des indicateurs
+STREAMING_INDICATORS = False  # True : moteur incrémental (core/indicators.py) au lieu du recalcul complet
+WS_INGEST_MODE = "thread"  # "thread" : un WebSocketApp par thread | "asyncio" : toutes les connexions sur une boucle
+WS_STREAMS_PER_CONNECTION = 1024  # Flux par connexion WebSocket, modes thread et asyncio (max Binance 1024)
+CONFLATE_KLINE_QUEUE = True  # Ne garder que le dernier tick non clôturé en attente par monnaie
+WORKER_MODE = "pool"  # "pool" : workers génériques | "sharded" : un worker dédié par groupe de monnaies (MAX_QUEUE shards)
+WS_SHARD_DIR = BASE_DIR / "run"  # binance_ws_supervisor : fichiers d'affectation des monnaies par worker
+STREAMING_AGGREGATION = False  # True : agrégation 3m..1d en continu (core/aggregator.py), Klines terminées écrites par batch
+
+# ⚙️ Rétention des Klines en base (prune_klines) : jours par intervalle, None = illimitée
+KLINE_RETENTION_DAYS = {"1m": 30, "3m": 90, "5m": 90, "15m": 180, "1h": 365, "4h": None, "1d": None}
+KLINE_ARCHIVE_DIR = BASE_DIR / "archive"  # Archive Arrow des Klines, écrite seulement par archive_klines / prune_klines --archive (delta REST au démarrage), pyarrow requis
+LIVE_INDICATOR_STORE = False  # True : indicateurs temps réel en mémoire (core/live_state.py), snapshot dans LiveIndicator
+LIVE_INDICATOR_SNAPSHOT_SECONDS = 10
+
+# ⚙️ Redémarrage à chaud de binance_ws (core/snapshot.py)
+WARM_START = False  # Opt-in : snapshot pickle de l'état mémoire dans WS_SHARD_DIR, rechargé au démarrage (delta REST uniquement)
+WARM_START_SNAPSHOT_SECONDS = 60  # Fréquence du snapshot (également écrit sur SIGTERM)
+WARM_START_MAX_AGE = 6 * 3600  # Au-delà (secondes), le snapshot est ignoré et l'historique rechargé
+
+# ⚙️ Écriture des Klines clôturées
+DEDICATED_FLUSHER = True  # Un thread d'écriture unique alimenté par un canal borné (au lieu du flush dans les workers) ; ignoré en WORKER_MODE sharded (flush par shard)
+FLUSH_QUEUE_CAPACITY = 10000  # Canal plein : les workers attendent (contre-pression) au lieu de perdre le flush
+BATCH_INDICATORS = False  # True : indicateurs des Klines clôturées vectorisés sur toutes les monnaies du flush (core/batch_indicators.py)
+INDICATOR_LIVE_CACHE = True  # Ticks en cours : état de la fenêtre clôturée en cache, seul le dernier pas est recalculé (backends reference / numpy)